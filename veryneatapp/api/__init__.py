@@ -5,10 +5,12 @@ from veryneatapp.api.endpoints import (
     cust_exceptions,
     files,
     items,
+    profiler,
     security,
     tasks,
     users,
 )
+from veryneatapp.core.config import settings
 
 
 async def get_token_header(
@@ -31,3 +33,8 @@ api_router.include_router(cust_exceptions.router, tags=["exceptions"])
 api_router.include_router(tasks.router, prefix="/tasks", tags=["tasks"])
 api_router.include_router(files.router, prefix="/files", tags=["files"])
 api_router.include_router(security.router, tags=["security"])
+
+if settings.PROFILER_ENABLED:
+    api_router.include_router(
+        profiler.router, prefix="/profiler", tags=["profiler"]
+    )
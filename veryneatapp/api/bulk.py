@@ -0,0 +1,197 @@
+"""
+Bulk endpoints. The elements are sent as a JSON array, or as NDJSON
+(Content-Type: application/x-ndjson, one JSON document per line) parsed while
+it is received. Each element is validated on its own, then the valid ones are
+written BULK_BATCH_SIZE at a time with one transaction per batch.
+The response has the result of each element, in the request order:
+{"results": [{"index": 0, "status": 201, "data": {...}},
+             {"index": 1, "status": 422, "errors": [...]}]}
+
+With an Idempotency-Key header the response is stored, and replayed to the
+retries of the request (see crud.idempotency_key).
+"""
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+
+from veryneatapp import crud
+from veryneatapp.core.config import settings
+from veryneatapp.core.responses import FastJSONResponse
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonlines")
+
+# (db, [(index, validated element)]) -> [result], which only flushes:
+# the batch is committed by run_bulk
+ApplyBatch = Callable[
+    [AsyncSession, List[Tuple[int, Any]]], Awaitable[List[Dict]]
+]
+
+
+def result(
+    index: int,
+    status_code: int,
+    data: Optional[BaseModel] = None,
+    errors: Optional[List[Dict]] = None,
+) -> Dict:
+    if data is not None:
+        return {"index": index, "status": status_code, "data": data.dict()}
+    return {"index": index, "status": status_code, "errors": errors}
+
+
+def error(index: int, status_code: int, message: str) -> Dict:
+    return result(index, status_code, errors=[{"msg": message}])
+
+
+def too_many_elements() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"More than {settings.BULK_MAX_ELEMENTS} elements",
+    )
+
+
+async def read_elements(request: Request) -> Tuple[List[Any], str]:
+    """The elements of the request and the sha256 of its body"""
+    digest = hashlib.sha256()
+    content_type = request.headers.get("Content-Type", "")
+    if not content_type.startswith(NDJSON_MEDIA_TYPES):
+        body = await request.body()
+        digest.update(body)
+        try:
+            elements = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(elements, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        if len(elements) > settings.BULK_MAX_ELEMENTS:
+            raise too_many_elements()
+        return elements, digest.hexdigest()
+
+    elements, buffer, line_number = [], bytearray(), 0
+
+    def parse(line: bytes) -> None:
+        if not line.strip():
+            return
+        try:
+            elements.append(json.loads(line))
+        except ValueError:
+            raise HTTPException(
+                status_code=400, detail=f"Invalid JSON on line {line_number}"
+            )
+        if len(elements) > settings.BULK_MAX_ELEMENTS:
+            raise too_many_elements()
+
+    async for chunk in request.stream():
+        digest.update(chunk)
+        buffer += chunk
+        start = 0
+        end = buffer.find(b"\n")
+        while end != -1:
+            line_number += 1
+            parse(buffer[start:end])
+            start = end + 1
+            end = buffer.find(b"\n", start)
+        del buffer[:start]
+    line_number += 1
+    parse(buffer)
+    return elements, digest.hexdigest()
+
+
+async def apply_batch(
+    db: AsyncSession,
+    schema: Type[BaseModel],
+    apply: ApplyBatch,
+    elements: List[Any],
+    offset: int,
+) -> List[Dict]:
+    results: Dict[int, Dict] = {}
+    valid = []
+    for index, element in enumerate(elements, offset):
+        try:
+            valid.append((index, schema.parse_obj(element)))
+        except ValidationError as exc:
+            results[index] = result(index, 422, errors=exc.errors())
+    if valid:
+        try:
+            applied = await apply(db, valid)
+            await db.flush()
+        except IntegrityError:
+            # Written concurrently by another request since it was checked
+            await db.rollback()
+            applied = [
+                error(index, 409, "Conflicting concurrent write, retry")
+                for index, _ in valid
+            ]
+        results.update((r["index"], r) for r in applied)
+    return [results[index] for index in sorted(results)]
+
+
+async def run_bulk(
+    request: Request,
+    db: AsyncSession,
+    schema: Type[BaseModel],
+    apply: ApplyBatch,
+    idempotency_key: Optional[str] = None,
+) -> Response:
+    """Validates and applies the elements of the request by batches"""
+    elements, request_hash = await read_elements(request)
+    results: List[Dict] = []
+    row = None
+    if idempotency_key is not None:
+        key = f"{request.method} {request.url.path} {idempotency_key}"
+        row, owned = await crud.idempotency_key.claim(
+            db,
+            key=key,
+            request_hash=request_hash,
+            ttl=settings.IDEMPOTENCY_KEY_TTL,
+            lock_timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+        )
+        if row.request_hash != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key already used by another request",
+            )
+        if row.status_code is not None:
+            return Response(
+                row.response,
+                status_code=row.status_code,
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"},
+            )
+        if not owned:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is in progress",
+                headers={"Retry-After": "1"},
+            )
+        results = json.loads(row.response)  # resumed after a failure
+
+    batch_size = settings.BULK_BATCH_SIZE
+    try:
+        for start in range(len(results), len(elements), batch_size):
+            results += await apply_batch(
+                db, schema, apply, elements[start : start + batch_size], start
+            )
+            if row is not None:
+                crud.idempotency_key.progress(row, json.dumps(results).encode())
+            await db.commit()
+    except Exception:
+        if row is not None:
+            await crud.idempotency_key.abandon(db, key=key)
+        raise
+
+    response = FastJSONResponse({"results": results})
+    if row is not None:
+        await crud.idempotency_key.complete(
+            db,
+            row=row,
+            status_code=response.status_code,
+            response=response.body,
+        )
+    return response
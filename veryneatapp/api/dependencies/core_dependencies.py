@@ -1,8 +1,11 @@
 from typing import Optional
 
-from fastapi import Cookie, Depends, Header
+from fastapi import Cookie, Depends, Header, Query, Request
 
 from veryneatapp.api.schemas.user import UserCreate, UserInDB
+from veryneatapp.core.config import settings
+from veryneatapp.core.responses import NDJSONResponse
+from veryneatapp.db.session import get_session
 
 
 class CommonQueryParams:
@@ -26,6 +29,42 @@ class CommonQueryParams:
         self.limit = limit
 
 
+class PaginationParams(CommonQueryParams):
+    """CommonQueryParams for the paginated list endpoints
+
+    Args:
+        q (str, optional). Prefix the listed names must start with.
+        skip (int, optional). Defaults to 0, ignored when a cursor is given.
+        limit (int, optional). Defaults to 100, capped to PAGE_SIZE_MAX.
+        cursor (str, optional). `next_cursor` of the previous page.
+    """
+
+    def __init__(
+        self,
+        q: Optional[str] = None,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=settings.PAGE_SIZE_MAX),
+        cursor: Optional[str] = None,
+    ):
+        super().__init__(q=q, skip=skip, limit=limit)
+        self.cursor = cursor
+
+
+def ndjson_requested(
+    request: Request,
+    format: Optional[str] = Query(
+        None,
+        regex="^(json|ndjson)$",
+        description="ndjson streams the whole list, one object per line",
+    ),
+) -> bool:
+    """Whether the list is to be streamed as NDJSON (NDJSONResponse):
+    with `?format=ndjson` or an `Accept: application/x-ndjson` header"""
+    if format is not None:
+        return format == "ndjson"
+    return NDJSONResponse.media_type in request.headers.get("Accept", "")
+
+
 """
 If the user didn't provide any query q,
 we use the last query used, which we saved to a cookie before.
@@ -68,11 +107,11 @@ class KeyTokenAuth:
 class DatabaseConnect:
     @staticmethod
     async def get_db():
-        db = DBSession()  # executed before sending a response
+        db = get_session()  # executed before sending a response
         try:
             yield db  # what is injected into the path operations and other dependencies
         finally:
-            db.close()  #  executed after the response has been delivered
+            await db.close()  #  executed after the response has been delivered, the connection goes back to the pool
 
 
 class DummyUserManagementExample:
@@ -85,6 +124,10 @@ class DummyUserManagementExample:
         hashed_password = DummyUserManagementExample.fake_password_hasher(
             user_in.password
         )
-        user_in_db = UserInDB(**user_in.dict(), hashed_password=hashed_password)
+        # user_in is validated already
+        user_in_db = UserInDB.construct(
+            **user_in.dict(exclude={"password"}),
+            hashed_password=hashed_password,
+        )
         print("User saved! ..not really")
         return user_in_db
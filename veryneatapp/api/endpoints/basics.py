@@ -9,11 +9,15 @@ from veryneatapp.api.dependencies.core_dependencies import (
     KeyTokenAuth,
     query_or_cookie_extractor,
 )
+from veryneatapp.api.routing import CachedAPIRoute
+from veryneatapp.core.response_cache import cache_response
+from veryneatapp.db.session import get_session
 
-router = APIRouter()
+router = APIRouter(route_class=CachedAPIRoute)
 
 # Simple GET and POST routes
 @router.get("/tutorial")
+@cache_response(vary=["X-Token"])  # checked by the router dependency
 async def tutorial():
     """This is a simple GET route, to use this
     run curl http://0.0.0.0:5700/tutorial
@@ -143,11 +147,11 @@ async def read_items():
 
 # Dependencies that do some extra steps after finishing (based on yield)
 async def get_db():
-    db = DBSession()  # executed before sending a response
+    db = get_session()  # executed before sending a response
     try:
         yield db  # what is injected into the path operations and other dependencies
     finally:
-        db.close()  #  executed after the response has been delivered
+        await db.close()  #  executed after the response has been delivered
 
 
 """
@@ -1,23 +1,174 @@
-from typing import List
+import hashlib
+import os
+import tempfile
+from contextlib import suppress
+from functools import partial
+from pathlib import Path
+from typing import Dict, List
 
-from fastapi import APIRouter, File, Form, Query, UploadFile, status
+from fastapi import (
+    APIRouter,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from starlette.concurrency import run_in_threadpool
+
+from veryneatapp.core.config import settings
 
 router = APIRouter()
 
 # more info: https://fastapi.tiangolo.com/tutorial/request-files/
 
 
+class _AtomicFileWriter:
+    """Write an upload to a temporary file next to its destination,
+    computing the sha256 checksum on the way, and move it into place
+    with an atomic rename once complete.
+    All methods do blocking I/O and must be called from a worker thread.
+    """
+
+    def __init__(self, destination: Path, max_size: int):
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=destination.parent,
+            prefix=f".{destination.name}.",
+            suffix=".part",
+        )
+        self.destination = destination
+        self.max_size = max_size
+        self.size = 0
+        self._tmp_path = tmp_path
+        self._file = os.fdopen(fd, "wb")
+        self._checksum = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File exceeds the maximum upload size of {self.max_size} bytes",
+            )
+        self._checksum.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Dict:
+        self._file.close()
+        os.replace(self._tmp_path, self.destination)
+        return {
+            "filename": self.destination.name,
+            "size": self.size,
+            "sha256": self._checksum.hexdigest(),
+        }
+
+    def abort(self) -> None:
+        self._file.close()
+        with suppress(FileNotFoundError):
+            os.unlink(self._tmp_path)
+
+
+def _upload_destination(filename: str) -> Path:
+    """Only keep the base name so clients can't write outside UPLOAD_DIR"""
+    name = Path(filename.split("¦")[-1]).name
+    if name in ("", ".", ".."):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file name {filename!r}",
+        )
+    return Path(settings.UPLOAD_DIR) / name
+
+
+def _save_upload(upload: UploadFile) -> _AtomicFileWriter:
+    """Private function copying an uploaded (spooled) file to disk
+    in UPLOAD_CHUNK_SIZE chunks, so memory stays flat whatever the file size.
+    Runs in the threadpool to keep blocking I/O off the event loop.
+    Returns the writer, to be committed once all the files are written.
+    """
+    writer = _AtomicFileWriter(
+        _upload_destination(upload.filename), settings.UPLOAD_MAX_SIZE
+    )
+    try:
+        upload.file.seek(0)
+        read_chunk = partial(upload.file.read, settings.UPLOAD_CHUNK_SIZE)
+        for chunk in iter(read_chunk, b""):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer
+
+
 @router.post("/upload-files/", status_code=status.HTTP_201_CREATED)
 async def upload_files(files: List[UploadFile] = File(...)):
     """
-    Upload files and save file to server filesystem
+    Upload files and save file to server filesystem.
+    Each file is copied in chunks off the event loop and its sha256 checksum
+    is returned along with its size.
+    The files are only moved into UPLOAD_DIR once all of them were written:
+    when one is rejected (eg. 413), none of them is kept.
+    """
+    writers = []
+    try:
+        for myfile in files:
+            writers.append(await run_in_threadpool(_save_upload, myfile))
+    except BaseException:
+        for writer in writers:
+            await run_in_threadpool(writer.abort)
+        raise
+
+    saved_files = []
+    for myfile, writer in zip(files, writers):
+        saved_file = await run_in_threadpool(writer.commit)
+        saved_file["content_type"] = myfile.content_type
+        saved_files.append(saved_file)
+
+    return {"files": saved_files}
+
+
+@router.put("/stream/{filename}", status_code=status.HTTP_201_CREATED)
+async def stream_upload(filename: str, request: Request):
+    """
+    Streaming upload mode: the raw request body is the file content.
+    Unlike multipart uploads, the body is never spooled to a temporary file first,
+    chunks are written straight to UPLOAD_DIR as they are received. Eg:
+    curl -T big.bin http://0.0.0.0:5700/api/v1/files/stream/big.bin
     """
-    for myfile in files:
-        binary_file = myfile.file._file.read()  # read file into memory
-        with open(myfile.filename.split("¦")[-1], "w+b") as f:
-            f.write(binary_file)
+    content_length = request.headers.get("content-length")
+    if content_length and not content_length.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Content-Length header",
+        )
+    if content_length and int(content_length) > settings.UPLOAD_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the maximum upload size of {settings.UPLOAD_MAX_SIZE} bytes",
+        )
 
-    return {"files": [_file.__dict__ for _file in files]}
+    writer = await run_in_threadpool(
+        _AtomicFileWriter,
+        _upload_destination(filename),
+        settings.UPLOAD_MAX_SIZE,
+    )
+    try:
+        # Buffer the (small) ASGI body messages into UPLOAD_CHUNK_SIZE chunks
+        # to limit the number of round trips to the threadpool
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= settings.UPLOAD_CHUNK_SIZE:
+                await run_in_threadpool(writer.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(writer.write, bytes(buffer))
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    return await run_in_threadpool(writer.commit)
 
 
 @router.post(
@@ -1,19 +1,151 @@
-from typing import Dict, List, Union
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, status
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.api import bulk
+from veryneatapp.api.dependencies.core_dependencies import (
+    DatabaseConnect,
+    PaginationParams,
+    ndjson_requested,
+)
+from veryneatapp.api.routing import CachedAPIRoute
+from veryneatapp.api.schemas.bulk import BulkResponse
+from veryneatapp.api.schemas.item import (
+    AnyItem,
+    CarItem,
+    ItemBulkCreate,
+    ItemBulkUpdate,
+    ItemOutDB,
+    ItemPatch,
+    SimpleItem,
+)
+from veryneatapp.api.schemas.page import Page
+from veryneatapp.api.schemas.trusted import project
+from veryneatapp.core.config import settings
+from veryneatapp.core.response_cache import cache_response, evict, invalidates
+from veryneatapp.core.responses import FastJSONResponse, NDJSONResponse
+from veryneatapp.core.shared_store import SharedStore
+from veryneatapp.crud.base import InvalidCursorError
+
+router = APIRouter(route_class=CachedAPIRoute)
+
+
+@router.get("/", response_model=Page[ItemOutDB])
+async def read_items(
+    params: PaginationParams = Depends(),
+    db: AsyncSession = Depends(DatabaseConnect.get_db),
+    stream: bool = Depends(ndjson_requested),
+):
+    """
+    Items sorted by title, `q` filters on the title prefix.
+    Pass `next_cursor` back as `cursor` to get the next page.
+    As NDJSON, all the items from the cursor on are streamed (no `limit`).
+    """
+    try:
+        if stream:
+            rows = crud.item.stream(
+                db,
+                q=params.q,
+                cursor=params.cursor,
+                skip=params.skip,
+                page_size=settings.STREAM_PAGE_SIZE,
+            )
+            return NDJSONResponse(rows, model=ItemOutDB)
+        items, next_cursor = await crud.item.get_page(
+            db,
+            q=params.q,
+            cursor=params.cursor,
+            skip=params.skip,
+            limit=params.limit,
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"items": items, "next_cursor": next_cursor}
 
-from veryneatapp.api.schemas.item import CarItem, PlaneItem, SimpleItem
 
-router = APIRouter()
+async def create_items(
+    db: AsyncSession, elements: List[Tuple[int, ItemBulkCreate]]
+) -> List[Dict]:
+    owners = await crud.user.get_many(
+        db, (item.owner_id for _, item in elements)
+    )
+    results, valid = [], []
+    for index, item in elements:
+        if item.owner_id in owners:
+            valid.append((index, item))
+        else:
+            results.append(
+                bulk.error(index, 422, f"User {item.owner_id} not found")
+            )
+    db_items = await crud.item.create_many(
+        db, objs_in=[item for _, item in valid]
+    )
+    results += [
+        bulk.result(index, 201, project(db_item, ItemOutDB))
+        for (index, _), db_item in zip(valid, db_items)
+    ]
+    return results
 
 
-@router.get("/")
-async def read_items():
-    return [{"name": "Item Foo"}, {"name": "item Bar"}]
+async def update_items(
+    db: AsyncSession, elements: List[Tuple[int, ItemBulkUpdate]]
+) -> List[Dict]:
+    db_items = await crud.item.get_many(db, (item.id for _, item in elements))
+    results = []
+    for index, item in elements:
+        db_item = db_items.get(item.id)
+        update_data: Dict[str, Any] = item.dict(
+            exclude_unset=True, exclude={"id"}
+        )
+        if db_item is None:
+            results.append(bulk.error(index, 404, f"Item {item.id} not found"))
+        elif "title" in update_data and update_data["title"] is None:
+            results.append(bulk.error(index, 422, "title can't be null"))
+        else:
+            for field, value in update_data.items():
+                setattr(db_item, field, value)
+            results.append(bulk.result(index, 200, project(db_item, ItemOutDB)))
+    return results
+
+
+@router.post("/bulk", response_model=BulkResponse[ItemOutDB])
+async def create_items_bulk(
+    request: Request,
+    db: AsyncSession = Depends(DatabaseConnect.get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Create the items of a JSON array or NDJSON stream of
+    `{"title", "description", "type", "owner_id"}` objects.
+    Returns the result of each item, see veryneatapp.api.bulk.
+    Retries with the same `Idempotency-Key` header get the same response.
+    """
+    return await bulk.run_bulk(
+        request, db, ItemBulkCreate, create_items, idempotency_key
+    )
+
+
+@router.patch("/bulk", response_model=BulkResponse[ItemOutDB])
+async def update_items_bulk(
+    request: Request,
+    db: AsyncSession = Depends(DatabaseConnect.get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Partial updates of the items of a JSON array or NDJSON stream of
+    `{"id", ...fields to update}` objects.
+    Returns the result of each item, see veryneatapp.api.bulk.
+    Retries with the same `Idempotency-Key` header get the same response.
+    """
+    return await bulk.run_bulk(
+        request, db, ItemBulkUpdate, update_items, idempotency_key
+    )
 
 
 @router.get("/{item_id}")
+@cache_response(tags=["item:{item_id}"])
 async def read_item(item_id: str):
     return {"name": "Fake Specific Item", "item_id": item_id}
 
@@ -23,6 +155,7 @@ async def read_item(item_id: str):
     tags=["custom"],
     responses={403: {"description": "Operation forbidden"}},
 )
+@invalidates("item:{item_id}")
 async def update_item(item_id: str):
     if item_id != "foo":
         raise HTTPException(
@@ -33,80 +166,107 @@ async def update_item(item_id: str):
 
 # Return list of models
 @router.get("/response-list-of-models/", response_model=List[SimpleItem])
-async def return_multiple_items():
+@cache_response(vary=["Accept"])
+async def return_multiple_items(stream: bool = Depends(ndjson_requested)):
     """
-    Return list of items
+    Return list of items, or stream them as NDJSON
     """
     # <data processing here>
     items = [
         {"name": "Foo", "description": "There comes my hero"},
         {"name": "Red", "description": "It's my aeroplane"},
     ]
+    if stream:
+        return NDJSONResponse(items, model=SimpleItem)
     return items
 
 
-# Return list of different models
-items = {
-    "item1": {
-        "name": "Foow",
-        "description": "All my friends drive a low rider",
-        "type": "car",
-    },
-    "item2": {
-        "description": "Music is my aeroplane, it's my aeroplane",
-        "type": "plane",
-        "size": 5,
+# Return list of different models, shared by the workers
+items = SharedStore(
+    "items",
+    defaults={
+        "item1": {
+            "name": "Foow",
+            "description": "All my friends drive a low rider",
+            "type": "car",
+        },
+        "item2": {
+            "name": "Bar",
+            "description": "Music is my aeroplane, it's my aeroplane",
+            "type": "plane",
+            "size": 5,
+        },
     },
-}
+)
+# Another worker changed an item: drop the responses of this one
+items.on_change(lambda item_id: evict(f"item:{item_id}"))
 
 
 @router.get(
     "/get-item-or-404/{item_id}",
-    response_model=Union[PlaneItem, CarItem],
+    response_model=AnyItem,
     status_code=status.HTTP_200_OK,
 )
+@cache_response(tags=["item:{item_id}"])
 async def read_item(item_id: str):
     """
     Must specify item1 or item2 to return model data, anything else returns a 404
     """
-    if item_id not in items:
+    item = await items.get(item_id)
+    if item is None:
         raise HTTPException(
             status_code=404,
             detail="Oooooops.. Item not found",
             headers={"X-Error": "There goes my error"},
         )
-    return items[item_id]
+    return item
 
 
 # Update car item with PUT (replace all object fields)
 @router.put("/update/{item_id}", response_model=CarItem)
+@invalidates("item:{item_id}")
 async def update_item(item_id: str, car_item: CarItem):
     """
-    Must specify item1 representing the car item
+    Must specify item1 representing the car item.
+    A body with a `type` other than "car" is rejected with a 422
     """
     update_item_encoded = car_item.dict()
-    items[item_id] = update_item_encoded  # updating car item in items dict
+    await items.set(item_id, update_item_encoded)  # updating car item
     return update_item_encoded
 
 
 # Use PATCH to update specific fields (Partial updates)
 # item.dict(exclude_unset=True) to generate a dict with only the data
 # that was set (sent in the request), omitting default values
-@router.patch("/partial-update/{item_id}", response_model=CarItem)
-async def partial_update_item(item_id: str, item: CarItem):
+@router.patch("/partial-update/{item_id}", response_model=AnyItem)
+@invalidates("item:{item_id}")
+async def partial_update_item(item_id: str, item: ItemPatch):
     """
-    Must specify item1 representing the car item
+    Must specify item1 or item2, anything else returns a 404.
+    The stored item keeps its own type: changing it returns a 409, and the
+    fields of its type can be updated (eg. the size of a plane).
+    It may have been written by another worker (see SharedStore), so the
+    updated item is validated, then returned directly as a FastJSONResponse,
+    which skips jsonable_encoder and a second (response_model) validation.
     """
-    stored_item_data = items[item_id]
-    stored_item_model = CarItem(**stored_item_data)
+    stored_item = await items.get(item_id)
+    if stored_item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
     update_data = item.dict(exclude_unset=True)
-    updated_item = stored_item_model.copy(update=update_data)
-    items[item_id] = jsonable_encoder(updated_item)
-    return updated_item
+    stored_type = stored_item.get("type")
+    if update_data.get("type", stored_type) != stored_type:
+        raise HTTPException(
+            status_code=409, detail=f"Item {item_id} is a {stored_type}"
+        )
+    updated_item = AnyItem.parse_obj({**stored_item, **update_data})
+    updated_item = updated_item.__root__.dict()
+    await items.set(item_id, updated_item)
+    return FastJSONResponse(updated_item)
 
 
 # Response with arbitrary dict
 @router.get("/keyword-weights/", response_model=Dict[str, float])
+@cache_response()
 async def read_keyword_weights():
     """
     returns arbitrary dict
@@ -0,0 +1,61 @@
+"""
+Admin routes of the request profiler (see core/profiling.py), only included
+with PROFILER_ENABLED. They need the X-Profiler-Key header, which is
+PROFILER_SECRET. Arming only applies to the worker process serving the call.
+"""
+import hmac
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse, Response
+
+from veryneatapp.core.config import settings
+from veryneatapp.core.profiling import profiler
+
+router = APIRouter()
+
+
+async def verify_profiler_key(x_profiler_key: str = Header(...)):
+    if not settings.PROFILER_SECRET or not hmac.compare_digest(
+        x_profiler_key, settings.PROFILER_SECRET
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="X-Profiler-Key header invalid",
+        )
+
+
+@router.post("/arm", dependencies=[Depends(verify_profiler_key)])
+async def arm_profiler(
+    requests: int = Query(10, ge=1, le=1000),
+    seconds: float = Query(60, gt=0, le=3600),
+) -> Dict:
+    """Profile the next `requests` requests served in the next `seconds`"""
+    profiler.arm(requests, seconds)
+    return {"requests": requests, "seconds": seconds}
+
+
+@router.delete(
+    "/arm",
+    dependencies=[Depends(verify_profiler_key)],
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def disarm_profiler():
+    profiler.disarm()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/profiles", dependencies=[Depends(verify_profiler_key)])
+async def list_profiles() -> List[str]:
+    """Ids of the saved profiles, latest first"""
+    return profiler.list()
+
+
+@router.get(
+    "/profiles/{profile_id}", dependencies=[Depends(verify_profiler_key)]
+)
+async def read_profile(profile_id: str):
+    """The profile in the folded stacks format, for flamegraph.pl/speedscope"""
+    if profile_id not in profiler.list():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(profiler.path(profile_id), media_type="text/plain")
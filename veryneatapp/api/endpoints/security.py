@@ -16,16 +16,21 @@ Simplified flow:
 6. The frontend needs to fetch some more data from a secured API endpointdatetime A combination of a date and a time. Attributes: ()
    a. To authenticate with our API, the frontend sends a header Authorization="Bearer"+ " " + <token>.
 """
+import time
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from veryneatapp.api.schemas.token import Token, TokenPayload
 from veryneatapp.api.schemas.user import User, UserInDB
+from veryneatapp.core.cache import TTLCache
+from veryneatapp.core.config import settings
+from veryneatapp.core.executors import ExecutorOverloadedError
+from veryneatapp.core.lazy import lazy_import
+from veryneatapp.core.security import check_password
+from veryneatapp.core.shared_store import SharedStore
 
 router = APIRouter()
 
@@ -37,44 +42,54 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
-fake_users_db = {
-    "johndoe": {
-        "username": "johndoe",
-        "full_name": "John Doe",
-        "email": "johndoe@example.com",
-        "hashed_password": "$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW",  # hashed version of `secret`
-        "is_active": True,
-        "is_superuser": False,
-    }
-}
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Shared by the workers, so an upgraded password hash is seen by all of them
+fake_users_db = SharedStore(
+    "users",
+    defaults={
+        "johndoe": {
+            "username": "johndoe",
+            "full_name": "John Doe",
+            "email": "johndoe@example.com",
+            "hashed_password": "$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW",  # hashed version of `secret`
+            "is_active": True,
+            "is_superuser": False,
+        }
+    },
+)
+
+# python-jose is slow to import: loaded on first use
+jwt = lazy_import("jose.jwt")
 
 # tokenUrl parameter contains the URL that the client should use to get the token.
 # As it's a relative URL, it's equivalent to ./token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Raw token -> (decoded claims, UserInDB), so repeat requests from the same
+# session skip the signature verification and the model construction
+token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, timer=time.time)
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
 
-
-def get_user(db: Dict, username: str):
-    if username in db:
-        user_dict = db[username]
+async def get_user(db: SharedStore, username: str):
+    user_dict = await db.get(username)
+    if user_dict is not None:
         return UserInDB(**user_dict)
 
 
-def authenticate_user(fake_db: Dict, username: str, password: str):
-    user = get_user(fake_db, username)
+async def authenticate_user(fake_db: SharedStore, username: str, password: str):
+    """
+    The password is verified on the password executor.
+    Raises ExecutorOverloadedError when too many verifications are waiting.
+    """
+    user = await get_user(fake_db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await check_password(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash and settings.PASSWORD_REHASH:
+        user = user.copy(update={"hashed_password": new_hash})
+        await fake_db.set(username, user.dict())
+        invalidate_user(username)
     return user
 
 
@@ -84,7 +99,7 @@ def create_access_token(
     """utility function to generate a new access token."""
     to_encode = data.copy()
     to_encode.update({"exp": datetime.utcnow() + expires_delta})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.get().encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
@@ -92,26 +107,61 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Looks in the request for the Authorization header, check if the value is Bearer plus some token, 
     and will return the token as a str.
+    Verified tokens are cached with their user until they expire (see token_cache).
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = token_cache.get(token)
+    if cached is not None:
+        _, user = cached
+        return user
+
     try:
-        payload: dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload: dict = jwt.get().decode(
+            token, SECRET_KEY, algorithms=[ALGORITHM]
+        )
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_data = TokenPayload(username=username)
-    except JWTError:
+    except jwt.get().JWTError:
         raise credentials_exception
-    user = get_user(fake_users_db, username=token_data.username)
+    user = await get_user(fake_users_db, username=token_data.username)
     if user is None:
         raise credentials_exception
+
+    expires_at = time.time() + settings.AUTH_TOKEN_CACHE_MAX_TTL
+    if "exp" in payload:
+        expires_at = min(payload["exp"], expires_at)
+    token_cache.set(token, (payload, user), expires_at=expires_at)
     return user
 
 
+def invalidate_token(token: str) -> None:
+    """To be called on logout: the next request with this token is verified again"""
+    token_cache.pop(token)
+
+
+def cached_token_username(token: str) -> Optional[str]:
+    """Username of an already verified token (eg. to rate limit by user),
+    None if the token wasn't verified yet"""
+    cached = token_cache.peek(token)
+    return None if cached is None else cached[1].username
+
+
+def invalidate_user(username: str) -> None:
+    """To be called when a user is modified or deactivated: drops every cached
+    token of this user so their next request loads it again"""
+    token_cache.evict(lambda _, cached: cached[1].username == username)
+
+
+# A user changed by another worker is loaded again on its next request
+fake_users_db.on_change(invalidate_user)
+
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user),
 ):
@@ -127,10 +177,18 @@ async def login_for_access_token(
     """
     Create a real JWT access token with a given timedelta, and return it.
     The `sub` key is optional, but that's where we'd put the user/object/whatever identification
+    The password check (bcrypt) runs on the password executor, off the event loop.
     """
-    user = authenticate_user(
-        fake_users_db, form_data.username, form_data.password
-    )
+    try:
+        user = await authenticate_user(
+            fake_users_db, form_data.username, form_data.password
+        )
+    except ExecutorOverloadedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again later",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
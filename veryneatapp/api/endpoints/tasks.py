@@ -3,10 +3,15 @@ from enum import Enum
 from time import sleep
 from typing import Dict, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Body, Path, Query, status
+from fastapi import APIRouter, Body, HTTPException, Path, Query, status
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 
 from veryneatapp.api.schemas.item import Item
+from veryneatapp.api.schemas.task import Job
 from veryneatapp.api.schemas.user import User
+from veryneatapp.core.log_writer import task_log_writer
+from veryneatapp.core.task_queue import TaskQueueFullError, task_queue
 
 router = APIRouter()
 
@@ -22,6 +27,7 @@ class ModelName(str, Enum):
     lenet = "lenet"
 
 
+@task_queue.task
 def _task_run(
     item: Dict, model_name: str, task_name: str, task_id: Optional[int] = None
 ) -> None:
@@ -30,12 +36,16 @@ def _task_run(
         task_name (str): name of the task
         task_id (int, optional): id of the task
     Output:
-        append data to log file
+        append data to the task log file (written in batches by task_log_writer)
     """
     sleep(3)  # simulates heavy I/O
-    with open("task_out.txt", mode="a") as f:
-        content = f"{item} | {model_name} | {task_name} | {task_id} | {datetime.now()}\n"
-        f.write(content)
+    content = (
+        f"{item} | {model_name} | {task_name} | {task_id} | {datetime.now()}\n"
+    )
+    task_log_writer.write(content)
+    # The job is marked done once this returns: its line must be written by
+    # then. It also runs in pool children, which exit without the atexit close
+    task_log_writer.flush(timeout=10)
 
 
 @router.post(
@@ -43,7 +53,6 @@ def _task_run(
 )
 async def task_run(
     model_name: ModelName,
-    background_tasks: BackgroundTasks,
     item: Item = Body(..., title="Item within request body", embed=True),
     user: User = Body(..., title="User within request body", embed=True),
     importance: int = Body(..., title="Int. within Req. Body", ge=0, example=3),
@@ -53,10 +62,12 @@ async def task_run(
 ) -> Dict:
     """
     Async path operation that takes task params and writes into a file
-    by calling the background task `_task_run`.
-    Background tasks suitable for operations that need to happen after a request.
+    by submitting the task `_task_run` to the task queue.
+    Tasks are suitable for operations that need to happen after a request.
     (when the client doesn't have to be waiting for the operation to complete before receiving the response.)
     Eg. Email notifications, data processing, etc. (For longer processes, use celery.)
+    The returned `job_id` can be used to follow the task with GET /tasks/{job_id},
+    a 429 is returned when the task queue is full.
 
     - **model_name** (Required query param): Name of the model to be selected from the downdown list
     - **item** (Required request body): Item data (defined by the pydantic data model)
@@ -70,8 +81,33 @@ async def task_run(
     req_data = f"User: {user.full_name} | Item: {item.name} | Model: {model_name.value} | Task: {task_name} | Task ID: {task_id}, is being run..."
 
     if not dry_run:
-        background_tasks.add_task(
-            _task_run, item, model_name.value, task_name, task_id
-        )
-        return {"message": req_data}
+        try:
+            # The journal is a sqlite database, written off the event loop
+            job_id = await run_in_threadpool(
+                task_queue.submit,
+                _task_run,
+                item=jsonable_encoder(item),
+                model_name=model_name.value,
+                task_name=task_name,
+                task_id=task_id,
+            )
+        except TaskQueueFullError:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many tasks queued, try again later",
+                headers={"Retry-After": "3"},
+            )
+        return {"message": req_data, "job_id": job_id}
     return {"message": f"Dry run enabled for {req_data}"}
+
+
+@router.get("/{job_id}", response_model=Job)
+async def read_job(job_id: str):
+    """
+    Returns the status of a task submitted with /run/{task_id}:
+    queued, running, done or failed
+    """
+    job = await run_in_threadpool(task_queue.status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,26 +1,72 @@
-from fastapi import APIRouter, Depends, status
+from typing import Dict, List, Optional, Tuple
 
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.api import bulk
 from veryneatapp.api.dependencies.core_dependencies import (
     CommonQueryParams,
+    DatabaseConnect,
     DummyUserManagementExample,
+    PaginationParams,
+    ndjson_requested,
 )
-from veryneatapp.api.schemas.user import UserInDB, UserOut
+from veryneatapp.api.routing import CachedAPIRoute
+from veryneatapp.api.schemas.bulk import BulkResponse
+from veryneatapp.api.schemas.page import Page
+from veryneatapp.api.schemas.trusted import project
+from veryneatapp.api.schemas.user import UserCreate, UserInDB, UserOut
+from veryneatapp.core.config import settings
+from veryneatapp.core.executors import ExecutorOverloadedError
+from veryneatapp.core.response_cache import cache_response
+from veryneatapp.core.responses import FastJSONResponse, NDJSONResponse
+from veryneatapp.crud.base import InvalidCursorError
 
-router = APIRouter()
+router = APIRouter(route_class=CachedAPIRoute)
 
 
-# Fake routes
-@router.get("/users/")
-async def read_users():
-    return [{"username": "Foo"}, {"username": "Bar"}]
+@router.get("/users/", response_model=Page[UserOut])
+async def read_users(
+    params: PaginationParams = Depends(),
+    db: AsyncSession = Depends(DatabaseConnect.get_db),
+    stream: bool = Depends(ndjson_requested),
+):
+    """
+    Users sorted by username, `q` filters on the username prefix.
+    Pass `next_cursor` back as `cursor` to get the next page.
+    As NDJSON, all the users from the cursor on are streamed (no `limit`).
+    """
+    try:
+        if stream:
+            rows = crud.user.stream(
+                db,
+                q=params.q,
+                cursor=params.cursor,
+                skip=params.skip,
+                page_size=settings.STREAM_PAGE_SIZE,
+            )
+            return NDJSONResponse(rows, model=UserOut)
+        users, next_cursor = await crud.user.get_page(
+            db,
+            q=params.q,
+            cursor=params.cursor,
+            skip=params.skip,
+            limit=params.limit,
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"items": users, "next_cursor": next_cursor}
 
 
+# Fake routes
 @router.get("/users/me")
 async def read_user_me():
     return {"username": "fakecurrentuser"}
 
 
 @router.get("/users/{username}")
+@cache_response(tags=["user:{username}"])
 async def read_user(username: str):
     return {"username": username}
 
@@ -38,6 +84,63 @@ async def create_user(
     """
     Here, user_saved contains the password
     but because we specify response_model=UserOut which does NOT
-    contain the pwd, then it will be filtered out in the final response
+    contain the pwd, then it will be filtered out in the final response.
+    user_saved is already validated: it is projected on UserOut and
+    returned directly, without validating it again against the response_model
+    """
+    return FastJSONResponse(
+        project(user_saved, UserOut), status_code=status.HTTP_201_CREATED
+    )
+
+
+async def create_users(
+    db: AsyncSession, elements: List[Tuple[int, UserCreate]]
+) -> List[Dict]:
+    taken_usernames, taken_emails = await crud.user.get_taken(
+        db,
+        usernames=(user.username for _, user in elements),
+        emails=(user.email for _, user in elements),
+    )
+    results, valid = [], []
+    for index, user in elements:
+        if user.username in taken_usernames:
+            results.append(bulk.error(index, 409, "Username already taken"))
+        elif user.email in taken_emails:
+            results.append(bulk.error(index, 409, "Email already taken"))
+        else:
+            # The next elements can't use them either
+            taken_usernames.add(user.username)
+            taken_emails.add(user.email)
+            valid.append((index, user))
+    db_users = await crud.user.create_many(
+        db, objs_in=[user for _, user in valid]
+    )
+    results += [
+        bulk.result(index, 201, project(db_user, UserOut))
+        for (index, _), db_user in zip(valid, db_users)
+    ]
+    return results
+
+
+@router.post("/users/bulk", response_model=BulkResponse[UserOut])
+async def create_users_bulk(
+    request: Request,
+    db: AsyncSession = Depends(DatabaseConnect.get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Create the users of a JSON array or NDJSON stream of `UserCreate`,
+    their passwords are hashed in parallel.
+    Returns the result of each user, see veryneatapp.api.bulk.
+    Retries with the same `Idempotency-Key` header get the same response.
     """
-    return user_saved
+    try:
+        return await bulk.run_bulk(
+            request, db, UserCreate, create_users, idempotency_key
+        )
+    except ExecutorOverloadedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many passwords being hashed, try again later",
+            headers={"Retry-After": "1"},
+        )
@@ -0,0 +1,74 @@
+from typing import Callable, Optional, Sequence
+
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route, Router
+
+from veryneatapp.core.response_cache import CachePolicy, response_cache
+from veryneatapp.core.timing import timed_endpoint, timed_handler
+
+
+class CachedAPIRoute(APIRoute):
+    """
+    APIRoute applying the @cache_response and @invalidates options
+    of its endpoint (see veryneatapp.core.response_cache), and recording
+    its phases for the Server-Timing header (see veryneatapp.core.timing).
+    Use it with APIRouter(route_class=CachedAPIRoute)
+    """
+
+    def get_route_handler(self) -> Callable:
+        self.dependant.call = timed_endpoint(self.dependant.call)
+        handler = timed_handler(super().get_route_handler())
+        policy = getattr(self.endpoint, "__cache_policy__", None)
+        invalidated = getattr(self.endpoint, "__cache_invalidates__", ())
+
+        if policy is not None:
+
+            async def cached_handler(request: Request) -> Response:
+                return await response_cache.serve(request, policy, handler)
+
+            return cached_handler
+
+        if invalidated:
+
+            async def invalidating_handler(request: Request) -> Response:
+                response = await handler(request)
+                if response.status_code < 400:
+                    response_cache.invalidate(
+                        tag.format(**request.path_params) for tag in invalidated
+                    )
+                return response
+
+            return invalidating_handler
+
+        return handler
+
+
+def cache_route(
+    router: Router,
+    path: str,
+    ttl: Optional[float] = None,
+    vary: Sequence[str] = (),
+) -> None:
+    """Serve a plain starlette route from the response cache,
+    eg. the OpenAPI document added by FastAPI"""
+    for index, route in enumerate(router.routes):
+        if isinstance(route, Route) and route.path == path:
+            policy = CachePolicy(
+                ttl, tuple(header.lower() for header in vary), ()
+            )
+            endpoint = route.endpoint
+
+            async def cached_endpoint(request: Request) -> Response:
+                return await response_cache.serve(request, policy, endpoint)
+
+            router.routes[index] = Route(
+                path,
+                cached_endpoint,
+                methods=route.methods,
+                name=route.name,
+                include_in_schema=route.include_in_schema,
+            )
+            return
+    raise ValueError(f"No route {path}")
@@ -0,0 +1,19 @@
+from typing import Any, Dict, Generic, List, Optional, TypeVar
+
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+class BulkResult(GenericModel, Generic[T]):
+    """Outcome of one element of a bulk request, `index` is its position in
+    the request. `data` is set on success, `errors` otherwise"""
+
+    index: int
+    status: int
+    data: Optional[T] = None
+    errors: Optional[List[Dict[str, Any]]] = None
+
+
+class BulkResponse(GenericModel, Generic[T]):
+    results: List[BulkResult[T]]
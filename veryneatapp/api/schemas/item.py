@@ -1,6 +1,11 @@
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set, Type, Union
 
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, create_model
+
+try:
+    from typing import Literal
+except ImportError:  # Python 3.7
+    from typing_extensions import Literal
 
 
 class Image(BaseModel):
@@ -29,15 +34,60 @@ class ItemWithImage(Item):
     )
 
 
+# Item types by their `type` field, the discriminator of AnyItem.
+# New item types are declared with @item_type before AnyItem, the routes
+# returning AnyItem serve them unchanged
+ITEM_TYPES: Dict[str, Type[BaseItem]] = {}
+
+
+def item_type(model: Type[BaseItem]) -> Type[BaseItem]:
+    # AnyItem's Union is built once, from the types registered so far
+    if "AnyItem" in globals():
+        raise TypeError(
+            f"{model.__name__} must be registered before AnyItem is built"
+        )
+    ITEM_TYPES[model.__fields__["type"].default] = model
+    return model
+
+
+@item_type
 class CarItem(BaseItem):
-    type = "car"
+    type: Literal["car"] = "car"
 
 
+@item_type
 class PlaneItem(BaseItem):
-    type = "plane"
+    type: Literal["plane"] = "plane"
     size: int
 
 
+class AnyItem(BaseModel):
+    """
+    One of the registered item types: the model is looked up from the `type`
+    of the data in O(1), instead of trying the types of a Union in turn
+    """
+
+    __root__: Union[tuple(ITEM_TYPES.values())] = Field(
+        ..., discriminator="type"
+    )
+
+
+def partial_item_fields() -> Dict:
+    """The fields of all the registered item types, all optional"""
+    fields = {
+        name: (Optional[field.outer_type_], None)
+        for model in ITEM_TYPES.values()
+        for name, field in model.__fields__.items()
+    }
+    fields["type"] = (Optional[Literal[tuple(ITEM_TYPES)]], None)
+    return fields
+
+
+# Body of a partial update of any item type (eg. the size of a plane).
+# The merged item is validated with AnyItem
+ItemPatch = create_model("ItemPatch", **partial_item_fields())
+
+
 # Items for DB operations
 # Shared properties
 class ItemBase(BaseModel):
@@ -56,6 +106,15 @@ class ItemUpdate(ItemBase):
     pass
 
 
+# Elements of the bulk endpoints
+class ItemBulkCreate(ItemCreate):
+    owner_id: int
+
+
+class ItemBulkUpdate(ItemUpdate):
+    id: int
+
+
 # Properties shared by models stored in DB
 class ItemInDBBase(ItemBase):
     id: int
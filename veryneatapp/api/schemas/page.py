@@ -0,0 +1,12 @@
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+class Page(GenericModel, Generic[T]):
+    """One page of a list endpoint, `next_cursor` is None on the last page"""
+
+    items: List[T]
+    next_cursor: Optional[str] = None
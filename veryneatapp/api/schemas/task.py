@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+from veryneatapp.core.task_queue import TaskStatus
+
+
+class Job(BaseModel):
+    """
+    Status of a task submitted to the task queue
+    """
+
+    id: str
+    name: str
+    status: TaskStatus
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,40 @@
+"""
+Fast paths building the schemas from trusted data, ie. data which was
+already validated by this process: the request models, the database rows.
+The values are taken as they are, without validation nor copy.
+
+- `Model.construct(**data)` (pydantic) for data already matching a model,
+  eg. the dict of a request model. Unlike validation, it keeps the keys
+  which aren't fields
+- `project(obj, Model)` builds `Model` from the fields of another model or
+  of an ORM object, eg. a UserOut from a UserInDB, dropping the
+  hashed_password. The fields to copy are computed once per pair of types
+
+Never use them on client input, nor on the values of a SharedStore, which
+other workers write: the types, constraints and validators are skipped.
+"""
+from functools import lru_cache
+from typing import Any, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+
+@lru_cache(maxsize=None)
+def shared_fields(source: type, model: Type[BaseModel]) -> Tuple[str, ...]:
+    """Fields of `model` that the instances of `source` have"""
+    if issubclass(source, BaseModel):
+        return tuple(
+            name for name in model.__fields__ if name in source.__fields__
+        )
+    # ORM classes have their columns as class attributes
+    return tuple(name for name in model.__fields__ if hasattr(source, name))
+
+
+def project(obj: Any, model: Type[M]) -> M:
+    """`model` with the values of `obj`, and the defaults for the fields
+    `obj` doesn't have"""
+    return model.construct(
+        **{name: getattr(obj, name) for name in shared_fields(type(obj), model)}
+    )
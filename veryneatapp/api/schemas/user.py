@@ -28,7 +28,8 @@ class User(UserBase):
 
 
 class UserOut(UserBase):
-    pass
+    class Config:
+        orm_mode = True
 
 
 # Properties to receive via API on creation
@@ -0,0 +1,4 @@
+"""
+In-process benchmarks of the api_router and web_router routes,
+see `python -m veryneatapp.benchmarks --help`
+"""
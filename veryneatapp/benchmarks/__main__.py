@@ -0,0 +1,141 @@
+"""
+Latency/throughput benchmarks of the routes, run in-process. Eg:
+
+    python -m veryneatapp.benchmarks run --output benchmark.json
+    python -m veryneatapp.benchmarks run --only items --compare
+    python -m veryneatapp.benchmarks compare baseline.json benchmark.json
+    python -m veryneatapp.benchmarks schemas
+
+`run --compare` and `compare` exit with 1 when a metric regressed
+by more than --threshold. Unless set, the database, uploads, task journal
+and caches are created in a temporary directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASELINE = Path(__file__).resolve().parent / "baselines" / "baseline.json"
+
+
+def set_environment() -> None:
+    tmp_dir = tempfile.mkdtemp(prefix="veryneatapp-benchmarks-")
+    for name, value in {
+        "DATABASE_URL": f"sqlite+aiosqlite:///{tmp_dir}/benchmarks.db",
+        "UPLOAD_DIR": f"{tmp_dir}/uploads",
+        "TASK_QUEUE_JOURNAL": f"{tmp_dir}/task_journal.db",
+        "TASK_LOG_PATH": f"{tmp_dir}/task_out.txt",
+        "STATIC_CACHE_DIR": f"{tmp_dir}/static_cache",
+        "TEMPLATE_CACHE_DIR": f"{tmp_dir}/template_cache",
+        "METRICS_DIR": f"{tmp_dir}/metrics",
+        # All the requests come from one client
+        "ADMISSION_ENABLED": "False",
+    }.items():
+        os.environ.setdefault(name, value)
+
+
+def report_regressions(regressions) -> int:
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regression")
+    return 1 if regressions else 0
+
+
+def run(args: argparse.Namespace) -> int:
+    set_environment()
+    # Settings are read on import
+    from veryneatapp.benchmarks import runner
+    from veryneatapp.benchmarks.scenarios import SCENARIOS
+    from veryneatapp.main import app
+
+    for route in sorted(runner.uncovered_routes(app, SCENARIOS)):
+        print(f"WARNING no scenario for {route}")
+    scenarios = [
+        scenario
+        for scenario in SCENARIOS
+        if not args.only or any(only in scenario.name for only in args.only)
+    ]
+    report = asyncio.get_event_loop().run_until_complete(
+        runner.run_benchmarks(
+            app,
+            scenarios,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+        )
+    )
+    Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Results saved to {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = runner.compare(baseline, report, args.threshold)
+        return report_regressions(regressions)
+    return 0
+
+
+def compare_reports(args: argparse.Namespace) -> int:
+    from veryneatapp.benchmarks.runner import compare
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    return report_regressions(compare(baseline, current, args.threshold))
+
+
+def schemas(args: argparse.Namespace) -> int:
+    set_environment()
+    from veryneatapp.benchmarks.schemas import CASES, run_schema_benchmarks
+
+    results = run_schema_benchmarks(CASES, number=args.number)
+    for name, result in results.items():
+        print(
+            f"{name}: {result['validated_us']}us -> {result['fast_us']}us "
+            f"(x{result['speedup']})"
+        )
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m veryneatapp.benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--requests", type=int, default=200)
+    run_parser.add_argument("--concurrency", type=int, default=10)
+    run_parser.add_argument("--warmup", type=int, default=5)
+    run_parser.add_argument(
+        "--only", nargs="*", help="scenarios whose name contains these"
+    )
+    run_parser.add_argument("--output", default="benchmark.json")
+    run_parser.add_argument(
+        "--compare",
+        nargs="?",
+        const=str(BASELINE),
+        help=f"baseline to compare with, {BASELINE.name} by default",
+    )
+    run_parser.add_argument("--threshold", type=float, default=0.2)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="compare two results files"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    compare_parser.set_defaults(func=compare_reports)
+
+    schemas_parser = subparsers.add_parser(
+        "schemas", help="compare the schema fast paths with validation"
+    )
+    schemas_parser.add_argument("--number", type=int, default=10000)
+    schemas_parser.set_defaults(func=schemas)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Minimal in-process HTTP client calling an ASGI app directly (no network,
+no server), so that the measures only include the app itself.
+"""
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from starlette.types import ASGIApp, Message
+
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+class ASGIResponse(NamedTuple):
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+def encode_json(content: Any) -> Tuple[bytes, str]:
+    return json.dumps(content).encode("utf-8"), "application/json"
+
+
+def encode_form(data: Dict[str, str]) -> Tuple[bytes, str]:
+    return urlencode(data).encode(), "application/x-www-form-urlencoded"
+
+
+def encode_multipart(
+    files: List[Tuple[str, str, bytes]], data: Optional[Dict[str, str]] = None
+) -> Tuple[bytes, str]:
+    """Multipart body of (field name, filename, content) files
+    and form fields"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (data or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+            f"\r\n\r\n{value}\r\n".encode()
+        )
+    for name, filename, content in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+            f'filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n".encode()
+        )
+        parts.append(content)
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class ASGIClient:
+    """
+    Sends requests to an ASGI app in the current event loop.
+    `startup` and `shutdown` run the app lifespan events.
+    """
+
+    def __init__(self, app: ASGIApp, host: str = "testserver"):
+        self.app = app
+        self.host = host
+
+    async def startup(self) -> None:
+        await self.app.router.startup()
+
+    async def shutdown(self) -> None:
+        await self.app.router.shutdown()
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: bytes = b"",
+        content_type: Optional[str] = None,
+    ) -> ASGIResponse:
+        path, _, query_string = url.partition("?")
+        raw_headers = [(b"host", self.host.encode())]
+        for name, value in (headers or {}).items():
+            raw_headers.append((name.lower().encode(), value.encode()))
+        if content_type is not None:
+            raw_headers.append((b"content-type", content_type.encode()))
+        if body or method in ("POST", "PUT", "PATCH"):
+            raw_headers.append((b"content-length", str(len(body)).encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "server": (self.host, 80),
+            "client": ("127.0.0.1", 50000),
+            "root_path": "",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query_string.encode(),
+            "headers": raw_headers,
+        }
+
+        # The body is received in chunks like from a server, then receive()
+        # blocks until the response is complete (streaming responses listen
+        # for the client disconnection in the meantime)
+        chunks = [
+            body[i : i + BODY_CHUNK_SIZE]
+            for i in range(0, len(body), BODY_CHUNK_SIZE)
+        ] or [b""]
+        response_complete = asyncio.Event()
+
+        async def receive() -> Message:
+            if chunks:
+                chunk = chunks.pop(0)
+                return {
+                    "type": "http.request",
+                    "body": chunk,
+                    "more_body": bool(chunks),
+                }
+            await response_complete.wait()
+            return {"type": "http.disconnect"}
+
+        start: Dict = {}
+        response_body = []
+
+        async def send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    response_complete.set()
+
+        await self.app(scope, receive, send)
+        response_complete.set()
+        return ASGIResponse(
+            start["status"], start.get("headers", []), b"".join(response_body)
+        )
@@ -0,0 +1,243 @@
+import asyncio
+import math
+import os
+import platform
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp
+
+from veryneatapp.benchmarks.asgi import (
+    ASGIClient,
+    encode_form,
+    encode_json,
+    encode_multipart,
+)
+from veryneatapp.benchmarks.scenarios import API, Scenario
+from veryneatapp.core.security import get_password_hash
+from veryneatapp.db.session import get_session
+from veryneatapp.models import Item, User
+
+# Compared metrics: name -> True when higher is better
+METRICS = {"throughput": True, "p50_ms": False, "p95_ms": False}
+
+
+def uncovered_routes(app: ASGIApp, scenarios: Iterable[Scenario]) -> Set[str]:
+    """The API routes of the app which have no scenario"""
+    covered = {(scenario.method, scenario.route) for scenario in scenarios}
+    return {
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+        if (method, route.path) not in covered
+    }
+
+
+async def seed_database(users: int = 100, items: int = 1000) -> None:
+    """Users and items for the list endpoints, all with the same password"""
+    hashed_password = get_password_hash("secret")
+    db = get_session()
+    try:
+        db_users = [
+            User(
+                username=f"user-{i:04d}",
+                email=f"user-{i:04d}@example.com",
+                hashed_password=hashed_password,
+            )
+            for i in range(users)
+        ]
+        db.add_all(db_users)
+        await db.flush()
+        db.add_all(
+            Item(
+                title=f"item-{i:05d}",
+                description="A very nice Item",
+                owner_id=db_users[i % users].id,
+            )
+            for i in range(items)
+        )
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def prepare(client: ASGIClient) -> Dict[str, str]:
+    """Seed the database and create the values used by the scenarios"""
+    await seed_database()
+    body, content_type = encode_form(
+        {"username": "johndoe", "password": "secret"}
+    )
+    response = await client.request(
+        "POST", f"{API}/token", body=body, content_type=content_type
+    )
+    token = response.json()["access_token"]
+    response = await client.request("GET", f"{API}/items/?limit=50")
+    items_cursor = response.json()["next_cursor"]
+    body, content_type = encode_json(
+        {
+            "item": {"name": "Foo", "price": 1},
+            "user": {"username": "foo"},
+            "importance": 1,
+        }
+    )
+    response = await client.request(
+        "POST",
+        f"{API}/tasks/run/1?model_name=alexnet&task-name=bench",
+        body=body,
+        content_type=content_type,
+    )
+    job_id = response.json()["job_id"]
+    return {"token": token, "items_cursor": items_cursor, "job_id": job_id}
+
+
+def build_request(
+    scenario: Scenario, context: Dict[str, str]
+) -> Tuple[str, Dict[str, str], bytes, Optional[str]]:
+    """url, headers, body and content type of a scenario"""
+    url = scenario.url.format(**context)
+    headers = {
+        name: value.format(**context)
+        for name, value in (scenario.headers or {}).items()
+    }
+    body, content_type = b"", None
+    if scenario.json is not None:
+        body, content_type = encode_json(scenario.json)
+    elif scenario.files is not None:
+        files = [
+            (field, filename, os.urandom(size))
+            for field, filename, size in scenario.files
+        ]
+        body, content_type = encode_multipart(files, scenario.form)
+    elif scenario.form is not None:
+        body, content_type = encode_form(scenario.form)
+    elif scenario.content_size is not None:
+        body = os.urandom(scenario.content_size)
+        content_type = "application/octet-stream"
+    return url, headers, body, content_type
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+async def run_scenario(
+    client: ASGIClient,
+    scenario: Scenario,
+    context: Dict[str, str],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> Dict:
+    """Sends `requests` requests, `concurrency` at a time,
+    after `warmup` unmeasured requests"""
+    url, headers, body, content_type = build_request(scenario, context)
+    requests = min(requests, scenario.max_requests or requests)
+    concurrency = min(concurrency, scenario.max_concurrency or concurrency)
+    latencies: List[int] = []
+    errors = 0
+    remaining = requests
+
+    async def send() -> int:
+        response = await client.request(
+            scenario.method, url, headers, body, content_type
+        )
+        return response.status_code
+
+    for _ in range(min(warmup, requests)):
+        status_code = await send()
+        if status_code not in scenario.expected_status:
+            raise RuntimeError(
+                f"{scenario.name}: unexpected status code {status_code}"
+            )
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter_ns()
+            status_code = await send()
+            latencies.append(time.perf_counter_ns() - start)
+            if status_code not in scenario.expected_status:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = sorted(latency / 1e6 for latency in latencies)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 1),
+        "mean_ms": round(sum(latencies_ms) / requests, 3),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+    }
+
+
+async def run_benchmarks(
+    app: ASGIApp,
+    scenarios: List[Scenario],
+    requests: int = 200,
+    concurrency: int = 10,
+    warmup: int = 5,
+) -> Dict:
+    """Runs the scenarios against the app (started and stopped here),
+    returns the report saved as JSON"""
+    client = ASGIClient(app)
+    await client.startup()
+    try:
+        context = await prepare(client)
+        results = {}
+        for scenario in scenarios:
+            results[scenario.name] = await run_scenario(
+                client, scenario, context, requests, concurrency, warmup
+            )
+            print(f"{scenario.name}: {results[scenario.name]}", flush=True)
+    finally:
+        await client.shutdown()
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "requests": requests,
+            "concurrency": concurrency,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Regressions of `current` over `baseline` larger than `threshold`
+    (eg. 0.2 for 20%) on the METRICS, as human readable lines.
+    The scenarios missing from the baseline are reported too: they can't
+    be checked until the baseline is regenerated"""
+    regressions = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            regressions.append(f"{name}: not in the baseline")
+            continue
+        if result["errors"] > reference["errors"]:
+            regressions.append(
+                f"{name}: {result['errors']} errors "
+                f"(baseline: {reference['errors']})"
+            )
+        for metric, higher_is_better in METRICS.items():
+            before, after = reference[metric], result[metric]
+            if not before:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(
+                    f"{name}: {metric} {before} -> {after} ({change:+.0%})"
+                )
+    return regressions
@@ -0,0 +1,359 @@
+"""
+Benchmark scenarios: one or more requests per route of api_router and
+web_router, with realistic bodies.
+
+`url` and `headers` can use the values of the benchmark context created by
+`runner.prepare` (eg. "{token}"), `route` is the path template of the route.
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from veryneatapp.core.config import settings
+
+API = settings.API_V1_STR
+KIB = 1024
+MIB = 1024 * 1024
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    route: str
+    url: str
+    json: Optional[object] = None
+    form: Optional[Dict[str, str]] = None
+    files: Optional[List[Tuple[str, str, int]]] = None  # field, name, size
+    content_size: Optional[int] = None  # raw body of `content_size` bytes
+    headers: Optional[Dict[str, str]] = None
+    expected_status: Sequence[int] = (200,)
+    max_requests: Optional[int] = None  # for the slow scenarios
+    max_concurrency: Optional[int] = None  # eg. for the SQLite writes
+
+
+ITEM = {
+    "name": "Foo",
+    "description": "A very nice Item",
+    "price": 35.4,
+    "tax": 3.2,
+    "tags": ["blue", "green", "red"],
+}
+USER = {"username": "johndoe", "full_name": "John Doe"}
+BEARER = {"Authorization": "Bearer {token}"}
+
+SCENARIOS = [
+    # basics
+    Scenario("basics.tutorial", "GET", "/basics/tutorial", "/basics/tutorial"),
+    Scenario(
+        "basics.create_index_weights",
+        "POST",
+        "/basics/index-weights/",
+        "/basics/index-weights/",
+        json={str(i): i / 10 for i in range(100)},
+    ),
+    Scenario(
+        "basics.read_items (cookie)",
+        "GET",
+        "/basics/cookie-example/",
+        "/basics/cookie-example/",
+        headers={"Cookie": "ads_id=ad-1234"},
+    ),
+    Scenario(
+        "basics.read_elements",
+        "GET",
+        "/basics/deprecated-path/",
+        "/basics/deprecated-path/",
+    ),
+    Scenario(
+        "basics.advanced_datatypes",
+        "PUT",
+        "/basics/advanced-datatypes/{item_id}",
+        "/basics/advanced-datatypes/123e4567-e89b-12d3-a456-426614174000",
+        json={
+            "start_datetime": "2020-08-18T14:38:07.741Z",
+            "end_datetime": "2020-08-18T14:40:07.741Z",
+            "repeat_at": "14:23:55.003",
+            "process_after": 11.03,
+        },
+    ),
+    Scenario(
+        "basics.read_items (dependency)",
+        "GET",
+        "/basics/simple-dependency/",
+        "/basics/simple-dependency/?q=foo&skip=10&limit=20",
+    ),
+    Scenario(
+        "basics.read_query_or_cookie_extractor",
+        "GET",
+        "/basics/query-or-cookie/",
+        "/basics/query-or-cookie/?q=foo",
+    ),
+    Scenario(
+        "basics.read_items (dependencies)",
+        "GET",
+        "/basics/no-returned-values-from-depencies/",
+        "/basics/no-returned-values-from-depencies/",
+    ),
+    # users
+    Scenario(
+        "users.read_users",
+        "GET",
+        "/users/users/",
+        "/users/users/?limit=50",
+    ),
+    Scenario(
+        "users.read_users (prefix)",
+        "GET",
+        "/users/users/",
+        "/users/users/?q=user-005&limit=20",
+    ),
+    Scenario("users.read_user_me", "GET", "/users/users/me", "/users/users/me"),
+    Scenario(
+        "users.read_user",
+        "GET",
+        "/users/users/{username}",
+        "/users/users/johndoe",
+    ),
+    Scenario(
+        "users.create_user",
+        "POST",
+        "/users/fake-create-user/",
+        "/users/fake-create-user/",
+        json={
+            "username": "johndoe",
+            "full_name": "John Doe",
+            "email": "johndoe@example.com",
+            "password": "secret",
+        },
+        expected_status=(201,),
+    ),
+    Scenario(
+        "users.create_users_bulk",
+        "POST",
+        "/users/users/bulk",
+        "/users/users/bulk",
+        json=[
+            {
+                "username": f"bulk-user-{i}",
+                "email": f"bulk-user-{i}@example.com",
+                "password": "secret",
+            }
+            for i in range(2)
+        ],
+        max_requests=20,  # bcrypt, then conflicts
+    ),
+    # items
+    Scenario("items.read_items", "GET", "/items/", "/items/?limit=50"),
+    Scenario(
+        "items.create_items_bulk",
+        "POST",
+        "/items/bulk",
+        "/items/bulk",
+        json=[
+            {"title": f"bulk-item-{i:03d}", "owner_id": i % 100 + 1}
+            for i in range(100)
+        ],
+        # concurrent SQLite write transactions fail with "database is locked"
+        max_concurrency=1,
+    ),
+    Scenario(
+        "items.update_items_bulk",
+        "PATCH",
+        "/items/bulk",
+        "/items/bulk",
+        json=[
+            {"id": i + 1, "description": "An even nicer Item"}
+            for i in range(100)
+        ],
+        max_concurrency=1,
+    ),
+    Scenario(
+        "items.read_items (cursor)",
+        "GET",
+        "/items/",
+        "/items/?limit=50&cursor={items_cursor}",
+    ),
+    Scenario(
+        "items.read_items (ndjson)",
+        "GET",
+        "/items/",
+        # the seeded items, not those added by the bulk scenarios
+        "/items/?format=ndjson&q=item-",
+    ),
+    Scenario(
+        "items.read_items (prefix)",
+        "GET",
+        "/items/",
+        "/items/?q=item-001&limit=20",
+    ),
+    Scenario("items.read_item", "GET", "/items/{item_id}", "/items/foo"),
+    Scenario("items.update_item", "PUT", "/items/{item_id}", "/items/foo"),
+    Scenario(
+        "items.return_multiple_items",
+        "GET",
+        "/items/response-list-of-models/",
+        "/items/response-list-of-models/",
+    ),
+    Scenario(
+        "items.read_item (or 404)",
+        "GET",
+        "/items/get-item-or-404/{item_id}",
+        "/items/get-item-or-404/item1",
+    ),
+    Scenario(
+        "items.update_item (car)",
+        "PUT",
+        "/items/update/{item_id}",
+        "/items/update/item1",
+        json={
+            "name": "Foow",
+            "description": "All my friends drive a low rider",
+        },
+    ),
+    Scenario(
+        "items.partial_update_item",
+        "PATCH",
+        "/items/partial-update/{item_id}",
+        "/items/partial-update/item1",
+        json={
+            "name": "Foow",
+            "description": "All my friends drive a low rider",
+        },
+    ),
+    Scenario(
+        "items.read_keyword_weights",
+        "GET",
+        "/items/keyword-weights/",
+        "/items/keyword-weights/",
+    ),
+    # exceptions
+    Scenario(
+        "cust_exceptions.read_unicorn",
+        "GET",
+        "/custom-exception-handler-unicorns/{name}",
+        "/custom-exception-handler-unicorns/foo",
+    ),
+    Scenario(
+        "cust_exceptions.read_unicorn (418)",
+        "GET",
+        "/custom-exception-handler-unicorns/{name}",
+        "/custom-exception-handler-unicorns/yolo",
+        expected_status=(418,),
+    ),
+    # tasks, dry runs: the queue would be full after a few requests
+    Scenario(
+        "tasks.task_run",
+        "POST",
+        "/tasks/run/{task_id}",
+        "/tasks/run/1?model_name=alexnet&task-name=bench&dry_run=true",
+        json={"item": ITEM, "user": USER, "importance": 3},
+    ),
+    Scenario("tasks.read_job", "GET", "/tasks/{job_id}", "/tasks/{job_id}"),
+    # files
+    *[
+        Scenario(
+            f"files.upload_files ({label})",
+            "POST",
+            "/files/upload-files/",
+            "/files/upload-files/",
+            files=[("files", f"bench-{label}.bin", size)],
+            expected_status=(201,),
+            max_requests=max_requests,
+        )
+        for label, size, max_requests in (
+            ("1KiB", KIB, None),
+            ("1MiB", MIB, 50),
+            ("16MiB", 16 * MIB, 10),
+        )
+    ],
+    *[
+        Scenario(
+            f"files.stream_upload ({label})",
+            "PUT",
+            "/files/stream/{filename}",
+            f"/files/stream/bench-stream-{label}.bin",
+            content_size=size,
+            expected_status=(201,),
+            max_requests=max_requests,
+        )
+        for label, size, max_requests in (
+            ("1MiB", MIB, 50),
+            ("16MiB", 16 * MIB, 10),
+        )
+    ],
+    Scenario(
+        "files.upload_files_and_form_data",
+        "POST",
+        "/files/upload-files-and-form-data/",
+        "/files/upload-files-and-form-data/",
+        files=[("file_A", "a.bin", 64 * KIB), ("file_B", "b.bin", 64 * KIB)],
+        form={"token": "foo"},
+        expected_status=(202,),
+    ),
+    # security, the login is slow by design (bcrypt)
+    Scenario(
+        "security.login_for_access_token",
+        "POST",
+        "/token",
+        "/token",
+        form={"username": "johndoe", "password": "secret"},
+        max_requests=20,
+    ),
+    Scenario(
+        "security.read_users_me",
+        "GET",
+        "security/users/me",
+        "security/users/me",
+        headers=BEARER,
+    ),
+    Scenario(
+        "security.read_own_items",
+        "GET",
+        "security/users/me/items/",
+        "security/users/me/items/",
+        headers=BEARER,
+    ),
+]
+
+# The profiler admin routes only exist with PROFILER_ENABLED. Arming expires
+# right away so that the other scenarios aren't profiled
+if settings.PROFILER_ENABLED:
+    PROFILER_KEY = {"X-Profiler-Key": settings.PROFILER_SECRET}
+    SCENARIOS += [
+        Scenario(
+            "profiler.arm_profiler",
+            "POST",
+            "/profiler/arm",
+            "/profiler/arm?requests=1&seconds=0.000001",
+            headers=PROFILER_KEY,
+        ),
+        Scenario(
+            "profiler.disarm_profiler",
+            "DELETE",
+            "/profiler/arm",
+            "/profiler/arm",
+            headers=PROFILER_KEY,
+            expected_status=(204,),
+        ),
+        Scenario(
+            "profiler.list_profiles",
+            "GET",
+            "/profiler/profiles",
+            "/profiler/profiles",
+            headers=PROFILER_KEY,
+        ),
+        Scenario(
+            "profiler.read_profile",
+            "GET",
+            "/profiler/profiles/{profile_id}",
+            "/profiler/profiles/unknown",
+            headers=PROFILER_KEY,
+            expected_status=(404,),
+        ),
+    ]
+
+# Scenarios of the api_router routes are under API_V1_STR
+SCENARIOS = [
+    scenario._replace(route=API + scenario.route, url=API + scenario.url)
+    for scenario in SCENARIOS
+]
+
+SCENARIOS.append(Scenario("home.index", "GET", "/", "/"))
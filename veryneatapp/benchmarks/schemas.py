@@ -0,0 +1,69 @@
+"""
+Micro-benchmarks of the schema fast paths (see api/schemas/trusted.py):
+each case builds the same model from trusted data with validation, as the
+routes did, and with the fast path. Eg:
+
+    python -m veryneatapp.benchmarks schemas
+"""
+import timeit
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from veryneatapp.api.schemas.item import ItemOutDB
+from veryneatapp.api.schemas.trusted import project
+from veryneatapp.api.schemas.user import UserCreate, UserInDB, UserOut
+from veryneatapp.models import Item
+
+
+class SchemaCase(NamedTuple):
+    name: str
+    validated: Callable[[], Any]
+    fast: Callable[[], Any]
+
+
+USER_IN = UserCreate(
+    username="johndoe",
+    full_name="John Doe",
+    email="johndoe@example.com",
+    password="secret",
+)
+USER_IN_DB = UserInDB(**USER_IN.dict(), hashed_password="supersecretsecret")
+DB_ITEM = Item(
+    id=1, title="item-00001", description="A very nice Item", owner_id=1
+)
+
+CASES = [
+    SchemaCase(
+        "users.fake_save_user (UserInDB)",
+        lambda: UserInDB(**USER_IN.dict(), hashed_password="supersecret"),
+        lambda: UserInDB.construct(
+            **USER_IN.dict(exclude={"password"}),
+            hashed_password="supersecret",
+        ),
+    ),
+    SchemaCase(
+        "users.create_user (UserInDB -> UserOut)",
+        lambda: UserOut.validate(USER_IN_DB),
+        lambda: project(USER_IN_DB, UserOut),
+    ),
+    SchemaCase(
+        "items bulk results (ORM -> ItemOutDB)",
+        lambda: ItemOutDB.from_orm(DB_ITEM),
+        lambda: project(DB_ITEM, ItemOutDB),
+    ),
+]
+
+
+def run_schema_benchmarks(
+    cases: List[SchemaCase], number: int = 10000
+) -> Dict[str, Dict[str, float]]:
+    """Microseconds per call of each case, with and without validation"""
+    results = {}
+    for case in cases:
+        validated = min(timeit.repeat(case.validated, number=number, repeat=3))
+        fast = min(timeit.repeat(case.fast, number=number, repeat=3))
+        results[case.name] = {
+            "validated_us": round(validated / number * 1e6, 3),
+            "fast_us": round(fast / number * 1e6, 3),
+            "speedup": round(validated / fast, 2),
+        }
+    return results
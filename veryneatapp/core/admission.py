@@ -0,0 +1,345 @@
+"""
+Admission control: requests are rejected before reaching the app when
+
+- the client went over its rate limit (token buckets per client, and per
+  client and route for the routes with their own limit): 429
+- the route has `limit` requests in flight and `max_queue` already waiting,
+  or a request waited more than `max_queue_wait` seconds for its turn: 503
+- the worker has `max_in_flight` requests in flight: 503
+
+with a `Retry-After` header. Each check is O(1) and doesn't await,
+except waiting for a concurrency slot.
+
+The token buckets are kept by a backend: `MemoryBackend` limits each worker
+on its own, `MmapBackend` shares the buckets of all the workers of a host
+through a memory-mapped file.
+"""
+import asyncio
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from veryneatapp.core.metrics import admission_rejected_total
+from veryneatapp.core.responses import FastJSONResponse
+
+T = TypeVar("T")
+# Requests per second and burst size
+RateLimit = Tuple[float, float]
+
+
+def take(
+    tokens: float,
+    updated: float,
+    now: float,
+    limit: RateLimit,
+    cost: float = 1.0,
+) -> Tuple[float, float]:
+    """Refills a bucket and takes `cost` tokens from it.
+    Returns the tokens left and 0, or the seconds to wait for enough tokens"""
+    rate, burst = limit
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBackend:
+    """Token buckets of this process, the least recently used
+    are dropped past `max_keys` (their clients get a full bucket)"""
+
+    def __init__(self, max_keys: int = 100000, timer=time.monotonic):
+        self.max_keys = max_keys
+        self.timer = timer
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, limit: RateLimit, cost: float = 1.0) -> float:
+        """0 if allowed, else the seconds to wait before retrying"""
+        now = self.timer()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [limit[1], now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            bucket[0], wait = take(bucket[0], bucket[1], now, limit, cost)
+            bucket[1] = now
+        return wait
+
+    def close(self) -> None:
+        self._buckets.clear()
+
+
+class MmapBackend:
+    """
+    Token buckets shared by the processes of a host, in a file of `slots`
+    fixed-size slots: key hash (uint64), tokens and update time (float64).
+    A key goes to the slot of its hash, taking it over from another key
+    on collision. Each slot is locked (fcntl record lock) while updated,
+    so processes only wait for each other on the same slot.
+    """
+
+    SLOT = struct.Struct("Qdd")
+
+    def __init__(self, path: str, slots: int = 65536, timer=time.time):
+        self.path = path
+        self.slots = slots
+        self.timer = timer  # shared by the processes, unlike monotonic
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._mmap = mmap.mmap(self._fd, size)
+        # Record locks are per process: the threads take this one as well
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_hash(key: str) -> int:
+        # Stable across processes, unlike hash(). 0 marks the empty slots
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def acquire(self, key: str, limit: RateLimit, cost: float = 1.0) -> float:
+        """0 if allowed, else the seconds to wait before retrying"""
+        key_hash = self.key_hash(key)
+        offset = (key_hash % self.slots) * self.SLOT.size
+        with self._lock:
+            self._lock_slot(offset, True)
+            try:
+                now = self.timer()
+                stored_hash, tokens, updated = self.SLOT.unpack_from(
+                    self._mmap, offset
+                )
+                if stored_hash != key_hash:
+                    tokens, updated = limit[1], now
+                tokens, wait = take(tokens, updated, now, limit, cost)
+                self.SLOT.pack_into(self._mmap, offset, key_hash, tokens, now)
+            finally:
+                self._lock_slot(offset, False)
+        return wait
+
+    def _lock_slot(self, offset: int, lock: bool) -> None:
+        fcntl.lockf(
+            self._fd,
+            fcntl.LOCK_EX if lock else fcntl.LOCK_UN,
+            self.SLOT.size,
+            offset,
+        )
+
+    def close(self) -> None:
+        self._mmap.close()
+        os.close(self._fd)
+
+
+def make_backend(name: str, path: str, slots: int):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "mmap":
+        return MmapBackend(path, slots)
+    raise ValueError(f"Unknown rate limit backend {name}")
+
+
+class ConcurrencyLimiter:
+    """At most `limit` requests at a time, `max_queue` others waiting
+    in FIFO order. Slots are handed over to the next waiter on release"""
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+
+    async def acquire(self, timeout: float) -> bool:
+        """False when the queue is full or the wait timed out"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            return False
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed over meanwhile
+            else:
+                self._discard(waiter)
+            raise
+        return True
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        # O(max_queue), only on timeouts and disconnections
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # in_flight is unchanged
+                return
+        self.in_flight -= 1
+
+
+class RouteTable(Generic[T]):
+    """Values by path template (eg. /items/{item_id}): a dict lookup for the
+    paths without parameters, the templates with some are matched in turn"""
+
+    def __init__(self, values: Dict[str, T]):
+        self._exact: Dict[str, Tuple[str, T]] = {}
+        self._patterns: List[Tuple[object, str, T]] = []
+        for template, value in values.items():
+            if "{" in template:
+                regex, _, _ = compile_path(template)
+                self._patterns.append((regex, template, value))
+            else:
+                self._exact[template] = (template, value)
+
+    def match(self, path: str) -> Optional[Tuple[str, T]]:
+        """(template, value) for the path, None if no template matches"""
+        found = self._exact.get(path)
+        if found is not None or not self._patterns:
+            return found
+        for regex, template, value in self._patterns:
+            if regex.match(path):
+                return template, value
+        return None
+
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def client_key(
+    scope: Scope,
+    key: str = "ip",
+    token_username: Optional[Callable[[str], Optional[str]]] = None,
+) -> str:
+    """Identifies the client by "ip", "token" (bearer token) or "user"
+    (username of the token). Only the tokens already verified are used
+    (`token_username` returns their username), the others fall back on the
+    IP: a client sending a new random token with each request would
+    otherwise get a new bucket each time"""
+    if key in ("token", "user") and token_username is not None:
+        authorization = _header(scope, b"authorization")
+        if authorization and authorization[:7].lower() == b"bearer ":
+            token = authorization[7:].decode("latin-1")
+            username = token_username(token)
+            if username is not None:
+                if key == "user":
+                    return f"user:{username}"
+                return f"token:{token}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else ''}"
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend,
+        default_limit: Optional[RateLimit] = None,
+        route_limits: Optional[Dict[str, RateLimit]] = None,
+        concurrency_limits: Optional[Dict[str, int]] = None,
+        max_queue: int = 100,
+        max_queue_wait: float = 2.0,
+        max_in_flight: int = 0,
+        key: str = "ip",
+        token_username: Optional[Callable[[str], Optional[str]]] = None,
+    ):
+        self.app = app
+        self.backend = backend
+        self.default_limit = default_limit
+        self.route_limits = RouteTable(route_limits or {})
+        self.concurrency_limits = RouteTable(
+            {
+                template: ConcurrencyLimiter(limit, max_queue)
+                for template, limit in (concurrency_limits or {}).items()
+            }
+        )
+        self.max_queue_wait = max_queue_wait
+        self.max_in_flight = max_in_flight
+        self.key = key
+        self.token_username = token_username
+        self.in_flight = 0
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            await self.reject(scope, receive, send, "overload", 1)
+            return
+
+        path = scope["path"]
+        client = client_key(scope, self.key, self.token_username)
+        wait = 0.0
+        if self.default_limit is not None:
+            wait = self.backend.acquire(client, self.default_limit)
+        route_limit = self.route_limits.match(path)
+        if not wait and route_limit is not None:
+            template, limit = route_limit
+            wait = self.backend.acquire(f"{template} {client}", limit)
+        if wait:
+            await self.reject(scope, receive, send, "rate_limit", wait)
+            return
+
+        concurrency = self.concurrency_limits.match(path)
+        limiter = None if concurrency is None else concurrency[1]
+        if limiter is not None and not await limiter.acquire(
+            self.max_queue_wait
+        ):
+            await self.reject(
+                scope, receive, send, "concurrency", self.max_queue_wait
+            )
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            if limiter is not None:
+                limiter.release()
+
+    async def reject(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        reason: str,
+        retry_after: float,
+    ) -> None:
+        admission_rejected_total.labels(reason).inc()
+        if reason == "rate_limit":
+            status_code, detail = 429, "Too Many Requests"
+        else:
+            status_code, detail = 503, "Service Unavailable"
+        response = FastJSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
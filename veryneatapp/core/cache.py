@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a time-to-live.
+    Thread safe, and all operations are O(1) except `evict`.
+
+    Args:
+        maxsize (int): max number of entries, the least recently used are evicted
+        ttl (float, optional): default time-to-live of the entries (seconds),
+            None for entries which only expire when evicted
+        timer (callable): clock used for the expiry times, time.monotonic by default.
+            Use time.time to pass absolute expiry times such as a JWT `exp`.
+        max_bytes (int, optional): max total `size` of the entries given to `set`,
+            the least recently used are evicted past it
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        timer: Callable[[], float] = time.monotonic,
+        max_bytes: Optional[int] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at, _ = entry
+                if expires_at is None or expires_at > self.timer():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like `get`, without counting a hit/miss nor refreshing the entry"""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        value, expires_at, _ = entry
+        if expires_at is not None and expires_at <= self.timer():
+            return default
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        expires_at: Optional[float] = None,
+        size: int = 0,
+    ) -> None:
+        """Store a value, which expires after `ttl` seconds (default to the
+        cache ttl) or at the `expires_at` time if given.
+        `size` counts towards max_bytes, a value larger than it isn't stored"""
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = None if ttl is None else self.timer() + ttl
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, expires_at, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def _remove(self, key: Hashable) -> Any:
+        # Must be called with the lock held
+        entry = self._data.pop(key, _MISSING)
+        if entry is not _MISSING:
+            self.bytes -= entry[2]
+        return entry
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._remove(key)
+        return default if entry is _MISSING else entry[0]
+
+    def evict(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Remove the entries for which predicate(key, value) is True,
+        returns the number of removed entries. O(n)"""
+        with self._lock:
+            keys = [
+                key
+                for key, (value, _, _) in self._data.items()
+                if predicate(key, value)
+            ]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters, eg. to be exposed as metrics"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+        }
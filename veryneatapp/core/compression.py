@@ -0,0 +1,255 @@
+"""
+Compression of the responses, negotiated with the Accept-Encoding header:
+zstd and brotli when the optional `zstandard` and `brotli` packages are
+installed, gzip otherwise.
+
+Only the text-like content types are compressed (images, archives etc. are
+already compressed), and the bodies smaller than `minimum_size` bytes are
+sent as is. Streamed responses are compressed chunk by chunk, each chunk
+flushed so the client gets it right away. Chunks of `offload_size` bytes or
+more are compressed on a thread pool, so a large body doesn't block the
+event loop (zlib, brotli and zstd release the GIL while compressing).
+
+Responses which already have a Content-Encoding (eg. the precompressed
+static files) or are sent with sendfile go through untouched.
+"""
+import zlib
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from veryneatapp.core.executors import BoundedExecutor
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+)
+# Levels for responses compressed on the fly: fast, still most of the gain
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Content-Encoding -> q-value of an Accept-Encoding header"""
+    accepted = {}
+    for coding in accept_encoding.lower().split(","):
+        name, _, params = coding.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip()] = quality
+    return accepted
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk of the body, flushed for the client to read it"""
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        """Compress the last chunk of the body"""
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(
+            level=ZSTD_LEVEL
+        ).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def available_encoders() -> Dict[str, Callable]:
+    """Content-Encoding -> encoder class, in order of preference"""
+    encoders: Dict[str, Callable] = {}
+    if zstandard is not None:
+        encoders["zstd"] = ZstdEncoder
+    if brotli is not None:
+        encoders["br"] = BrotliEncoder
+    encoders["gzip"] = GzipEncoder
+    return encoders
+
+
+def negotiate(accept_encoding: str, encodings) -> Optional[str]:
+    """The accepted encoding with the highest q-value, the first one of
+    `encodings` on a tie. None if none is accepted"""
+    accepted = accepted_encodings(accept_encoding)
+    default = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in encodings:
+        quality = accepted.get(name, default)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        offload_size: int = 64 * 1024,
+        executor: Optional[BoundedExecutor] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.executor = executor
+        self.encoders = available_encoders()
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate(accept_encoding, self.encoders)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    """Compresses the messages of one response"""
+
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: str, send: Send
+    ):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start: Optional[Message] = None
+        self.buffer = bytearray()
+        self.encoder = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            await self.on_start(message)
+        elif message["type"] != "http.response.body":
+            # pathsend/zerocopysend: the file goes out as is
+            await self.send_uncompressed(message)
+        elif self.encoder is not None:
+            await self.send_compressed(message)
+        else:
+            self.buffer += message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if len(self.buffer) >= self.middleware.minimum_size:
+                self.start_compression()
+                await self._send(self.start)
+                await self.send_compressed(
+                    {"body": bytes(self.buffer), "more_body": more_body}
+                )
+            elif not more_body:
+                await self.send_uncompressed(
+                    {"type": "http.response.body", "body": bytes(self.buffer)}
+                )
+            # else wait for the body to reach minimum_size
+
+    async def on_start(self, message: Message) -> None:
+        headers = Headers(raw=message["headers"])
+        content_length = headers.get("content-length")
+        if (
+            message["status"] in (204, 304)
+            or "content-encoding" in headers
+            or not is_compressible(headers.get("content-type", ""))
+        ):
+            self.passthrough = True
+            await self._send(message)
+            return
+        if "accept-encoding" not in headers.get("vary", "").lower():
+            MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+        if (
+            content_length is not None
+            and int(content_length) < self.middleware.minimum_size
+        ):
+            self.passthrough = True
+            await self._send(message)
+            return
+        self.start = message
+
+    async def send_uncompressed(self, message: Message) -> None:
+        self.passthrough = True
+        await self._send(self.start)
+        await self._send(message)
+
+    def start_compression(self) -> None:
+        self.encoder = self.middleware.encoders[self.encoding]()
+        headers = MutableHeaders(scope=self.start)
+        del headers["content-length"]
+        headers["content-encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # Another representation of the same resource
+            headers["etag"] = "W/" + etag
+
+    async def send_compressed(self, message: Message) -> None:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        compress = self.encoder.compress if more_body else self.encoder.finish
+        executor = self.middleware.executor
+        if executor is not None and len(body) >= self.middleware.offload_size:
+            body = await executor.run(compress, body)
+        else:
+            body = compress(body)
+        if body or not more_body:
+            await self._send(
+                {
+                    "type": "http.response.body",
+                    "body": body,
+                    "more_body": more_body,
+                }
+            )
@@ -1,5 +1,6 @@
+import json
 from os import getenv
-from typing import List, Union
+from typing import Dict, List, Tuple, Union
 
 from pydantic import AnyHttpUrl, BaseSettings, validator
 
@@ -15,9 +16,231 @@ class Settings(BaseSettings):
     WEBSERVER_HOST: str = getenv("WEBSERVER_HOST", "0.0.0.0")
     WEBSERVER_PORT: int = int(getenv("WEBSERVER_PORT", 5700))
 
+    # GraphQL, JWT/bcrypt and the templates are loaded on first use, and
+    # with WARMUP_MODE "background" (in a thread once started) or "startup"
+    # (before serving requests). "none" to only load them on first use
+    WARMUP_MODE: str = getenv("WARMUP_MODE", "background")
+
+    # run.py SERVER_PROFILE: "development" (uvicorn, RELOAD and DEBUG)
+    # or "production" (gunicorn with uvicorn workers, see core/server.py)
+    SERVER_PROFILE: str = getenv("SERVER_PROFILE", "development")
     RELOAD: bool = getenv("RELOAD", True)
     DEBUG: bool = getenv("DEBUG", True)
+    # Production profile: WORKERS_COUNT workers, or when 0 WORKERS_PER_CPU per
+    # CPU available to the container (up to WORKERS_MAX). SERVER_LOOP/HTTP
+    # "auto" use uvloop/httptools when installed. Workers are restarted after
+    # MAX_REQUESTS requests (+ up to MAX_REQUESTS_JITTER, 0 to disable), and
+    # with PRELOAD_APP the app is imported before the workers are forked
     WORKERS_COUNT: int = int(getenv("WORKERS_COUNT", 1))
+    WORKERS_PER_CPU: float = float(getenv("WORKERS_PER_CPU", 1))
+    WORKERS_MAX: int = int(getenv("WORKERS_MAX", 32))
+    SERVER_LOOP: str = getenv("SERVER_LOOP", "auto")
+    SERVER_HTTP: str = getenv("SERVER_HTTP", "auto")
+    SERVER_BACKLOG: int = int(getenv("SERVER_BACKLOG", 2048))
+    SERVER_KEEPALIVE: int = int(getenv("SERVER_KEEPALIVE", 5))
+    SERVER_WORKER_TIMEOUT: int = int(getenv("SERVER_WORKER_TIMEOUT", 60))
+    SERVER_GRACEFUL_TIMEOUT: int = int(getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+    MAX_REQUESTS: int = int(getenv("MAX_REQUESTS", 10000))
+    MAX_REQUESTS_JITTER: int = int(getenv("MAX_REQUESTS_JITTER", 1000))
+    PRELOAD_APP: bool = getenv("PRELOAD_APP", True)
+
+    # Admission control (core/admission.py), off unless ADMISSION_ENABLED
+    # (behind a reverse proxy, all the clients would share its IP). Each
+    # client (RATE_LIMIT_KEY "ip", "token" or "user", verified tokens only)
+    # gets RATE_LIMIT_RATE requests/s in bursts of up to RATE_LIMIT_BURST,
+    # and the routes of RATE_LIMIT_ROUTES (JSON
+    # {"/path/{param}": [rate, burst]}) their own limit on top of it.
+    # RATE_LIMIT_BACKEND "memory" limits each worker on its own, "mmap" shares
+    # the limits of the workers through the RATE_LIMIT_MMAP_PATH file.
+    # At most CONCURRENCY_LIMITS (JSON {"/path": n}) requests run at a time
+    # on these routes, ADMISSION_MAX_QUEUE others wait for up to
+    # ADMISSION_MAX_QUEUE_WAIT seconds. Past ADMISSION_MAX_IN_FLIGHT requests
+    # in flight in a worker (0: no limit), new ones are shed
+    ADMISSION_ENABLED: bool = getenv("ADMISSION_ENABLED", False)
+    RATE_LIMIT_KEY: str = getenv("RATE_LIMIT_KEY", "ip")
+    RATE_LIMIT_RATE: float = float(getenv("RATE_LIMIT_RATE", 50))
+    RATE_LIMIT_BURST: float = float(getenv("RATE_LIMIT_BURST", 100))
+    RATE_LIMIT_ROUTES: Dict[str, Tuple[float, float]] = json.loads(
+        getenv(
+            "RATE_LIMIT_ROUTES",
+            '{"/api/v1/token": [1, 10], "/api/v1/files/upload-files/": [1, 5]}',
+        )
+    )
+    RATE_LIMIT_BACKEND: str = getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_MMAP_PATH: str = getenv("RATE_LIMIT_MMAP_PATH", "ratelimit.db")
+    RATE_LIMIT_MMAP_SLOTS: int = int(getenv("RATE_LIMIT_MMAP_SLOTS", 65536))
+    CONCURRENCY_LIMITS: Dict[str, int] = json.loads(
+        getenv(
+            "CONCURRENCY_LIMITS",
+            '{"/api/v1/token": 8, "/api/v1/files/upload-files/": 4}',
+        )
+    )
+    ADMISSION_MAX_QUEUE: int = int(getenv("ADMISSION_MAX_QUEUE", 100))
+    ADMISSION_MAX_QUEUE_WAIT: float = float(
+        getenv("ADMISSION_MAX_QUEUE_WAIT", 2.0)
+    )
+    ADMISSION_MAX_IN_FLIGHT: int = int(getenv("ADMISSION_MAX_IN_FLIGHT", 1000))
+
+    # Bulk endpoints: at most BULK_MAX_ELEMENTS elements per request, written
+    # BULK_BATCH_SIZE at a time (a transaction each). The responses of the
+    # requests sent with an Idempotency-Key are kept IDEMPOTENCY_KEY_TTL
+    # seconds, a retry takes over a request with the same key which made no
+    # progress for IDEMPOTENCY_LOCK_TIMEOUT seconds
+    BULK_MAX_ELEMENTS: int = int(getenv("BULK_MAX_ELEMENTS", 10000))
+    BULK_BATCH_SIZE: int = int(getenv("BULK_BATCH_SIZE", 500))
+    IDEMPOTENCY_KEY_TTL: int = int(getenv("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+    IDEMPOTENCY_LOCK_TIMEOUT: int = int(getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+
+    # File uploads are streamed to UPLOAD_DIR in UPLOAD_CHUNK_SIZE chunks
+    # and rejected once they go over UPLOAD_MAX_SIZE (bytes)
+    UPLOAD_DIR: str = getenv("UPLOAD_DIR", "uploads")
+    UPLOAD_CHUNK_SIZE: int = int(getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+    UPLOAD_MAX_SIZE: int = int(getenv("UPLOAD_MAX_SIZE", 1024 * 1024 * 1024))
+
+    # Task queue: TASK_QUEUE_WORKER_TYPE is "thread" (I/O bound tasks)
+    # or "process" (CPU bound tasks)
+    TASK_QUEUE_MAX_SIZE: int = int(getenv("TASK_QUEUE_MAX_SIZE", 1000))
+    TASK_QUEUE_WORKERS: int = int(getenv("TASK_QUEUE_WORKERS", 4))
+    TASK_QUEUE_WORKER_TYPE: str = getenv("TASK_QUEUE_WORKER_TYPE", "thread")
+    TASK_QUEUE_JOURNAL: str = getenv("TASK_QUEUE_JOURNAL", "task_journal.db")
+
+    # Task results log, written in batches by a single thread per process.
+    # TASK_LOG_FSYNC_POLICY is "never", "batch" or "interval",
+    # the file is rotated when it reaches TASK_LOG_MAX_BYTES (0 to disable)
+    TASK_LOG_PATH: str = getenv("TASK_LOG_PATH", "task_out.txt")
+    TASK_LOG_FLUSH_INTERVAL: float = float(
+        getenv("TASK_LOG_FLUSH_INTERVAL", 0.5)
+    )
+    TASK_LOG_MAX_BATCH_RECORDS: int = int(
+        getenv("TASK_LOG_MAX_BATCH_RECORDS", 1000)
+    )
+    TASK_LOG_FSYNC_POLICY: str = getenv("TASK_LOG_FSYNC_POLICY", "never")
+    TASK_LOG_MAX_BYTES: int = int(
+        getenv("TASK_LOG_MAX_BYTES", 10 * 1024 * 1024)
+    )
+    TASK_LOG_BACKUP_COUNT: int = int(getenv("TASK_LOG_BACKUP_COUNT", 5))
+
+    # Verified tokens cache: decoded claims and user are kept until the token
+    # expires, or for AUTH_TOKEN_CACHE_MAX_TTL seconds at most
+    AUTH_TOKEN_CACHE_SIZE: int = int(getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+    AUTH_TOKEN_CACHE_MAX_TTL: int = int(getenv("AUTH_TOKEN_CACHE_MAX_TTL", 300))
+
+    # Password hashing/verification (bcrypt) runs on a dedicated executor
+    # of PASSWORD_HASH_WORKERS threads (or processes), logins are rejected with
+    # a 503 when PASSWORD_HASH_MAX_PENDING are already waiting (0: unbounded).
+    # With PASSWORD_REHASH, hashes which don't use PASSWORD_BCRYPT_ROUNDS
+    # are transparently upgraded on the next successful login
+    PASSWORD_HASH_WORKERS: int = int(getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING: int = int(
+        getenv("PASSWORD_HASH_MAX_PENDING", 100)
+    )
+    PASSWORD_HASH_USE_PROCESSES: bool = getenv(
+        "PASSWORD_HASH_USE_PROCESSES", False
+    )
+    PASSWORD_BCRYPT_ROUNDS: int = int(getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+    PASSWORD_REHASH: bool = getenv("PASSWORD_REHASH", True)
+
+    # Database, SQLite by default. The pool settings apply to each worker process
+    DATABASE_URL: str = getenv(
+        "DATABASE_URL", "sqlite+aiosqlite:///./veryneatapp.db"
+    )
+    DATABASE_POOL_SIZE: int = int(getenv("DATABASE_POOL_SIZE", 5))
+    DATABASE_MAX_OVERFLOW: int = int(getenv("DATABASE_MAX_OVERFLOW", 10))
+    DATABASE_POOL_TIMEOUT: int = int(getenv("DATABASE_POOL_TIMEOUT", 30))
+    DATABASE_POOL_PRE_PING: bool = getenv("DATABASE_POOL_PRE_PING", True)
+
+    # In-process cache of the GET routes decorated with @cache_response:
+    # at most RESPONSE_CACHE_MAX_ENTRIES responses, RESPONSE_CACHE_MAX_BYTES
+    # of bodies in total, kept RESPONSE_CACHE_TTL seconds by default
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(
+        getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+    )
+    RESPONSE_CACHE_MAX_BYTES: int = int(
+        getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    RESPONSE_CACHE_TTL: int = int(getenv("RESPONSE_CACHE_TTL", 60))
+
+    # Compressed variants of the static files are written to STATIC_CACHE_DIR,
+    # text files smaller than STATIC_COMPRESS_MIN_SIZE (bytes) aren't compressed
+    STATIC_CACHE_DIR: str = getenv("STATIC_CACHE_DIR", "static_cache")
+    STATIC_COMPRESS_MIN_SIZE: int = int(
+        getenv("STATIC_COMPRESS_MIN_SIZE", 1024)
+    )
+
+    # Responses are compressed with zstd, brotli or gzip (see
+    # core/compression.py) from COMPRESSION_MIN_SIZE bytes. Chunks of
+    # COMPRESSION_OFFLOAD_SIZE bytes or more are compressed on
+    # COMPRESSION_WORKERS threads, off the event loop
+    COMPRESSION_ENABLED: bool = getenv("COMPRESSION_ENABLED", True)
+    COMPRESSION_MIN_SIZE: int = int(getenv("COMPRESSION_MIN_SIZE", 1024))
+    COMPRESSION_OFFLOAD_SIZE: int = int(
+        getenv("COMPRESSION_OFFLOAD_SIZE", 64 * 1024)
+    )
+    COMPRESSION_WORKERS: int = int(getenv("COMPRESSION_WORKERS", 2))
+
+    # Stores shared by the workers (see core/shared_store.py): "memory" for a
+    # single worker, "socket" to share them through a server started by run.py
+    # on SHARED_STORE_SOCKET. Workers cache SHARED_STORE_FRONT_SIZE values
+    SHARED_STORE_BACKEND: str = getenv("SHARED_STORE_BACKEND", "memory")
+    SHARED_STORE_SOCKET: str = getenv(
+        "SHARED_STORE_SOCKET", "shared_store.sock"
+    )
+    SHARED_STORE_FRONT_SIZE: int = int(getenv("SHARED_STORE_FRONT_SIZE", 10000))
+
+    # Compiled templates are cached in TEMPLATE_CACHE_DIR and the rendered
+    # pages in memory. TEMPLATE_AUTO_RELOAD picks up template changes (dev)
+    # but disables the rendered pages cache
+    TEMPLATE_CACHE_DIR: str = getenv("TEMPLATE_CACHE_DIR", "template_cache")
+    TEMPLATE_RENDER_CACHE_SIZE: int = int(
+        getenv("TEMPLATE_RENDER_CACHE_SIZE", 128)
+    )
+    TEMPLATE_AUTO_RELOAD: bool = getenv("TEMPLATE_AUTO_RELOAD", False)
+
+    # Metrics of all the worker processes are shared through files in
+    # METRICS_DIR, emptied by run.py on start. Gauges copied from other objects
+    # (eg. the task queue depth) are updated every METRICS_COLLECT_INTERVAL s
+    METRICS_ENABLED: bool = getenv("METRICS_ENABLED", True)
+    METRICS_DIR: str = getenv("METRICS_DIR", "metrics")
+    METRICS_COLLECT_INTERVAL: float = float(
+        getenv("METRICS_COLLECT_INTERVAL", 1.0)
+    )
+
+    # Request profiler, off unless PROFILER_ENABLED. Requests are profiled with
+    # a X-Profile header signed with PROFILER_SECRET (also the key of the
+    # profiler admin routes), with a PROFILER_SAMPLE_RATE probability (0 to 1)
+    # or once armed. Stacks are sampled every PROFILER_INTERVAL seconds and
+    # the latest PROFILER_MAX_PROFILES profiles are kept in PROFILER_DIR
+    PROFILER_ENABLED: bool = getenv("PROFILER_ENABLED", False)
+    PROFILER_SECRET: str = getenv("PROFILER_SECRET", "")
+    PROFILER_SAMPLE_RATE: float = float(getenv("PROFILER_SAMPLE_RATE", 0))
+    PROFILER_INTERVAL: float = float(getenv("PROFILER_INTERVAL", 0.005))
+    PROFILER_DIR: str = getenv("PROFILER_DIR", "profiles")
+    PROFILER_MAX_PROFILES: int = int(getenv("PROFILER_MAX_PROFILES", 100))
+
+    # Server-Timing header splitting the time of the API routes into phases
+    SERVER_TIMING_ENABLED: bool = getenv("SERVER_TIMING_ENABLED", False)
+
+    # GraphQL: LRU caches of GRAPHQL_DOCUMENT_CACHE_SIZE parsed queries and
+    # GRAPHQL_PERSISTED_QUERIES_SIZE persisted queries. Operations deeper than
+    # GRAPHQL_MAX_DEPTH or resolving more than GRAPHQL_MAX_COMPLEXITY fields
+    # are rejected, at most GRAPHQL_MAX_BATCH_SIZE operations per request
+    GRAPHQL_DOCUMENT_CACHE_SIZE: int = int(
+        getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", 256)
+    )
+    GRAPHQL_PERSISTED_QUERIES_SIZE: int = int(
+        getenv("GRAPHQL_PERSISTED_QUERIES_SIZE", 1024)
+    )
+    GRAPHQL_MAX_DEPTH: int = int(getenv("GRAPHQL_MAX_DEPTH", 10))
+    GRAPHQL_MAX_COMPLEXITY: int = int(getenv("GRAPHQL_MAX_COMPLEXITY", 5000))
+    GRAPHQL_MAX_BATCH_SIZE: int = int(getenv("GRAPHQL_MAX_BATCH_SIZE", 20))
+
+    # Largest `limit` accepted by the paginated list endpoints. Their NDJSON
+    # streams read the database STREAM_PAGE_SIZE rows at a time
+    PAGE_SIZE_MAX: int = int(getenv("PAGE_SIZE_MAX", 500))
+    STREAM_PAGE_SIZE: int = int(getenv("STREAM_PAGE_SIZE", 500))
+
+    # JSON encoder of the responses: "auto", "orjson", "ujson" or "json"
+    JSON_BACKEND: str = getenv("JSON_BACKEND", "auto")
 
     # BACKEND_CORS_ORIGINS is a JSON-formatted list of origins
     # e.g: '["http://localhost", "http://localhost:4200", "http://localhost:3000", \
@@ -0,0 +1,85 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class ExecutorOverloadedError(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Dedicated, size limited executor to run blocking or CPU bound functions
+    (eg. bcrypt) from async code without stalling the event loop,
+    and without competing with the default threadpool used by sync routes.
+
+    At most `max_workers` calls run at the same time, the others wait in the
+    executor queue. When `max_pending` calls are already waiting,
+    `run` raises ExecutorOverloadedError instead of queuing more work.
+
+    The counters are only updated from the event loop thread, so they need no lock.
+    With `use_processes=True` the functions and arguments must be picklable
+    (ie. module level functions).
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_pending: int = 0,
+        use_processes: bool = False,
+        name: str = "executor",
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self.name = name
+        self.in_flight = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a free worker"""
+        return max(self.in_flight - self.max_workers, 0)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        if self.max_pending and self.queue_depth >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorOverloadedError(
+                f"{self.name}: {self.queue_depth} calls already waiting"
+            )
+        loop = asyncio.get_event_loop()
+        self.in_flight += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        try:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
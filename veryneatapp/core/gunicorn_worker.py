@@ -0,0 +1,8 @@
+"""gunicorn worker class of the production profile (see core/server.py)"""
+from uvicorn.workers import UvicornWorker
+
+from veryneatapp.core.server import event_loop, http_parser
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": event_loop(), "http": http_parser()}
@@ -0,0 +1,79 @@
+"""
+Optional subsystems (GraphQL, JWT/bcrypt, templates) imported and built on
+first use instead of when the app is imported, to cut the workers boot time.
+
+The registered objects are then built by `warm_up`, depending on
+settings.WARMUP_MODE:
+- "background": in a thread once the app started, while serving requests
+- "startup": before the app starts serving requests
+- "none": on first use only
+"""
+import asyncio
+import importlib
+import threading
+from types import ModuleType
+from typing import Callable, Generic, List, TypeVar
+
+from starlette.types import Receive, Scope, Send
+
+T = TypeVar("T")
+
+_UNSET = object()
+
+
+class Lazy(Generic[T]):
+    """
+    Value built by `factory` on the first `get()`, thread safe.
+    With `warm_up`, it is also built by `warm_up_all`.
+    """
+
+    registry: List["Lazy"] = []
+
+    def __init__(self, factory: Callable[[], T], warm_up: bool = True):
+        self.factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+        if warm_up:
+            self.registry.append(self)
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not _UNSET
+
+    def get(self) -> T:
+        if self._value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    self._value = self.factory()
+        return self._value
+
+
+def lazy_import(name: str) -> Lazy[ModuleType]:
+    return Lazy(lambda: importlib.import_module(name))
+
+
+class LazyASGIApp:
+    """ASGI app built on the first request"""
+
+    def __init__(self, factory: Callable[[], Callable]):
+        self.app = Lazy(factory)
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        await self.app.get()(scope, receive, send)
+
+
+def warm_up_all() -> None:
+    for lazy in Lazy.registry:
+        lazy.get()
+
+
+async def warm_up(mode: str) -> None:
+    loop = asyncio.get_event_loop()
+    if mode == "startup":
+        await loop.run_in_executor(None, warm_up_all)
+    elif mode == "background":
+        loop.run_in_executor(None, warm_up_all)
+    elif mode != "none":
+        raise ValueError(f"Unknown warm-up mode {mode}")
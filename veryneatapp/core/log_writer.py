@@ -0,0 +1,226 @@
+"""
+Buffered, batched writer for append-only log files such as task_out.txt.
+
+Opening the file in append mode for every line costs an open/close per record
+and lets lines from concurrent writers interleave. Instead, records are put on
+a queue and a single thread per process writes them in batches, with one
+`write` per batch on an O_APPEND file descriptor so lines are never torn.
+A batch that can't be written (eg. disk full) is logged and dropped, counted
+in `dropped_records`, and the writer keeps going.
+"""
+import atexit
+import fcntl
+import logging
+import os
+import queue
+import threading
+import time
+from enum import Enum
+from typing import List, Optional
+
+from veryneatapp.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FsyncPolicy(str, Enum):
+    never = "never"
+    batch = "batch"  # fsync after every batch
+    interval = "interval"  # fsync at most every `fsync_interval` seconds
+
+
+_STOP = object()
+
+
+class BatchedLogWriter:
+    """
+    Args:
+        path (str): log file path
+        flush_interval (float): max seconds a record waits before being written
+        max_batch_records (int): batch is written as soon as it has that many records
+        max_batch_bytes (int): batch is written as soon as it is that large
+        fsync_policy (str): one of FsyncPolicy
+        fsync_interval (float): seconds between fsyncs with the `interval` policy
+        max_bytes (int): rotate the file when it would exceed that size, 0 to disable
+        backup_count (int): number of rotated files to keep (path.1, path.2, ...)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 0.5,
+        max_batch_records: int = 1000,
+        max_batch_bytes: int = 1024 * 1024,
+        fsync_policy: str = FsyncPolicy.never,
+        fsync_interval: float = 1.0,
+        max_bytes: int = 0,
+        backup_count: int = 5,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch_records = max_batch_records
+        self.max_batch_bytes = max_batch_bytes
+        self.fsync_policy = FsyncPolicy(fsync_policy)
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+        self._last_fsync = 0.0
+        self.dropped_records = 0
+        atexit.register(self.close)
+
+    def _running(self) -> bool:
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_started(self) -> None:
+        # The pid check restarts the writer in forked children
+        # (eg. process pool workers), which don't inherit the thread
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                self._fd = None
+            self._thread = threading.Thread(
+                target=self._run, name="log-writer", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def write(self, record: str) -> None:
+        """Queue a record, a trailing newline is added if missing"""
+        self._ensure_started()
+        if not record.endswith("\n"):
+            record += "\n"
+        self._queue.put(record)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every record queued so far is written"""
+        if self._pid != os.getpid():
+            return True
+        self._ensure_started()
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        return flushed.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10) -> None:
+        """Write the pending records and stop the writer thread"""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._pid = None
+
+    def _run(self) -> None:
+        pending: List[str] = []
+        pending_bytes = 0
+        deadline = None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.monotonic(), 0)
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None  # flush_interval elapsed
+
+            if isinstance(entry, str):
+                pending.append(entry)
+                pending_bytes += len(entry)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if (
+                    len(pending) < self.max_batch_records
+                    and pending_bytes < self.max_batch_bytes
+                ):
+                    continue
+
+            if pending:
+                try:
+                    self._write_batch("".join(pending).encode())
+                except Exception:
+                    logger.exception(
+                        "Dropped %d records of %s", len(pending), self.path
+                    )
+                    self.dropped_records += len(pending)
+                pending, pending_bytes, deadline = [], 0, None
+            if isinstance(entry, threading.Event):
+                entry.set()
+            elif entry is _STOP:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                return
+
+    def _open(self) -> None:
+        self._fd = os.open(
+            self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+
+    def _write_batch(self, data: bytes) -> None:
+        try:
+            # Reopen if the file was rotated or removed by another process
+            if (
+                self._fd is None
+                or os.fstat(self._fd).st_ino != os.stat(self.path).st_ino
+            ):
+                self._reopen()
+        except FileNotFoundError:
+            self._reopen()
+
+        if self.max_bytes and (
+            os.fstat(self._fd).st_size + len(data) > self.max_bytes
+        ):
+            self._rotate()
+
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+
+        if self.fsync_policy == FsyncPolicy.batch or (
+            self.fsync_policy == FsyncPolicy.interval
+            and time.monotonic() - self._last_fsync >= self.fsync_interval
+        ):
+            os.fsync(self._fd)
+            self._last_fsync = time.monotonic()
+
+    def _reopen(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        self._open()
+
+    def _rotate(self) -> None:
+        # The lock stops several processes from rotating the same file
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_ino != os.stat(self.path).st_ino:
+                return  # already rotated by another process
+            if self.backup_count:
+                for i in range(self.backup_count - 1, 0, -1):
+                    source = f"{self.path}.{i}"
+                    if os.path.exists(source):
+                        os.replace(source, f"{self.path}.{i + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.truncate(self.path, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._reopen()
+
+
+task_log_writer = BatchedLogWriter(
+    settings.TASK_LOG_PATH,
+    flush_interval=settings.TASK_LOG_FLUSH_INTERVAL,
+    max_batch_records=settings.TASK_LOG_MAX_BATCH_RECORDS,
+    fsync_policy=settings.TASK_LOG_FSYNC_POLICY,
+    max_bytes=settings.TASK_LOG_MAX_BYTES,
+    backup_count=settings.TASK_LOG_BACKUP_COUNT,
+)
@@ -0,0 +1,614 @@
+"""
+Prometheus-style metrics shared by all the worker processes.
+
+Each process writes its samples to its own memory-mapped file in METRICS_DIR
+(a plain store, so updates cost a dict lookup and a `struct.pack_into`),
+and `/metrics` sums the files of all the processes when scraped.
+Counters and histograms of workers which exited are still counted: their
+file is merged into a single archive file (ARCHIVE_FILE) and removed, so the
+files don't pile up as the workers are recycled. Gauges are only counted for
+the live processes.
+
+Values of other objects (queue depth, cache stats...) are copied into gauges
+by the collectors (see `register_collector`), which run on scrape and
+at most every `collect_interval` seconds while requests are served.
+"""
+import fcntl
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, suppress
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from veryneatapp.core.config import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Response adds the charset
+# Seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+UNMATCHED_ROUTE = "<unmatched>"
+# Samples of the exited processes, and the lock of the merges into it
+ARCHIVE_FILE = "archive.db"
+ARCHIVE_LOCK = "archive.lock"
+
+
+class MmapStore:
+    """
+    float64 values by key, in a file read by the other processes.
+    Layout: used bytes (uint32) then entries of key length (uint32),
+    utf-8 key padded to 8 bytes and value (float64). An entry is written
+    before the used bytes are updated, so readers never see partial entries.
+    Only the process which created it writes to it.
+    """
+
+    HEADER_SIZE = 8
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._capacity = max(os.fstat(self._fd).st_size, self.INITIAL_SIZE)
+        os.ftruncate(self._fd, self._capacity)
+        self._mmap = mmap.mmap(self._fd, self._capacity)
+        self._positions: Dict[str, int] = {}
+        self._values: Dict[str, float] = {}
+        self._used = struct.unpack_from("I", self._mmap, 0)[0]
+        if self._used == 0:
+            self._used = self.HEADER_SIZE
+            struct.pack_into("I", self._mmap, 0, self._used)
+        for key, value, position in _read_entries(self._mmap, self._used):
+            self._positions[key] = position
+            self._values[key] = value
+        self._lock = threading.Lock()
+
+    def inc(self, key: str, amount: float = 1.0) -> None:
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            value = self._values[key] + amount
+            self._values[key] = value
+            struct.pack_into("d", self._mmap, position, value)
+
+    def set(self, key: str, value: float) -> None:
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            self._values[key] = value
+            struct.pack_into("d", self._mmap, position, value)
+
+    def get(self, key: str) -> float:
+        return self._values.get(key, 0.0)
+
+    def _add(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        padded = len(encoded) + (-(4 + len(encoded)) % 8)
+        size = 4 + padded + 8
+        while self._used + size > self._capacity:
+            self._grow()
+        struct.pack_into(
+            f"I{padded}sd", self._mmap, self._used, len(encoded), encoded, 0.0
+        )
+        position = self._used + 4 + padded
+        self._used += size
+        struct.pack_into("I", self._mmap, 0, self._used)
+        self._positions[key] = position
+        self._values[key] = 0.0
+        return position
+
+    def _grow(self) -> None:
+        self._capacity *= 2
+        os.ftruncate(self._fd, self._capacity)
+        self._mmap.close()
+        self._mmap = mmap.mmap(self._fd, self._capacity)
+
+    def close(self) -> None:
+        self._mmap.close()
+        os.close(self._fd)
+
+
+def _read_entries(data, used: int) -> Iterable[Tuple[str, float, int]]:
+    """(key, value, value position) of the entries of a store"""
+    position = MmapStore.HEADER_SIZE
+    while position < used:
+        length = struct.unpack_from("I", data, position)[0]
+        padded = length + (-(4 + length) % 8)
+        key = bytes(data[position + 4 : position + 4 + length]).decode("utf-8")
+        position += 4 + padded
+        yield key, struct.unpack_from("d", data, position)[0], position
+        position += 8
+
+
+def read_store(path: str) -> Iterable[Tuple[str, float]]:
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < MmapStore.HEADER_SIZE:
+        return
+    used = min(struct.unpack_from("I", data, 0)[0], len(data))
+    for key, value, _ in _read_entries(data, used):
+        yield key, value
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sample_key(name: str, labels: Sequence[Tuple[str, str]]) -> str:
+    return json.dumps([name, labels], separators=(",", ":"))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional["MetricsRegistry"] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry if registry is not None else REGISTRY
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self.registry.register(self)
+
+    def labels(self, *labelvalues: str):
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name}: expected labels {self.labelnames}"
+                )
+            labels = list(zip(self.labelnames, map(str, labelvalues)))
+            child = self._children[labelvalues] = self._child(labels)
+        return child
+
+    def _child(self, labels: List[Tuple[str, str]]):
+        return _Value(self.registry, sample_key(self.name, labels))
+
+    def sample_names(self) -> Tuple[str, ...]:
+        return (self.name,)
+
+
+class _Value:
+    __slots__ = ("registry", "key")
+
+    def __init__(self, registry: "MetricsRegistry", key: str):
+        self.registry = registry
+        self.key = key
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.registry.store().inc(self.key, amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.registry.store().inc(self.key, -amount)
+
+    def set(self, value: float) -> None:
+        self.registry.store().set(self.key, value)
+
+    def get(self) -> float:
+        return self.registry.store().get(self.key)
+
+
+class Counter(Metric):
+    """Only goes up. `set` is meant for counters kept by another object
+    (eg. the hits of a cache) and copied by a collector"""
+
+    type = "counter"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+
+class _HistogramValue:
+    __slots__ = ("store", "upper_bounds", "bucket_keys", "sum_key", "count_key")
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        labels: List[Tuple[str, str]],
+        upper_bounds: Sequence[float],
+    ):
+        self.store = registry.store
+        self.upper_bounds = upper_bounds
+        # Buckets are stored non cumulative: an observation is one increment
+        self.bucket_keys = [
+            sample_key(f"{name}_bucket", labels + [("le", _format(bound))])
+            for bound in upper_bounds
+        ]
+        self.sum_key = sample_key(f"{name}_sum", labels)
+        self.count_key = sample_key(f"{name}_count", labels)
+
+    def observe(self, value: float) -> None:
+        store = self.store()
+        store.inc(self.bucket_keys[bisect_left(self.upper_bounds, value)])
+        store.inc(self.sum_key, value)
+        store.inc(self.count_key)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Optional["MetricsRegistry"] = None,
+    ):
+        self.upper_bounds = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self, labels: List[Tuple[str, str]]):
+        return _HistogramValue(
+            self.registry, self.name, labels, self.upper_bounds
+        )
+
+    def sample_names(self) -> Tuple[str, ...]:
+        return (f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count")
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+class MetricsRegistry:
+    """
+    The metrics, and the store of the current process in `directory`
+    (created again after a fork so that each process has its own file)
+
+    Args:
+        directory (str): shared by the processes, emptied by the server
+            before starting the workers (see run.py)
+        collect_interval (float): min seconds between two runs of the
+            collectors from `maybe_collect`
+    """
+
+    def __init__(self, directory: str, collect_interval: float = 1.0):
+        self.directory = directory
+        self.collect_interval = collect_interval
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+        self._store: Optional[MmapStore] = None
+        self._pid: Optional[int] = None
+        self._next_collect = 0.0
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicated metric {metric.name}")
+        self.metrics[metric.name] = metric
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        self.collectors.append(collector)
+
+    def store(self) -> MmapStore:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._store = MmapStore(
+                        os.path.join(
+                            self.directory, f"metrics_{os.getpid()}.db"
+                        )
+                    )
+                    self._pid = os.getpid()
+        return self._store
+
+    def collect(self) -> None:
+        self._next_collect = time.monotonic() + self.collect_interval
+        for collector in self.collectors:
+            collector()
+
+    def maybe_collect(self) -> None:
+        if time.monotonic() >= self._next_collect:
+            self.collect()
+
+    @contextmanager
+    def _archive_lock(self):
+        """Held by the process merging files into the archive or reading
+        them, so a file is never counted twice or missed"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ARCHIVE_LOCK), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield  # closing the file releases the lock
+
+    def _archive(self, path: str) -> None:
+        try:
+            entries = list(read_store(path))
+        except FileNotFoundError:
+            return  # already archived by another process
+        gauges = {
+            name
+            for name, metric in self.metrics.items()
+            if metric.type == "gauge"
+        }
+        archive = MmapStore(os.path.join(self.directory, ARCHIVE_FILE))
+        try:
+            for key, value in entries:
+                if json.loads(key)[0] not in gauges:
+                    archive.inc(key, value)
+        finally:
+            archive.close()
+        os.remove(path)
+
+    def mark_process_dead(self, pid: int) -> None:
+        """Merges the counters and histograms of an exited process into the
+        archive file and removes its file (eg. when gunicorn reaps a worker).
+        Otherwise it's done on the next scrape"""
+        with self._archive_lock():
+            self._archive(os.path.join(self.directory, f"metrics_{pid}.db"))
+
+    def aggregate(self) -> Dict[str, float]:
+        """Samples of all the processes, by key"""
+        samples: Dict[str, float] = {}
+        with self._archive_lock():
+            paths = []
+            for path in glob.glob(os.path.join(self.directory, "metrics_*.db")):
+                pid = int(os.path.basename(path)[len("metrics_") : -len(".db")])
+                if pid == os.getpid() or _pid_alive(pid):
+                    paths.append(path)
+                else:
+                    self._archive(path)
+            archive = os.path.join(self.directory, ARCHIVE_FILE)
+            if os.path.exists(archive):
+                paths.append(archive)
+            for path in paths:
+                for key, value in read_store(path):
+                    samples[key] = samples.get(key, 0.0) + value
+        return samples
+
+    def generate_latest(self) -> str:
+        """Prometheus text exposition format"""
+        self.collect()
+        by_name: Dict[str, List[Tuple[List, float]]] = {}
+        for key, value in self.aggregate().items():
+            name, labels = json.loads(key)
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for metric in self.metrics.values():
+            samples = [
+                (name, labels, value)
+                for name in metric.sample_names()
+                for labels, value in sorted(by_name.get(name, ()))
+            ]
+            if isinstance(metric, Histogram):
+                samples = _cumulative_buckets(metric, samples)
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                if labels:
+                    labels = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    lines.append(f"{name}{{{labels}}} {_format(value)}")
+                else:
+                    lines.append(f"{name} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        if self._store is not None and self._pid == os.getpid():
+            self._store.close()
+        self._store = self._pid = None
+
+
+def _cumulative_buckets(histogram: Histogram, samples: List) -> List:
+    """The buckets of each child are counted up to their upper bound"""
+    bucket_name = f"{histogram.name}_bucket"
+    buckets: Dict[Tuple, Dict[str, float]] = {}
+    others = []
+    for name, labels, value in samples:
+        if name == bucket_name:
+            child = tuple(map(tuple, labels[:-1]))
+            buckets.setdefault(child, {})[labels[-1][1]] = value
+        else:
+            others.append((name, labels, value))
+    cumulative = []
+    for child, counts in sorted(buckets.items()):
+        total = 0.0
+        for bound in histogram.upper_bounds:
+            total += counts.get(_format(bound), 0.0)
+            labels = list(child) + [("le", _format(bound))]
+            cumulative.append((bucket_name, labels, total))
+    return cumulative + others
+
+
+def clear_directory(directory: str) -> None:
+    """Remove the files of a previous run, before the workers start"""
+    for path in glob.glob(os.path.join(directory, "metrics_*.db")):
+        os.remove(path)
+    for name in (ARCHIVE_FILE, ARCHIVE_LOCK):
+        with suppress(FileNotFoundError):
+            os.remove(os.path.join(directory, name))
+
+
+REGISTRY = MetricsRegistry(
+    settings.METRICS_DIR, collect_interval=settings.METRICS_COLLECT_INTERVAL
+)
+
+http_requests_total = Counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status code",
+    ("method", "route", "status"),
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration by method and route template",
+    ("method", "route"),
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests being processed"
+)
+task_queue_depth = Gauge(
+    "task_queue_depth", "Background tasks waiting for a worker"
+)
+cache_hits_total = Counter("cache_hits_total", "Cache hits", ("cache",))
+cache_misses_total = Counter("cache_misses_total", "Cache misses", ("cache",))
+cache_entries = Gauge("cache_entries", "Entries in the cache", ("cache",))
+executor_active = Gauge(
+    "executor_active", "Calls running on the executor", ("executor",)
+)
+executor_queued = Gauge(
+    "executor_queued",
+    "Calls waiting for a worker of the executor",
+    ("executor",),
+)
+executor_rejected_total = Counter(
+    "executor_rejected_total",
+    "Calls rejected by the executor, too many were waiting",
+    ("executor",),
+)
+admission_rejected_total = Counter(
+    "admission_rejected_total",
+    "Requests rejected by the admission control, by reason",
+    ("reason",),
+)
+
+
+def register_collector(collector: Callable[[], None]) -> None:
+    REGISTRY.register_collector(collector)
+
+
+def cache_collector(name: str, cache) -> Callable[[], None]:
+    """Collector of the stats of a TTLCache"""
+    hits = cache_hits_total.labels(name)
+    misses = cache_misses_total.labels(name)
+    entries = cache_entries.labels(name)
+
+    def collect() -> None:
+        stats = cache.stats()
+        hits.set(stats["hits"])
+        misses.set(stats["misses"])
+        entries.set(stats["size"])
+
+    return collect
+
+
+def executor_collector(executor) -> Callable[[], None]:
+    """Collector of the stats of a BoundedExecutor"""
+    active = executor_active.labels(executor.name)
+    queued = executor_queued.labels(executor.name)
+    rejected = executor_rejected_total.labels(executor.name)
+
+    def collect() -> None:
+        stats = executor.stats()
+        active.set(stats["in_flight"] - stats["queue_depth"])
+        queued.set(stats["queue_depth"])
+        rejected.set(stats["rejected"])
+
+    return collect
+
+
+class RouteTemplates:
+    """Path template (eg. /items/{item_id}) of the route matched for a request,
+    from the endpoint set in the scope by the router. A Mount sets its app
+    as the endpoint, so the templates of the mounts are keyed by their app
+    (eg. /static/{path} for the static files)"""
+
+    def __init__(self):
+        self._templates: Optional[Dict[int, str]] = None
+
+    def build(self, routes: Iterable, prefix: str = "") -> Dict[int, str]:
+        templates = {}
+        for route in routes:
+            if isinstance(route, Mount):
+                templates[id(route.app)] = f"{prefix}{route.path}/{{path}}"
+                templates.update(
+                    self.build(route.routes or (), prefix + route.path)
+                )
+            elif hasattr(route, "endpoint"):
+                templates.setdefault(id(route.endpoint), prefix + route.path)
+        return templates
+
+    def __call__(self, scope: Scope) -> str:
+        if self._templates is None:
+            self._templates = self.build(scope["app"].router.routes)
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        return self._templates.get(id(endpoint), UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """Counts and times the HTTP requests by route template"""
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.registry = registry
+        self.route_template = RouteTemplates()
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.labels().inc()
+        start = time.perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = (time.perf_counter_ns() - start) / 1e9
+            http_requests_in_flight.labels().dec()
+            method, route = scope["method"], self.route_template(scope)
+            http_requests_total.labels(method, route, status_code).inc()
+            http_request_duration_seconds.labels(method, route).observe(
+                duration
+            )
+            self.registry.maybe_collect()
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(REGISTRY.generate_latest(), media_type=CONTENT_TYPE)
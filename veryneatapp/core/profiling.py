@@ -0,0 +1,267 @@
+"""
+Opt-in statistical profiler of single requests.
+
+A request is profiled when it has a valid signed X-Profile header (see
+`sign_profile_header`), when it is picked by PROFILER_SAMPLE_RATE, or while
+the profiler is armed from the admin routes. A thread samples the profiled
+requests every PROFILER_INTERVAL seconds:
+- `[cpu]` samples: the event loop is running the request task, the stack
+  of the loop thread is recorded, from the task coroutine down
+- `[await]` samples: the task is suspended, its chain of awaiting
+  coroutines is recorded (eg. waiting on the database or on bcrypt in the
+  password executor). Sync routes show as awaiting run_in_threadpool.
+
+Profiles are written in the folded stacks format (one "frame;frame;... count"
+line per stack) read by flamegraph.pl and speedscope, to PROFILER_DIR which
+keeps the latest PROFILER_MAX_PROFILES. The middleware is only added with
+PROFILER_ENABLED, so the profiler costs nothing otherwise.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from veryneatapp.core.config import settings
+
+PROFILE_HEADER = "x-profile"
+PROFILE_SUFFIX = ".folded"
+
+
+def sign_profile_header(secret: str, ttl: int = 300) -> str:
+    """Value of the X-Profile header, valid for `ttl` seconds"""
+    expires = str(int(time.time()) + ttl)
+    signature = hmac.new(
+        secret.encode(), expires.encode(), hashlib.sha256
+    ).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_header(secret: str, value: str) -> bool:
+    expires, _, signature = value.partition(".")
+    if not secret or not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(
+        secret.encode(), expires.encode(), hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def _await_stack(coro) -> List[str]:
+    """Frames of a suspended coroutine and of the coroutines it awaits"""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(
+            coro, "gi_frame", None
+        )
+        if frame is None:
+            break
+        stack.append(_frame_name(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(
+            coro, "gi_yieldfrom", None
+        )
+    return stack
+
+
+def _running_stack(frame, root) -> List[str]:
+    """Frames of a running thread, from `root` (if found) down"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame))
+        if frame is root:
+            break
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class Profile:
+    def __init__(self, profile_id: str, task: asyncio.Task, thread_id: int):
+        self.profile_id = profile_id
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+
+    def sample(self, frames: Dict[int, object]) -> None:
+        coro = self.task.get_coro()
+        if asyncio.current_task(self.loop) is self.task:
+            frame = frames.get(self.thread_id)
+            stack = _running_stack(frame, getattr(coro, "cr_frame", None))
+            self.stacks[";".join(["[cpu]"] + stack)] += 1
+        else:
+            stack = _await_stack(coro)
+            self.stacks[";".join(["[await]"] + stack)] += 1
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+class Profiler:
+    """
+    Samples the active profiles from a thread, which only runs
+    while there are some. Profiles are saved to `directory`,
+    the oldest are removed past `max_profiles`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        interval: float = 0.005,
+        max_profiles: int = 100,
+    ):
+        self.directory = directory
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self.armed_requests = 0
+        self.armed_until = 0.0
+        self._profiles: Dict[str, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def arm(self, requests: int, seconds: float) -> None:
+        """Profile the next `requests` requests during `seconds`"""
+        self.armed_requests = requests
+        self.armed_until = time.monotonic() + seconds
+
+    def disarm(self) -> None:
+        self.armed_requests = 0
+
+    def take_armed(self) -> bool:
+        if self.armed_requests > 0 and time.monotonic() < self.armed_until:
+            self.armed_requests -= 1
+            return True
+        return False
+
+    def start(self, profile_id: str) -> Profile:
+        profile = Profile(
+            profile_id, asyncio.current_task(), threading.get_ident()
+        )
+        with self._lock:
+            self._profiles[profile_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._sample, name="profiler", daemon=True
+                )
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.pop(profile.profile_id, None)
+        self.save(profile)
+
+    def _sample(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles.values())
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+
+    def save(self, profile: Profile) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(profile.profile_id), "w") as file:
+            file.write(profile.folded())
+        for profile_id in self.list()[self.max_profiles :]:
+            try:
+                os.remove(self.path(profile_id))
+            except FileNotFoundError:
+                pass  # removed by another worker
+
+    def path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, profile_id + PROFILE_SUFFIX)
+
+    def list(self) -> List[str]:
+        """Ids of the saved profiles, latest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            (
+                name[: -len(PROFILE_SUFFIX)]
+                for name in names
+                if name.endswith(PROFILE_SUFFIX)
+            ),
+            reverse=True,
+        )
+
+
+def make_profile_id(scope: Scope) -> str:
+    path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:64]
+    return f"{time.time_ns():x}-{os.getpid()}-{scope['method']}-{path}"
+
+
+class ProfilerMiddleware:
+    """
+    Profiles the selected requests, whose response has an X-Profile-Id header.
+    Add it as the innermost middleware: the routes must run in the task of
+    the middleware (BaseHTTPMiddleware runs the app in another task).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        profiler: Profiler,
+        secret: str = "",
+        sample_rate: float = 0.0,
+    ):
+        self.app = app
+        self.profiler = profiler
+        self.secret = secret
+        self.sample_rate = sample_rate
+
+    def selected(self, scope: Scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        header = Headers(scope=scope).get(PROFILE_HEADER)
+        if header is not None and verify_profile_header(self.secret, header):
+            return True
+        return self.profiler.take_armed()
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http" or not self.selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = make_profile_id(scope)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        profile = self.profiler.start(profile_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.stop(profile)
+
+
+profiler = Profiler(
+    settings.PROFILER_DIR,
+    interval=settings.PROFILER_INTERVAL,
+    max_profiles=settings.PROFILER_MAX_PROFILES,
+)
@@ -0,0 +1,198 @@
+"""
+Server side cache of the responses of pure GET routes, with strong ETags.
+
+Routes opt in with the @cache_response decorator, placed under the
+@router.get decorator, in a router using CachedAPIRoute
+(veryneatapp.api.routing). Routes which modify the cached data are decorated
+with @invalidates and the same tags.
+
+A cached response is served without running the route, its dependencies
+(eg. X-Token checks) included: list the headers they read in `vary` so that
+each value gets its own entry.
+
+The cache lives in each worker process: @invalidates only reaches the
+worker which served the write. Data kept in a SharedStore reaches the other
+ones through `evict`, registered with its on_change (eg. for the items), but
+only with the socket backend (SHARED_STORE_BACKEND="socket"). Otherwise, and
+for the other data (eg. the database), the other workers keep their copy for
+at most the ttl of the route.
+"""
+import hashlib
+from typing import (
+    Awaitable,
+    Callable,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from veryneatapp.core.cache import TTLCache
+from veryneatapp.core.config import settings
+
+Endpoint = Callable[[Request], Awaitable[Response]]
+
+
+class CachePolicy(NamedTuple):
+    ttl: Optional[float]
+    vary: Tuple[str, ...]
+    tags: Tuple[str, ...]
+
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    raw_headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+    tags: FrozenSet[str]
+
+
+def cache_response(
+    ttl: Optional[float] = None,
+    vary: Sequence[str] = (),
+    tags: Sequence[str] = (),
+) -> Callable:
+    """
+    Cache the responses of the decorated GET route.
+
+    Args:
+        ttl (float, optional): seconds, settings.RESPONSE_CACHE_TTL by default
+        vary (list): request headers which are part of the cache key,
+            on top of the path and the query parameters
+        tags (list): names to invalidate the entries with, they can use the
+            path parameters, eg. "item:{item_id}"
+    """
+
+    def decorator(func: Callable) -> Callable:
+        func.__cache_policy__ = CachePolicy(
+            ttl, tuple(header.lower() for header in vary), tuple(tags)
+        )
+        return func
+
+    return decorator
+
+
+def invalidates(*tags: str) -> Callable:
+    """Remove the cached responses with these tags once the decorated route
+    succeeds. Tags can use the path parameters like in @cache_response"""
+
+    def decorator(func: Callable) -> Callable:
+        func.__cache_invalidates__ = tags
+        return func
+
+    return decorator
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    # If-None-Match uses the weak comparison
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return bool({"*", etag, "W/" + etag} & candidates)
+
+
+class ResponseCache:
+    """LRU cache of rendered responses, bounded in entries and in bytes"""
+
+    def __init__(self, maxsize: int, max_bytes: int, ttl: float):
+        self.entries = TTLCache(maxsize, ttl=ttl, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(request: Request, policy: CachePolicy) -> Hashable:
+        return (
+            request.url.path,
+            tuple(sorted(request.query_params.multi_items())),
+            tuple(request.headers.get(header) for header in policy.vary),
+        )
+
+    async def serve(
+        self, request: Request, policy: CachePolicy, call_next: Endpoint
+    ) -> Response:
+        """Response from the cache, or from `call_next` which is then cached"""
+        if request.method != "GET":
+            return await call_next(request)
+        key = self.key(request, policy)
+        entry = self.entries.get(key)
+        hit = entry is not None
+        if not hit:
+            response = await call_next(request)
+            entry = self._store(key, request, policy, response)
+            if entry is None:
+                return response
+        return self._replay(request, policy, entry, hit)
+
+    def _store(
+        self,
+        key: Hashable,
+        request: Request,
+        policy: CachePolicy,
+        response: Response,
+    ) -> Optional[CachedResponse]:
+        body = getattr(response, "body", None)  # None when streamed
+        if (
+            response.status_code != 200
+            or body is None
+            or response.background is not None
+            or "set-cookie" in response.headers
+        ):
+            return None
+        entry = CachedResponse(
+            status_code=response.status_code,
+            raw_headers=response.raw_headers,
+            body=body,
+            etag=make_etag(body),
+            tags=frozenset(
+                tag.format(**request.path_params) for tag in policy.tags
+            ),
+        )
+        self.entries.set(key, entry, ttl=policy.ttl, size=len(body))
+        return entry
+
+    @staticmethod
+    def _replay(
+        request: Request, policy: CachePolicy, entry: CachedResponse, hit: bool
+    ) -> Response:
+        headers = [(b"etag", entry.etag.encode("latin-1"))]
+        if policy.vary:
+            headers.append((b"vary", ", ".join(policy.vary).encode("latin-1")))
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(entry.etag, if_none_match):
+            response = Response(status_code=304)
+            response.raw_headers = headers
+            return response
+        response = Response(entry.body, status_code=entry.status_code)
+        response.raw_headers = entry.raw_headers + headers
+        response.raw_headers.append((b"x-cache", b"HIT" if hit else b"MISS"))
+        return response
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """Remove the entries with any of these tags, returns their number"""
+        tags = set(tags)
+        return self.entries.evict(
+            lambda _, entry: not entry.tags.isdisjoint(tags)
+        )
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+response_cache = ResponseCache(
+    maxsize=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    ttl=settings.RESPONSE_CACHE_TTL,
+)
+
+
+def evict(*tags: str) -> int:
+    """Remove the cached responses with any of these tags now, eg. when
+    another worker changed their data"""
+    return response_cache.invalidate(tags)
@@ -0,0 +1,175 @@
+"""
+App-wide JSON response class with a pluggable encoder backend.
+
+The backend is picked with settings.JSON_BACKEND:
+- "orjson" or "ujson" when installed (optional dependencies)
+- "json" for the standard library
+- "auto" (default) for the fastest one available
+The output is the same as FastAPI's default JSONResponse.
+
+FastJSONResponse can also be given pydantic models (and datetime, UUID, etc.)
+directly: returning `FastJSONResponse(model)` from a route skips the
+intermediate `jsonable_encoder` dict tree and the response_model validation.
+
+NDJSONResponse streams the objects of an (async) iterable, one JSON document
+per line, encoded by the same backend.
+"""
+import inspect
+import json
+import warnings
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Optional,
+    Type,
+    Union,
+)
+
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+from starlette.responses import JSONResponse, StreamingResponse
+
+from veryneatapp.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+def _default(obj: Any) -> Any:
+    """Encodes what the JSON backends don't, the same way jsonable_encoder does"""
+    if isinstance(obj, BaseModel):
+        obj_dict = obj.dict(by_alias=True)
+        return obj_dict.get("__root__", obj_dict)
+    return pydantic_encoder(obj)
+
+
+def _orjson_dumps(content: Any) -> bytes:
+    # datetime and str/int subclasses (eg. Enum) go through _default to get
+    # the exact same output as jsonable_encoder
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+        | orjson.OPT_PASSTHROUGH_DATACLASS,
+    )
+
+
+def _ujson_dumps(content: Any) -> bytes:
+    return ujson.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        escape_forward_slashes=False,
+        reject_bytes=False,
+    ).encode("utf-8")
+
+
+def _json_dumps(content: Any) -> bytes:
+    # Same options as starlette's JSONResponse
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+JSON_BACKENDS = {
+    "orjson": (orjson, _orjson_dumps),
+    "ujson": (ujson, _ujson_dumps),
+    "json": (json, _json_dumps),
+}
+
+
+def get_json_dumps(backend: str) -> Callable[[Any], bytes]:
+    """Returns the dumps function of the backend, falls back to the standard
+    library when the backend isn't installed"""
+    if backend == "auto":
+        backend = next(
+            name for name, (module, _) in JSON_BACKENDS.items() if module
+        )
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {backend}")
+    module, dumps = JSON_BACKENDS[backend]
+    if module is None:
+        warnings.warn(f"{backend} is not installed, using the json module")
+        return _json_dumps
+    return dumps
+
+
+class FastJSONResponse(JSONResponse):
+    dumps = staticmethod(get_json_dumps(settings.JSON_BACKEND))
+
+    def render(self, content: Any) -> bytes:
+        return self.dumps(content)
+
+
+class NDJSONResponse(StreamingResponse):
+    """
+    Streams the objects of `content` as they are produced, validated by
+    `model` like a route response_model (eg. ORM objects with an orm_mode
+    model). The lines are sent in chunks of about `chunk_size` bytes, the first
+    one right away, and each chunk waits for the server to take the previous
+    one, so a slow client slows the producer down instead of filling memory.
+    """
+
+    media_type = "application/x-ndjson"
+    chunk_size = 64 * 1024
+    dumps = staticmethod(FastJSONResponse.dumps)
+
+    def __init__(
+        self,
+        content: Union[AsyncIterable[Any], Iterable[Any]],
+        model: Optional[Type[BaseModel]] = None,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        background=None,
+    ):
+        super().__init__(
+            self.encode(content, model),
+            status_code=status_code,
+            headers=headers,
+            background=background,
+        )
+
+    async def encode(
+        self,
+        content: Union[AsyncIterable[Any], Iterable[Any]],
+        model: Optional[Type[BaseModel]],
+    ) -> AsyncIterator[bytes]:
+        if not inspect.isasyncgen(content) and not hasattr(
+            content, "__aiter__"
+        ):
+            content = _aiter(content)
+        buffer = bytearray()
+        first = True
+        async for obj in content:
+            if model is not None:
+                obj = model.validate(obj)
+            buffer += self.dumps(obj)
+            buffer += b"\n"
+            if first or len(buffer) >= self.chunk_size:
+                first = False
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+
+async def _aiter(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    for obj in iterable:
+        yield obj
@@ -0,0 +1,79 @@
+"""
+Password hashing, shared by the authentication routes and the crud layer.
+bcrypt calls are CPU bound: the async helpers run them on password_executor.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from veryneatapp.core.config import settings
+from veryneatapp.core.executors import BoundedExecutor
+from veryneatapp.core.lazy import Lazy
+
+
+def make_pwd_context():
+    """Hashes with a different bcrypt cost are marked as deprecated,
+    so they get upgraded by verify_and_update"""
+    # passlib is slow to import: loaded on first use
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+        bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+        bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    )
+
+
+pwd_context = Lazy(make_pwd_context)
+
+# bcrypt takes ~250ms of CPU per call: keep it off the event loop
+password_executor = BoundedExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    use_processes=settings.PASSWORD_HASH_USE_PROCESSES,
+    name="password-hasher",
+)
+
+
+def verify_password(plain_password: str, hashed_password: str):
+    return pwd_context.get().verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str):
+    return pwd_context.get().hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Returns whether the password matches, and a new hash if the current
+    one is deprecated (eg. the bcrypt cost changed)"""
+    return pwd_context.get().verify_and_update(plain_password, hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    """get_password_hash, run on the password executor"""
+    return await password_executor.run(get_password_hash, password)
+
+
+async def check_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password, run on the password executor.
+    Raises ExecutorOverloadedError when too many calls are waiting"""
+    return await password_executor.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """hash_password of many passwords, in parallel on all the workers of
+    the password executor without queuing past their number"""
+    semaphore = asyncio.Semaphore(password_executor.max_workers)
+
+    async def hash_one(password: str) -> str:
+        async with semaphore:
+            return await hash_password(password)
+
+    return await asyncio.gather(*(hash_one(p) for p in passwords))
@@ -0,0 +1,234 @@
+"""
+Server launchers used by run.py, selected with settings.SERVER_PROFILE.
+
+- "development": uvicorn with the reloader and debug mode
+- "production": gunicorn managing uvicorn workers. The number of workers is
+  derived from the CPUs available to the process (cgroup quota included),
+  uvloop/httptools are used when installed, the workers are recycled after
+  MAX_REQUESTS requests, and with PRELOAD_APP the app is imported once in
+  the master process and shared copy-on-write with the forked workers.
+  Without gunicorn installed, falls back to uvicorn's process manager
+  (workers aren't recycled).
+
+With SHARED_STORE_BACKEND="socket", the server of the stores shared by the
+workers (see core/shared_store.py) runs in its own process meanwhile. The
+"memory" backend keeps a copy per worker: a warning is logged when it is used
+with more than one worker.
+"""
+import gc
+import importlib.util
+import logging
+import math
+import multiprocessing
+import os
+import time
+from typing import Dict, Optional
+
+from veryneatapp.core.config import settings
+from veryneatapp.core.metrics import REGISTRY, clear_directory
+from veryneatapp.core.shared_store import serve
+
+APP = "veryneatapp.main:app"
+
+logger = logging.getLogger(__name__)
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    """CPU quota of the container (eg. `docker run --cpus 1.5`), if any"""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    # cgroup v1: a quota of -1 means no limit
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> float:
+    """CPUs this process can use: its affinity, capped by the cgroup quota"""
+    try:
+        cpus: float = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return cpus
+
+
+def workers_count() -> int:
+    """WORKERS_COUNT, or when it's 0 WORKERS_PER_CPU workers per available
+    CPU (rounded up), between 1 and WORKERS_MAX"""
+    if settings.WORKERS_COUNT > 0:
+        return settings.WORKERS_COUNT
+    count = math.ceil(available_cpus() * settings.WORKERS_PER_CPU)
+    return max(1, min(count, settings.WORKERS_MAX))
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def event_loop() -> str:
+    """SERVER_LOOP, "auto" picks uvloop when installed"""
+    if settings.SERVER_LOOP != "auto":
+        return settings.SERVER_LOOP
+    return "uvloop" if _installed("uvloop") else "asyncio"
+
+
+def http_parser() -> str:
+    """SERVER_HTTP, "auto" picks httptools when installed"""
+    if settings.SERVER_HTTP != "auto":
+        return settings.SERVER_HTTP
+    return "httptools" if _installed("httptools") else "h11"
+
+
+def gunicorn_options() -> Dict:
+    return {
+        "bind": f"{settings.WEBSERVER_HOST}:{settings.WEBSERVER_PORT}",
+        "workers": workers_count(),
+        "worker_class": "veryneatapp.core.gunicorn_worker.Worker",
+        "backlog": settings.SERVER_BACKLOG,
+        "keepalive": settings.SERVER_KEEPALIVE,
+        "timeout": settings.SERVER_WORKER_TIMEOUT,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+        "max_requests": settings.MAX_REQUESTS,
+        "max_requests_jitter": settings.MAX_REQUESTS_JITTER,
+        "preload_app": settings.PRELOAD_APP,
+        "pre_fork": _pre_fork,
+        "child_exit": _child_exit,
+    }
+
+
+def load_app():
+    """Imports the app. When preloaded, the lazily loaded subsystems are
+    also loaded before the workers are forked, so they share them"""
+    from veryneatapp.core.lazy import warm_up_all
+    from veryneatapp.main import app
+
+    if settings.PRELOAD_APP:
+        warm_up_all()
+    return app
+
+
+def _pre_fork(server, worker) -> None:
+    # Objects allocated so far are left alone by the garbage collector
+    # of the workers, so it doesn't write to (and copy) their memory pages
+    gc.freeze()
+
+
+def _child_exit(server, worker) -> None:
+    # The metrics of the recycled workers are merged into a single file
+    REGISTRY.mark_process_dead(worker.pid)
+
+
+def run_gunicorn() -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self) -> None:
+            for name, value in gunicorn_options().items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return load_app()
+
+    Application().run()
+
+
+def run_uvicorn(**options) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        APP,
+        host=settings.WEBSERVER_HOST,
+        port=settings.WEBSERVER_PORT,
+        **options,
+    )
+
+
+def start_store_server(
+    path: str, timeout: float = 5.0
+) -> multiprocessing.Process:
+    """Starts the shared store server, returns once it listens on `path`"""
+    if os.path.exists(path):
+        os.unlink(path)
+    process = multiprocessing.Process(
+        target=serve, args=(path,), name="shared-store", daemon=True
+    )
+    process.start()
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if not process.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("The shared store server didn't start")
+        time.sleep(0.01)
+    return process
+
+
+def server_workers() -> int:
+    """Number of workers run by run_server"""
+    if settings.SERVER_PROFILE == "production":
+        return workers_count()
+    return settings.WORKERS_COUNT or 1
+
+
+def check_shared_store() -> None:
+    workers = server_workers()
+    if settings.SHARED_STORE_BACKEND == "memory" and workers > 1:
+        logger.warning(
+            "%d workers with SHARED_STORE_BACKEND=memory: each one has its "
+            "own items and users, set SHARED_STORE_BACKEND=socket to share "
+            "them",
+            workers,
+        )
+
+
+def run() -> None:
+    # The metrics of the workers of a previous run would be added up
+    clear_directory(settings.METRICS_DIR)
+    check_shared_store()
+    store_server = None
+    if settings.SHARED_STORE_BACKEND == "socket":
+        store_server = start_store_server(settings.SHARED_STORE_SOCKET)
+    try:
+        run_server()
+    finally:
+        if store_server is not None:
+            store_server.terminate()
+
+
+def run_server() -> None:
+    if settings.SERVER_PROFILE == "development":
+        run_uvicorn(
+            reload=settings.RELOAD,
+            debug=settings.DEBUG,
+            workers=server_workers(),
+        )
+    elif settings.SERVER_PROFILE == "production":
+        if _installed("gunicorn"):
+            run_gunicorn()
+        else:
+            logger.warning("gunicorn isn't installed: workers aren't recycled")
+            run_uvicorn(
+                workers=workers_count(),
+                loop=event_loop(),
+                http=http_parser(),
+                backlog=settings.SERVER_BACKLOG,
+                timeout_keep_alive=settings.SERVER_KEEPALIVE,
+            )
+    else:
+        raise ValueError(f"Unknown server profile {settings.SERVER_PROFILE}")
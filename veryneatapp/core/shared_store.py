@@ -0,0 +1,280 @@
+"""
+Key-value stores shared by the worker processes (eg. the items and users of
+the demo routes), so a write handled by one worker is seen by the others.
+
+The values are kept by a backend, picked with SHARED_STORE_BACKEND:
+- "memory": a dict of this process, for a single worker (and the tests)
+- "socket": a `StoreServer` process started by run.py along the workers,
+  reached over a Unix socket. Each worker keeps the values it read in an
+  LRU (front tier), so repeat reads don't leave the process. Reads go
+  through it to the server (read-through), writes go to the server then to
+  it (write-through), and the server sends the key of each write to the
+  other workers, which drop it from their LRU: their next read gets the
+  new value.
+
+A worker talks to the server over a single connection, so the responses
+and the invalidations come in the order the server handled them: a value
+read before a write can't be kept after that write's invalidation. When
+the connection is lost the LRU is emptied, as invalidations may be missed.
+
+The values are JSON documents, which the server keeps in memory only.
+"""
+import asyncio
+import json
+import os
+import struct
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from veryneatapp.core.cache import TTLCache
+from veryneatapp.core.config import settings
+
+FRAME_HEADER = struct.Struct("!I")
+_MISSING = object()
+_ABSENT = object()  # cached "no value" of the keys never set
+_FROM_RESPONSE = object()
+
+
+def encode_frame(message: List) -> bytes:
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> List:
+    header = await reader.readexactly(FRAME_HEADER.size)
+    (size,) = FRAME_HEADER.unpack(header)
+    return json.loads(await reader.readexactly(size))
+
+
+class StoreServer:
+    """
+    Holds the values of all the stores. Requests are `["get", store, key]`
+    and `["set", store, key, value]` frames (a 4 bytes length, then JSON),
+    answered in order with `["ok", value]` and `["ok"]`. The other
+    connections get an `["invalidate", store, key]` frame on each set
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data: Dict[Tuple[str, str], Any] = {}
+        self._writers = set()
+        self._server = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left by a previous run
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=self.path
+        )
+
+    async def close(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                operation, store, key, *value = await read_frame(reader)
+                if operation == "get":
+                    writer.write(
+                        encode_frame(["ok", self.data.get((store, key))])
+                    )
+                elif operation == "set":
+                    self.data[(store, key)] = value[0]
+                    writer.write(encode_frame(["ok"]))
+                    invalidation = encode_frame(["invalidate", store, key])
+                    for other in self._writers:
+                        if other is not writer:
+                            other.write(invalidation)
+                else:
+                    writer.write(
+                        encode_frame(
+                            ["error", f"Unknown operation {operation}"]
+                        )
+                    )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # the worker went away
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+def serve(path: str) -> None:
+    """Runs a StoreServer until the process is terminated (see run.py)"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(StoreServer(path).start())
+    loop.run_forever()
+
+
+class MemoryBackend:
+    """Values of this process only"""
+
+    def __init__(self):
+        self.data: Dict[Tuple[str, str], Any] = {}
+
+    async def get(self, store: str, key: str) -> Any:
+        return self.data.get((store, key))
+
+    async def set(self, store: str, key: str, value: Any) -> None:
+        self.data[(store, key)] = value
+
+    def on_change(self, store: str, callback: Callable[[str], None]) -> None:
+        pass  # no other process writes
+
+    async def close(self) -> None:
+        self.data.clear()
+
+
+class SocketBackend:
+    """Client of a StoreServer with an LRU of `front_size` values.
+    Connects on first use, ie. in each worker after the fork"""
+
+    def __init__(self, path: str, front_size: int = 10000):
+        self.path = path
+        self.front = TTLCache(maxsize=front_size)
+        self._callbacks: Dict[str, List[Callable[[str], None]]] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connecting: Optional[asyncio.Lock] = None
+        self._listener: Optional[asyncio.Future] = None
+        # Requests waiting for their response, in the order they were sent:
+        # (future, front key, value to cache or _FROM_RESPONSE)
+        self._pending: Deque[
+            Tuple[asyncio.Future, Tuple[str, str], Any]
+        ] = deque()
+
+    async def get(self, store: str, key: str) -> Any:
+        value = self.front.get((store, key), _MISSING)
+        if value is _MISSING:
+            value = await self._request(["get", store, key], (store, key))
+        return None if value is _ABSENT else value
+
+    async def set(self, store: str, key: str, value: Any) -> None:
+        await self._request(["set", store, key, value], (store, key), value)
+
+    def on_change(self, store: str, callback: Callable[[str], None]) -> None:
+        """callback(key) is called when another worker set a key of `store`"""
+        self._callbacks.setdefault(store, []).append(callback)
+
+    async def _request(
+        self, message: List, front_key: Tuple[str, str], value=_FROM_RESPONSE
+    ) -> Any:
+        writer = await self._connection()
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((future, front_key, value))
+        writer.write(encode_frame(message))
+        await writer.drain()
+        return await future
+
+    async def _connection(self) -> asyncio.StreamWriter:
+        if self._writer is not None:
+            return self._writer
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self._writer is None:
+                reader, self._writer = await asyncio.open_unix_connection(
+                    self.path
+                )
+                self._listener = asyncio.ensure_future(
+                    self._listen(reader, self._writer)
+                )
+        return self._writer
+
+    async def _listen(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # The LRU is updated here, as each frame is read: a value read
+        # before an invalidation is cached before the invalidation drops it
+        try:
+            while True:
+                message = await read_frame(reader)
+                if message[0] == "invalidate":
+                    _, store, key = message
+                    self.front.pop((store, key))
+                    for callback in self._callbacks.get(store, ()):
+                        callback(key)
+                    continue
+                future, front_key, value = self._pending.popleft()
+                if message[0] == "error":
+                    if not future.done():
+                        future.set_exception(ValueError(message[1]))
+                    continue
+                result = message[1] if len(message) > 1 else None
+                if value is _FROM_RESPONSE:
+                    value = _ABSENT if result is None else result
+                self.front.set(front_key, value)
+                if not future.done():
+                    future.set_result(value)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._disconnected(writer)
+
+    def _disconnected(self, writer: asyncio.StreamWriter) -> None:
+        writer.close()
+        if self._writer is writer:
+            self._writer = None
+        # Invalidations may have been missed meanwhile
+        self.front.clear()
+        while self._pending:
+            future, _, _ = self._pending.popleft()
+            if not future.done():
+                future.set_exception(
+                    ConnectionError("Shared store connection lost")
+                )
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def make_backend(name: str, path: str, front_size: int):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "socket":
+        return SocketBackend(path, front_size)
+    raise ValueError(f"Unknown shared store backend {name}")
+
+
+shared_backend = make_backend(
+    settings.SHARED_STORE_BACKEND,
+    settings.SHARED_STORE_SOCKET,
+    settings.SHARED_STORE_FRONT_SIZE,
+)
+
+
+class SharedStore:
+    """
+    The values of namespace `name` of the backend. `defaults` are the values
+    of the keys never set (eg. demo data). The values returned are shared
+    (with the LRU of the socket backend): copy them to modify them.
+    """
+
+    def __init__(
+        self, name: str, defaults: Optional[Dict[str, Any]] = None, backend=None
+    ):
+        self.name = name
+        self.defaults = defaults or {}
+        self.backend = shared_backend if backend is None else backend
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        value = await self.backend.get(self.name, key)
+        if value is None:
+            return self.defaults.get(key, default)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        await self.backend.set(self.name, key, value)
+
+    def on_change(self, callback: Callable[[str], None]) -> None:
+        """callback(key) is called when another worker set a key,
+        eg. to drop the cached responses which used its value"""
+        self.backend.on_change(self.name, callback)
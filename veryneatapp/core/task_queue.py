@@ -0,0 +1,312 @@
+"""
+In-process task engine used instead of Starlette's BackgroundTasks.
+
+BackgroundTasks run sync functions on the shared anyio/asyncio threadpool, so
+a burst of tasks starves every other sync dependency, and anything not yet run
+is lost when the worker restarts. The TaskQueue below:
+- uses its own pool of worker threads (or processes for CPU bound tasks)
+- has a bounded queue, `submit` raises TaskQueueFullError when it is full
+- journals every task in a SQLite database so queued tasks survive restarts
+  (tasks which were running when the process died are run again)
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from veryneatapp.core.config import settings
+
+# Finished tasks are kept in the journal for status lookups, then purged
+FINISHED_TASKS_RETENTION_SECONDS = 24 * 60 * 60
+
+
+class TaskQueueFullError(Exception):
+    pass
+
+
+class TaskStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TaskJournal:
+    """SQLite journal of the tasks, shared by all the uvicorn workers.
+    Each task is owned by the pid of the process which queued it."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    kwargs TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    owner INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_tasks_status ON tasks (status)"
+            )
+
+    def add(self, task_id: str, name: str, kwargs: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tasks VALUES (?, ?, ?, ?, NULL, ?, ?, ?)",
+                (
+                    task_id,
+                    name,
+                    json.dumps(kwargs),
+                    TaskStatus.queued.value,
+                    os.getpid(),
+                    now,
+                    now,
+                ),
+            )
+
+    def remove(self, task_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def set_status(
+        self, task_id: str, status: TaskStatus, error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status.value, error, time.time(), task_id),
+            )
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, name, status, error, created_at, updated_at "
+                "FROM tasks WHERE id = ?",
+                (task_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def claim_unfinished(self) -> List[Tuple[str, str, Dict]]:
+        """Take ownership of the unfinished tasks left behind by dead processes
+        (or by a previous incarnation of this pid), oldest first"""
+        pid = os.getpid()
+        claimed = []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, kwargs, owner FROM tasks "
+                "WHERE status IN (?, ?) ORDER BY created_at",
+                (TaskStatus.queued.value, TaskStatus.running.value),
+            ).fetchall()
+            for row in rows:
+                if row["owner"] != pid and _pid_alive(row["owner"]):
+                    continue
+                cursor = self._conn.execute(
+                    "UPDATE tasks SET owner = ?, status = ? WHERE id = ? AND owner = ?",
+                    (pid, TaskStatus.queued.value, row["id"], row["owner"]),
+                )
+                if cursor.rowcount:
+                    claimed.append(
+                        (row["id"], row["name"], json.loads(row["kwargs"]))
+                    )
+        return claimed
+
+    def purge_finished(self, older_than: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM tasks WHERE status IN (?, ?) AND updated_at < ?",
+                (TaskStatus.done.value, TaskStatus.failed.value, older_than),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TaskQueue:
+    """
+    Bounded task queue processed by a dedicated pool of workers.
+    Task functions must be registered with the `task` decorator so that
+    they can be found by name when recovering tasks from the journal,
+    and their keyword arguments must be JSON serializable.
+
+    Usage:
+        @task_queue.task
+        def send_email(to: str): ...
+
+        task_id = task_queue.submit(send_email, to="johndoe@example.com")
+        task_queue.status(task_id)
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        max_size: int = 1000,
+        workers: int = 4,
+        worker_type: str = "thread",
+    ):
+        if worker_type not in ("thread", "process"):
+            raise ValueError(f"Unknown worker type: {worker_type}")
+        self.journal_path = journal_path
+        self.max_size = max_size
+        self.workers = workers
+        self.worker_type = worker_type
+        self._registry: Dict[str, Callable] = {}
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._threads: List[threading.Thread] = []
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._journal: Optional[TaskJournal] = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @staticmethod
+    def _task_name(func: Callable) -> str:
+        return f"{func.__module__}:{func.__qualname__}"
+
+    def task(self, func: Callable) -> Callable:
+        """Decorator registering a task function"""
+        self._registry[self._task_name(func)] = func
+        return func
+
+    @property
+    def started(self) -> bool:
+        return self._journal is not None
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """Start the workers and re-queue the tasks recovered from the journal"""
+        with self._start_lock:
+            if self.started:
+                return
+            self._stopping.clear()
+            self._journal = TaskJournal(self.journal_path)
+            self._journal.purge_finished(
+                time.time() - FINISHED_TASKS_RETENTION_SECONDS
+            )
+            if self.worker_type == "process":
+                self._process_pool = ProcessPoolExecutor(self.workers)
+            self._threads = [
+                threading.Thread(
+                    target=self._work, name=f"task-worker-{i}", daemon=True
+                )
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            recovered = self._journal.claim_unfinished()
+        if recovered:
+            # The queue is bounded, so recovered tasks are fed in the background
+            threading.Thread(
+                target=self._requeue, args=(recovered,), daemon=True
+            ).start()
+
+    def _requeue(self, recovered: List[Tuple[str, str, Dict]]) -> None:
+        for entry in recovered:
+            if self._stopping.is_set():
+                return
+            self._queue.put(entry)
+
+    def submit(self, func: Callable, **kwargs) -> str:
+        """Journal and queue a task, returns its id.
+        Raises TaskQueueFullError when the queue is full"""
+        if not self.started:
+            self.start()
+        name = self._task_name(func)
+        if name not in self._registry:
+            raise ValueError(f"{name} is not registered as a task")
+        task_id = uuid.uuid4().hex
+        self._journal.add(task_id, name, kwargs)
+        try:
+            self._queue.put_nowait((task_id, name, kwargs))
+        except queue.Full:
+            self._journal.remove(task_id)
+            raise TaskQueueFullError(
+                f"Task queue is full ({self.max_size} tasks)"
+            )
+        return task_id
+
+    def status(self, task_id: str) -> Optional[Dict]:
+        if not self.started:
+            self.start()
+        return self._journal.get(task_id)
+
+    def _work(self) -> None:
+        while True:
+            entry = self._queue.get()
+            # Tasks left in the queue stay `queued` in the journal
+            # and are recovered on the next start
+            if entry is None or self._stopping.is_set():
+                return
+            task_id, name, kwargs = entry
+            self._journal.set_status(task_id, TaskStatus.running)
+            try:
+                func = self._registry[name]
+                if self._process_pool is not None:
+                    self._process_pool.submit(func, **kwargs).result()
+                else:
+                    func(**kwargs)
+            except Exception as exc:  # pylint: disable=broad-except
+                self._journal.set_status(
+                    task_id, TaskStatus.failed, error=repr(exc)
+                )
+            else:
+                self._journal.set_status(task_id, TaskStatus.done)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers, running tasks are completed if `wait` is True"""
+        with self._start_lock:
+            if not self.started:
+                return
+            self._stopping.set()
+            # Each worker exits on its next get, freeing a slot for the
+            # next sentinel, so these puts can't block forever
+            for _ in self._threads:
+                self._queue.put(None)
+            if wait:
+                for thread in self._threads:
+                    thread.join()
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=wait)
+                self._process_pool = None
+            self._threads = []
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._journal.close()
+            self._journal = None
+
+
+task_queue = TaskQueue(
+    journal_path=settings.TASK_QUEUE_JOURNAL,
+    max_size=settings.TASK_QUEUE_MAX_SIZE,
+    workers=settings.TASK_QUEUE_WORKERS,
+    worker_type=settings.TASK_QUEUE_WORKER_TYPE,
+)
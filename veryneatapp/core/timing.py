@@ -0,0 +1,136 @@
+"""
+Request timing headers, added by a pure ASGI middleware: the response
+messages go straight through, so streamed responses aren't buffered as with
+a BaseHTTPMiddleware (which also runs the app in another task).
+
+- X-Process-Time: seconds until the response starts, as the headers can't
+  wait for the body
+- Server-Timing (opt-in): the same time split into the phases of the
+  FastAPI routes, in milliseconds: `deps` (request body and dependencies),
+  `handler` (the endpoint) and `serialize` (response model validation and
+  encoding), `app` being the total. The routes record their phases with
+  `timed_handler` and `timed_endpoint` (see CachedAPIRoute)
+"""
+import asyncio
+import functools
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PHASES = ("deps", "handler", "serialize")
+
+
+class Timings:
+    """perf_counter marks of the phases of one request"""
+
+    __slots__ = ("start", "marks")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        self.marks[name] = perf_counter()
+
+    def server_timing(self, end: float) -> str:
+        """Server-Timing header value, each phase lasting until the next one
+        (phases are missing when the route failed before reaching them)"""
+        metrics = []
+        marks = sorted(self.marks.items(), key=lambda mark: mark[1])
+        for (phase, at), (_, until) in zip(marks, marks[1:] + [("", end)]):
+            if phase in PHASES:
+                metrics.append(f"{phase};dur={(until - at) * 1000:.3f}")
+        metrics.append(f"app;dur={(end - self.start) * 1000:.3f}")
+        return ", ".join(metrics)
+
+
+# Set for the requests getting a Server-Timing header only
+_timings: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+def timed_handler(handler: Callable) -> Callable:
+    """Marks the start of the deps phase and the end of the route"""
+
+    async def route_handler(request: Request) -> Response:
+        timings = _timings.get()
+        if timings is None:
+            return await handler(request)
+        timings.mark("deps")
+        try:
+            return await handler(request)
+        finally:
+            timings.mark("end")
+
+    return route_handler
+
+
+def timed_endpoint(endpoint: Callable) -> Callable:
+    """Marks the start of the handler and serialize phases around the
+    endpoint. Sync endpoints run in the threadpool, in a copy of the
+    context: they update the same Timings"""
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def timed(**values):
+            timings = _timings.get()
+            if timings is None:
+                return await endpoint(**values)
+            timings.mark("handler")
+            try:
+                return await endpoint(**values)
+            finally:
+                timings.mark("serialize")
+
+    else:
+
+        @functools.wraps(endpoint)
+        def timed(**values):
+            timings = _timings.get()
+            if timings is None:
+                return endpoint(**values)
+            timings.mark("handler")
+            try:
+                return endpoint(**values)
+            finally:
+                timings.mark("serialize")
+
+    return timed
+
+
+class ProcessTimeMiddleware:
+    def __init__(self, app: ASGIApp, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        timings = Timings(start) if self.server_timing else None
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                end = perf_counter()
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", str(end - start))
+                if timings is not None:
+                    headers.append("Server-Timing", timings.server_timing(end))
+            await send(message)
+
+        if timings is None:
+            await self.app(scope, receive, send_wrapper)
+            return
+        token = _timings.set(timings)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
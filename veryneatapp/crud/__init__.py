@@ -0,0 +1,3 @@
+from .crud_idempotency import idempotency_key
+from .crud_item import item
+from .crud_user import user
@@ -0,0 +1,227 @@
+import base64
+import json
+import sys
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp.db.base_class import Base
+
+ModelType = TypeVar("ModelType", bound=Base)
+CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
+UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque cursor holding the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError as exc:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from exc
+    if not isinstance(values, list):
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than all the strings starting with `prefix`,
+    None if there is no such string"""
+    for i in reversed(range(len(prefix))):
+        if ord(prefix[i]) < sys.maxunicode:
+            return prefix[:i] + chr(ord(prefix[i]) + 1)
+    return None
+
+
+class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    def __init__(self, model: Type[ModelType], sort_key: str = "id"):
+        """
+        Repository with default methods to Create, Read, Update, Delete (CRUD).
+
+        **Parameters**
+
+        * `model`: A SQLAlchemy model class
+        * `sort_key`: Column the pages of `get_page` are sorted and filtered
+          on, it must be indexed together with the primary key
+        """
+        self.model = model
+        self.sort_key = sort_key
+
+    async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        return await db.get(self.model, id)
+
+    async def get_multi(
+        self, db: AsyncSession, *, skip: int = 0, limit: int = 100
+    ) -> List[ModelType]:
+        result = await db.execute(
+            select(self.model).order_by(self.model.id).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
+
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        q: Optional[str] = None,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        Keyset pagination: returns a page of rows sorted on (sort_key, id)
+        and the cursor of the next page (None on the last page).
+
+        A page starts right after the cursor by seeking into the
+        (sort_key, id) index, so each page costs O(log n + limit) whatever its
+        position, unlike `skip` which still reads and discards `skip` rows
+        (it is only applied when there is no cursor).
+
+        `q` keeps the rows whose sort_key starts with it, as a range on the
+        same index rather than a LIKE scan. The range follows the binary
+        order of the strings (SQLite default, "C" collation on PostgreSQL).
+        """
+        columns = self._sort_columns()
+        query = select(self.model).order_by(*columns)
+        if q:
+            query = query.filter(columns[0] >= q)
+            upper_bound = prefix_upper_bound(q)
+            if upper_bound is not None:
+                query = query.filter(columns[0] < upper_bound)
+        if cursor:
+            values = self.parse_cursor(cursor)
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+        elif skip:
+            query = query.offset(skip)
+        # One extra row tells whether there is a next page
+        result = await db.execute(query.limit(limit + 1))
+        rows = result.scalars().all()
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor([getattr(last, c.key) for c in columns])
+
+    def _sort_columns(self) -> List:
+        columns = [getattr(self.model, self.sort_key)]
+        if self.sort_key != "id":
+            columns.append(self.model.id)
+        return columns
+
+    def parse_cursor(self, cursor: str) -> List[Any]:
+        values = decode_cursor(cursor)
+        if len(values) != len(self._sort_columns()):
+            raise InvalidCursorError(f"Invalid cursor: {cursor}")
+        return values
+
+    def stream(
+        self,
+        db: AsyncSession,
+        *,
+        q: Optional[str] = None,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        page_size: int = 500,
+    ) -> AsyncIterator[ModelType]:
+        """
+        All the rows `get_page` would return from `cursor` on, fetched
+        `page_size` at a time. Each page is a separate short query, and its
+        rows leave the session once consumed, so memory stays bounded
+        however long the client takes to read them.
+        An invalid cursor raises InvalidCursorError right away.
+        """
+        if cursor:
+            self.parse_cursor(cursor)
+
+        async def rows() -> AsyncIterator[ModelType]:
+            next_cursor, next_skip = cursor, skip
+            while True:
+                page, next_cursor = await self.get_page(
+                    db, q=q, cursor=next_cursor, skip=next_skip, limit=page_size
+                )
+                for row in page:
+                    yield row
+                    db.expunge(row)
+                if next_cursor is None:
+                    return
+                next_skip = 0
+
+        return rows()
+
+    async def create(
+        self, db: AsyncSession, *, obj_in: CreateSchemaType
+    ) -> ModelType:
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data)  # type: ignore
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def create_many(
+        self, db: AsyncSession, *, objs_in: List[CreateSchemaType]
+    ) -> List[ModelType]:
+        """Add the objects and flush them in one go, they are committed
+        by the caller (eg. with the rest of a batch)"""
+        db_objs = [
+            self.model(**jsonable_encoder(obj_in))  # type: ignore
+            for obj_in in objs_in
+        ]
+        db.add_all(db_objs)
+        await db.flush()
+        return db_objs
+
+    async def get_many(
+        self, db: AsyncSession, ids: Iterable[Any]
+    ) -> Dict[Any, ModelType]:
+        """Objects by id, the missing ones are left out"""
+        result = await db.execute(
+            select(self.model).filter(self.model.id.in_(set(ids)))
+        )
+        return {obj.id: obj for obj in result.scalars()}
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]],
+    ) -> ModelType:
+        if isinstance(obj_in, dict):
+            update_data = obj_in
+        else:
+            update_data = obj_in.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            if hasattr(db_obj, field):
+                setattr(db_obj, field, value)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def remove(self, db: AsyncSession, *, id: int) -> ModelType:
+        obj = await db.get(self.model, id)
+        await db.delete(obj)
+        await db.commit()
+        return obj
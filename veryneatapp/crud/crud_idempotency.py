@@ -0,0 +1,122 @@
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp.models.idempotency_key import IdempotencyKey
+
+
+class CRUDIdempotencyKey:
+    """
+    Requests sent with an Idempotency-Key: the first one claims the key,
+    records its progress (the results of each batch, in the transaction of
+    the batch) and finally its response, which is replayed to the retries.
+    A retry takes over a claimed key which made no progress for
+    `lock_timeout` seconds (eg. its worker died) and resumes from there.
+    """
+
+    def __init__(self, purge_interval: float = 3600):
+        self.purge_interval = purge_interval
+        self._purged_at = 0.0
+
+    async def get(
+        self, db: AsyncSession, *, key: str
+    ) -> Optional[IdempotencyKey]:
+        result = await db.execute(
+            select(IdempotencyKey).filter(IdempotencyKey.key == key)
+        )
+        return result.scalars().first()
+
+    async def claim(
+        self,
+        db: AsyncSession,
+        *,
+        key: str,
+        request_hash: str,
+        ttl: float,
+        lock_timeout: float,
+    ) -> Tuple[IdempotencyKey, bool]:
+        """The row of the key, and whether this request owns it"""
+        now = time.time()
+        await self.purge(db, expired_before=now - ttl, key=key)
+        row = IdempotencyKey(
+            key=key,
+            request_hash=request_hash,
+            response=b"[]",
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(row)
+        try:
+            await db.commit()
+            return row, True
+        except IntegrityError:
+            await db.rollback()
+        row = await self.get(db, key=key)
+        if (
+            row.status_code is not None
+            or row.request_hash != request_hash
+            or row.updated_at > now - lock_timeout
+        ):
+            return row, False
+        # Only one of the concurrent retries gets it
+        result = await db.execute(
+            update(IdempotencyKey)
+            .filter(
+                IdempotencyKey.id == row.id,
+                IdempotencyKey.updated_at == row.updated_at,
+            )
+            .values(updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        await db.refresh(row)
+        return row, result.rowcount == 1
+
+    def progress(self, row: IdempotencyKey, results: bytes) -> None:
+        """Results of the batches done, committed with the current batch"""
+        row.response = results
+        row.updated_at = time.time()
+
+    async def complete(
+        self,
+        db: AsyncSession,
+        *,
+        row: IdempotencyKey,
+        status_code: int,
+        response: bytes,
+    ) -> None:
+        row.status_code = status_code
+        row.response = response
+        row.updated_at = time.time()
+        await db.commit()
+
+    async def abandon(self, db: AsyncSession, *, key: str) -> None:
+        """Let the next retry take over right away, after a failure"""
+        await db.rollback()
+        await db.execute(
+            update(IdempotencyKey)
+            .filter(IdempotencyKey.key == key)
+            .values(updated_at=0)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+    async def purge(
+        self, db: AsyncSession, *, expired_before: float, key: str
+    ) -> None:
+        """Delete `key` once expired, and the other expired keys
+        every `purge_interval` seconds"""
+        query = delete(IdempotencyKey).filter(
+            IdempotencyKey.created_at < expired_before
+        )
+        if time.time() - self._purged_at < self.purge_interval:
+            query = query.filter(IdempotencyKey.key == key)
+        else:
+            self._purged_at = time.time()
+        await db.execute(query.execution_options(synchronize_session=False))
+
+
+idempotency_key = CRUDIdempotencyKey()
@@ -0,0 +1,41 @@
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp.api.schemas.item import ItemCreate, ItemUpdate
+from veryneatapp.crud.base import CRUDBase
+from veryneatapp.models.item import Item
+
+
+class CRUDItem(CRUDBase[Item, ItemCreate, ItemUpdate]):
+    async def create_with_owner(
+        self, db: AsyncSession, *, obj_in: ItemCreate, owner_id: int
+    ) -> Item:
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data, owner_id=owner_id)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def get_multi_by_owner(
+        self,
+        db: AsyncSession,
+        *,
+        owner_id: int,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Item]:
+        result = await db.execute(
+            select(self.model)
+            .filter(Item.owner_id == owner_id)
+            .order_by(Item.id)
+            .offset(skip)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+
+item = CRUDItem(Item, sort_key="title")
@@ -0,0 +1,105 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp.api.schemas.user import UserCreate, UserUpdate
+from veryneatapp.core import security
+from veryneatapp.crud.base import CRUDBase
+from veryneatapp.models.user import User
+
+
+class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
+    async def get_by_username(
+        self, db: AsyncSession, *, username: str
+    ) -> Optional[User]:
+        result = await db.execute(
+            select(User).filter(User.username == username)
+        )
+        return result.scalars().first()
+
+    async def get_by_email(
+        self, db: AsyncSession, *, email: str
+    ) -> Optional[User]:
+        result = await db.execute(select(User).filter(User.email == email))
+        return result.scalars().first()
+
+    async def create(self, db: AsyncSession, *, obj_in: UserCreate) -> User:
+        db_obj = User(
+            **obj_in.dict(exclude={"password"}),
+            hashed_password=await security.hash_password(obj_in.password),
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def create_many(
+        self, db: AsyncSession, *, objs_in: List[UserCreate]
+    ) -> List[User]:
+        hashed_passwords = await security.hash_passwords(
+            [obj_in.password for obj_in in objs_in]
+        )
+        db_objs = [
+            User(
+                **obj_in.dict(exclude={"password"}),
+                hashed_password=hashed_password,
+            )
+            for obj_in, hashed_password in zip(objs_in, hashed_passwords)
+        ]
+        db.add_all(db_objs)
+        await db.flush()
+        return db_objs
+
+    async def get_taken(
+        self,
+        db: AsyncSession,
+        *,
+        usernames: Iterable[str],
+        emails: Iterable[str]
+    ) -> Tuple[Set[str], Set[str]]:
+        """The usernames and emails already used by a user"""
+        usernames, emails = set(usernames), set(emails)
+        result = await db.execute(
+            select(User.username, User.email).filter(
+                or_(User.username.in_(usernames), User.email.in_(emails))
+            )
+        )
+        taken_usernames, taken_emails = set(), set()
+        for username, email in result:
+            taken_usernames.add(username)
+            taken_emails.add(email)
+        return taken_usernames & usernames, taken_emails & emails
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: User,
+        obj_in: Union[UserUpdate, Dict[str, Any]]
+    ) -> User:
+        if isinstance(obj_in, dict):
+            update_data = dict(obj_in)
+        else:
+            update_data = obj_in.dict(exclude_unset=True)
+        if update_data.get("password"):
+            update_data["hashed_password"] = await security.hash_password(
+                update_data.pop("password")
+            )
+        return await super().update(db, db_obj=db_obj, obj_in=update_data)
+
+    async def authenticate(
+        self, db: AsyncSession, *, username: str, password: str
+    ) -> Optional[User]:
+        user = await self.get_by_username(db, username=username)
+        if not user:
+            return None
+        verified, _ = await security.check_password(
+            password, user.hashed_password
+        )
+        if not verified:
+            return None
+        return user
+
+
+user = CRUDUser(User, sort_key="username")
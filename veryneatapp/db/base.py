@@ -0,0 +1,5 @@
+# Import all the models, so that Base has them before creating the tables
+from veryneatapp.db.base_class import Base  # noqa
+from veryneatapp.models.idempotency_key import IdempotencyKey  # noqa
+from veryneatapp.models.item import Item  # noqa
+from veryneatapp.models.user import User  # noqa
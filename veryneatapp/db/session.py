@@ -0,0 +1,82 @@
+"""
+Async engine and connection pool.
+
+Each process gets its own engine (and pool): connections can't be shared with
+a parent process, so an engine created before the uvicorn/gunicorn workers are
+forked is never reused by them. Sessions are handed out per request by the
+`get_db` dependency and the pool is closed on app shutdown with `close_db`.
+"""
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio.engine import AsyncEngine, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+
+from veryneatapp.core.config import settings
+from veryneatapp.db.base import Base
+
+SessionLocal = sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+_engine: Optional[AsyncEngine] = None
+_engine_pid: Optional[int] = None
+
+
+def _pool_options(url: str) -> Dict:
+    if make_url(url).database in (None, "", ":memory:"):
+        # A single connection, otherwise each connection has its own database
+        return {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
+    return {
+        # SQLAlchemy doesn't pool SQLite file connections by default
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    # WAL lets readers work while another worker process writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def get_engine() -> AsyncEngine:
+    """Returns the engine of the current process, created on first use"""
+    global _engine, _engine_pid  # pylint: disable=global-statement
+    if _engine is None or _engine_pid != os.getpid():
+        _engine = create_async_engine(
+            settings.DATABASE_URL, **_pool_options(settings.DATABASE_URL)
+        )
+        if _engine.dialect.name == "sqlite":
+            event.listen(_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        _engine_pid = os.getpid()
+    return _engine
+
+
+def get_session() -> AsyncSession:
+    """New session bound to the engine of the current process"""
+    return SessionLocal(bind=get_engine())
+
+
+async def init_db() -> None:
+    """Create the tables which don't exist yet"""
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db() -> None:
+    """Close the connections of the pool"""
+    global _engine  # pylint: disable=global-statement
+    if _engine is not None and _engine_pid == os.getpid():
+        await _engine.dispose()
+    _engine = None
@@ -0,0 +1,23 @@
+"""
+GraphQL web user interface at /graphql. graphene is only imported,
+and the schema built, on the first request (or by the warm-up)
+"""
+from veryneatapp.core.config import settings
+from veryneatapp.core.lazy import LazyASGIApp
+
+
+def make_graphql_app():
+    from veryneatapp.graphql.app import CachedGraphQLApp
+    from veryneatapp.graphql.schema import schema
+
+    return CachedGraphQLApp(
+        schema,
+        document_cache_size=settings.GRAPHQL_DOCUMENT_CACHE_SIZE,
+        persisted_queries_size=settings.GRAPHQL_PERSISTED_QUERIES_SIZE,
+        max_depth=settings.GRAPHQL_MAX_DEPTH,
+        max_complexity=settings.GRAPHQL_MAX_COMPLEXITY,
+        max_batch_size=settings.GRAPHQL_MAX_BATCH_SIZE,
+    )
+
+
+graphql_app = LazyASGIApp(make_graphql_app)
@@ -0,0 +1,235 @@
+"""
+GraphQL endpoint:
+- the parsed and validated documents are kept in an LRU cache keyed on the
+  query, so a query sent again is only executed
+- automatic persisted queries (Apollo protocol): clients send the sha256 of
+  a query in `extensions.persistedQuery.sha256Hash`, and the query itself
+  only when the server answers PersistedQueryNotFound
+- a list of operations can be sent in one request (batching). They share
+  the dataloaders, so their lookups are batched together
+- operations deeper than `max_depth` or resolving more than `max_complexity`
+  fields (see limits.py) are rejected before being executed
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from graphql import parse, validate
+from graphql.error import GraphQLError, GraphQLSyntaxError
+from graphql.error import format_error as format_graphql_error
+from graphql.execution import ExecutionResult, execute
+from graphql.execution.executors.asyncio import AsyncioExecutor
+from graphql.language.ast import Document
+from starlette import status
+from starlette.background import BackgroundTasks
+from starlette.graphql import GraphQLApp
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+from veryneatapp.core.cache import TTLCache
+from veryneatapp.core.responses import FastJSONResponse
+from veryneatapp.graphql import limits
+from veryneatapp.graphql.loaders import Loaders
+
+
+class OperationError(Exception):
+    """Error of an operation returned before executing it, with its code
+    in the `extensions` (eg. PERSISTED_QUERY_NOT_FOUND)"""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+    def formatted(self) -> Dict:
+        return {"message": self.message, "extensions": {"code": self.code}}
+
+
+class CachedGraphQLApp(GraphQLApp):
+    def __init__(
+        self,
+        schema,
+        document_cache_size: int = 256,
+        persisted_queries_size: int = 1024,
+        max_depth: int = 10,
+        max_complexity: int = 1000,
+        max_batch_size: int = 20,
+    ):
+        super().__init__(schema=schema, executor_class=AsyncioExecutor)
+        self.documents = TTLCache(maxsize=document_cache_size)
+        self.persisted_queries = TTLCache(maxsize=persisted_queries_size)
+        self.max_depth = max_depth
+        self.max_complexity = max_complexity
+        self.max_batch_size = max_batch_size
+
+    async def handle_graphql(self, request: Request) -> Response:
+        if request.method in ("GET", "HEAD"):
+            if "text/html" in request.headers.get("Accept", ""):
+                return await self.handle_graphiql(request)
+            data: Any = dict(request.query_params)
+            for name in ("variables", "extensions"):
+                if name in data:
+                    try:
+                        data[name] = json.loads(data[name])
+                    except ValueError:
+                        return PlainTextResponse(
+                            f"Invalid {name}",
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                        )
+        elif request.method == "POST":
+            content_type = request.headers.get("Content-Type", "")
+            if "application/json" in content_type:
+                try:
+                    data = await request.json()
+                except ValueError:
+                    return PlainTextResponse(
+                        "Invalid JSON", status_code=status.HTTP_400_BAD_REQUEST
+                    )
+            elif "application/graphql" in content_type:
+                data = {"query": (await request.body()).decode()}
+            else:
+                return PlainTextResponse(
+                    "Unsupported Media Type",
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                )
+        else:
+            return PlainTextResponse(
+                "Method Not Allowed",
+                status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
+            )
+
+        batch = isinstance(data, list)
+        operations = data if batch else [data]
+        if not operations or not all(isinstance(op, dict) for op in operations):
+            return PlainTextResponse(
+                "No GraphQL query found in the request",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(operations) > self.max_batch_size:
+            return PlainTextResponse(
+                f"More than {self.max_batch_size} operations",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        background = BackgroundTasks()
+        context = {
+            "request": request,
+            "background": background,
+            "loaders": Loaders(),
+        }
+        results = await asyncio.gather(
+            *(
+                self.run_operation(operation, context)
+                for operation in operations
+            )
+        )
+        if batch:
+            return FastJSONResponse(results, background=background)
+        [result] = results
+        # Apollo clients expect PersistedQueryNotFound with a 200
+        status_code = status.HTTP_200_OK
+        if result.get("data") is None and "errors" in result:
+            codes = {
+                error.get("extensions", {}).get("code")
+                for error in result["errors"]
+            }
+            if codes != {"PERSISTED_QUERY_NOT_FOUND"}:
+                status_code = status.HTTP_400_BAD_REQUEST
+        return FastJSONResponse(
+            result, status_code=status_code, background=background
+        )
+
+    async def run_operation(self, operation: Dict, context: Dict) -> Dict:
+        try:
+            query = self.get_query(operation)
+            document, errors = self.get_document(query)
+            if errors:
+                return {"errors": [format_graphql_error(e) for e in errors]}
+            result = await self.execute_document(
+                document,
+                variables=operation.get("variables"),
+                operation_name=operation.get("operationName"),
+                context=context,
+            )
+        except OperationError as exc:
+            return {"errors": [exc.formatted()]}
+        except GraphQLError as exc:
+            return {"errors": [format_graphql_error(exc)]}
+        response: Dict[str, Any] = {"data": result.data}
+        if result.errors:
+            response["errors"] = [
+                format_graphql_error(error) for error in result.errors
+            ]
+        return response
+
+    def get_query(self, operation: Dict) -> str:
+        """The query of the operation, or of its persisted query hash"""
+        query = operation.get("query")
+        persisted = (operation.get("extensions") or {}).get("persistedQuery")
+        if not persisted:
+            if not query:
+                raise OperationError("Must provide query string", "BAD_REQUEST")
+            return query
+        sha256_hash = persisted.get("sha256Hash")
+        if not query:
+            query = self.persisted_queries.get(sha256_hash)
+            if query is None:
+                raise OperationError(
+                    "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+                )
+            return query
+        if hashlib.sha256(query.encode()).hexdigest() != sha256_hash:
+            raise OperationError(
+                "provided sha does not match query", "BAD_REQUEST"
+            )
+        self.persisted_queries.set(sha256_hash, query)
+        return query
+
+    def get_document(self, query: str) -> Tuple[Optional[Document], List]:
+        """Parsed document and its syntax or validation errors,
+        from the cache when possible"""
+        cached = self.documents.get(query)
+        if cached is None:
+            try:
+                document = parse(query)
+            except GraphQLSyntaxError as exc:
+                cached = (None, [exc])
+            else:
+                cached = (document, validate(self.schema, document))
+            self.documents.set(query, cached)
+        return cached
+
+    async def execute_document(
+        self,
+        document: Document,
+        variables: Optional[Dict],
+        operation_name: Optional[str],
+        context: Dict,
+    ) -> ExecutionResult:
+        operation = limits.get_operation(document, operation_name)
+        if operation is not None:
+            depth, complexity = limits.measure(
+                self.schema, document, operation, variables
+            )
+            if depth > self.max_depth:
+                raise OperationError(
+                    f"Query depth {depth} exceeds the maximum of "
+                    f"{self.max_depth}",
+                    "QUERY_TOO_DEEP",
+                )
+            if complexity > self.max_complexity:
+                raise OperationError(
+                    f"Query complexity {complexity} exceeds the maximum of "
+                    f"{self.max_complexity}",
+                    "QUERY_TOO_COMPLEX",
+                )
+        return await execute(
+            self.schema,
+            document,
+            context_value=context,
+            variable_values=variables,
+            operation_name=operation_name,
+            executor=AsyncioExecutor(loop=asyncio.get_event_loop()),
+            return_promise=True,
+        )
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Batches the `load` calls made in the same event loop iteration
+    (eg. the owners of the items of a list) into one `batch_load` call,
+    and caches the results for the lifetime of the loader (one request).
+
+    `batch_load` gets a list of unique keys and returns the values
+    in the same order, None for the missing ones.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[List[K]], Awaitable[List[V]]],
+        max_batch_size: int = 1000,
+    ):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self._futures: Dict[K, asyncio.Future] = {}
+        self._queue: List[K] = []
+
+    def load(self, key: K) -> "asyncio.Future[V]":
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_event_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return future
+
+    def load_many(self, keys: List[K]) -> "asyncio.Future[List[V]]":
+        return asyncio.gather(*(self.load(key) for key in keys))
+
+    def prime(self, key: K, value: V) -> None:
+        """Cache a value loaded by another query (eg. a page of items)"""
+        if key not in self._futures:
+            future = asyncio.get_event_loop().create_future()
+            future.set_result(value)
+            self._futures[key] = future
+
+    def _dispatch(self) -> None:
+        queue, self._queue = self._queue, []
+        for start in range(0, len(queue), self.max_batch_size):
+            keys = queue[start : start + self.max_batch_size]
+            asyncio.ensure_future(self._load_batch(keys))
+
+    async def _load_batch(self, keys: List[K]) -> None:
+        self.batches += 1
+        try:
+            values = await self.batch_load(keys)
+        except Exception as exc:  # pylint: disable=broad-except
+            for key in keys:
+                self._futures.pop(key).set_exception(exc)
+            return
+        for key, value in zip(keys, values):
+            self._futures[key].set_result(value)
@@ -0,0 +1,137 @@
+"""
+Depth and complexity of a GraphQL operation, computed on its document
+(fragments included) before it is executed.
+
+The complexity is the number of fields to resolve: the fields under a field
+with a `limit` argument count `limit` times, since they are resolved for
+each element of the list. An absent `limit` counts as its default in the
+schema, and any limit is clamped to the page sizes the resolvers accept.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+from graphql.error import GraphQLError
+from graphql.language import ast
+from graphql.type import GraphQLSchema
+from graphql.type.definition import get_named_type
+
+from veryneatapp.core.config import settings
+
+
+def get_operation(
+    document: ast.Document, operation_name: Optional[str]
+) -> Optional[ast.OperationDefinition]:
+    operations = [
+        definition
+        for definition in document.definitions
+        if isinstance(definition, ast.OperationDefinition)
+    ]
+    if operation_name is None:
+        return operations[0] if len(operations) == 1 else None
+    for operation in operations:
+        if operation.name and operation.name.value == operation_name:
+            return operation
+    return None
+
+
+def _limit(field: ast.Field, field_def: Any, variables: Dict) -> int:
+    """The `limit` of the field, 1 if it has no such argument"""
+    argument = field_def.args.get("limit") if field_def else None
+    if argument is None:
+        return 1
+    value = argument.default_value
+    for node in field.arguments or ():
+        if node.name.value != "limit":
+            continue
+        if isinstance(node.value, ast.Variable):
+            value = variables.get(node.value.name.value, value)
+        elif isinstance(node.value, ast.IntValue):
+            value = node.value.value
+    if value is None:
+        return 1
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise GraphQLError(f"limit must be an integer, got {value!r}")
+    return min(max(limit, 1), settings.PAGE_SIZE_MAX)
+
+
+def _root_type(schema: GraphQLSchema, operation: ast.OperationDefinition):
+    if operation.operation == "mutation":
+        return schema.get_mutation_type()
+    if operation.operation == "subscription":
+        return schema.get_subscription_type()
+    return schema.get_query_type()
+
+
+def measure(
+    schema: GraphQLSchema,
+    document: ast.Document,
+    operation: ast.OperationDefinition,
+    variables: Optional[Dict] = None,
+) -> Tuple[int, int]:
+    """Depth and complexity of the operation"""
+    # the defaults of the operation variables, overridden by the request
+    defaults = {
+        definition.variable.name.value: definition.default_value.value
+        for definition in operation.variable_definitions or ()
+        if isinstance(definition.default_value, ast.IntValue)
+    }
+    variables = {**defaults, **(variables or {})}
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, ast.FragmentDefinition)
+    }
+
+    def walk(
+        selection_set, parent_type, depth: int, visited: frozenset
+    ) -> Tuple[int, int]:
+        max_depth, complexity = depth, 0
+        for selection in selection_set.selections if selection_set else ():
+            if isinstance(selection, ast.Field):
+                if selection.selection_set is None:
+                    complexity += 1
+                    continue
+                # None for unknown fields, reported by the validation
+                field_def = getattr(parent_type, "fields", {}).get(
+                    selection.name.value
+                )
+                child_depth, child_complexity = walk(
+                    selection.selection_set,
+                    field_def and get_named_type(field_def.type),
+                    depth + 1,
+                    visited,
+                )
+                max_depth = max(max_depth, child_depth)
+                complexity += (
+                    1
+                    + _limit(selection, field_def, variables) * child_complexity
+                )
+                continue
+            if isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                if name in visited or name not in fragments:
+                    continue  # cycles are reported by the validation
+                fragment = fragments[name]
+                child_depth, child_complexity = walk(
+                    fragment.selection_set,
+                    schema.get_type(fragment.type_condition.name.value),
+                    depth,
+                    visited | {name},
+                )
+            else:
+                fragment_type = parent_type
+                if selection.type_condition is not None:
+                    fragment_type = schema.get_type(
+                        selection.type_condition.name.value
+                    )
+                child_depth, child_complexity = walk(
+                    selection.selection_set, fragment_type, depth, visited
+                )
+            max_depth = max(max_depth, child_depth)
+            complexity += child_complexity
+        return max_depth, complexity
+
+    return walk(
+        operation.selection_set, _root_type(schema, operation), 0, frozenset()
+    )
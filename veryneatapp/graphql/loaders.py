@@ -0,0 +1,67 @@
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp.db.session import get_session
+from veryneatapp.graphql.dataloader import DataLoader
+from veryneatapp.models import Item, User
+
+
+@asynccontextmanager
+async def session() -> AsyncIterator[AsyncSession]:
+    """A session per query: the batches of different loaders run
+    concurrently, and a session can't run two queries at the same time"""
+    db = get_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+class Loaders:
+    """The dataloaders of a GraphQL request: one query per batch"""
+
+    def __init__(self):
+        self.items = DataLoader(self._items_by_id)
+        self.users = DataLoader(self._users_by_id)
+        self.users_by_username = DataLoader(self._users_by_username)
+        self.items_by_owner = DataLoader(self._items_by_owner)
+
+    async def _items_by_id(self, ids: List[int]) -> List[Optional[Item]]:
+        async with session() as db:
+            result = await db.execute(select(Item).filter(Item.id.in_(ids)))
+            items = {item.id: item for item in result.scalars()}
+        return [items.get(id) for id in ids]
+
+    async def _users_by_id(self, ids: List[int]) -> List[Optional[User]]:
+        async with session() as db:
+            result = await db.execute(select(User).filter(User.id.in_(ids)))
+            users = {user.id: user for user in result.scalars()}
+        return [users.get(id) for id in ids]
+
+    async def _users_by_username(
+        self, usernames: List[str]
+    ) -> List[Optional[User]]:
+        async with session() as db:
+            result = await db.execute(
+                select(User).filter(User.username.in_(usernames))
+            )
+            users = {user.username: user for user in result.scalars()}
+        for user in users.values():
+            self.users.prime(user.id, user)
+        return [users.get(username) for username in usernames]
+
+    async def _items_by_owner(self, owner_ids: List[int]) -> List[List[Item]]:
+        async with session() as db:
+            result = await db.execute(
+                select(Item)
+                .filter(Item.owner_id.in_(owner_ids))
+                .order_by(Item.title, Item.id)
+            )
+            items = defaultdict(list)
+            for item in result.scalars():
+                items[item.owner_id].append(item)
+        return [items[owner_id] for owner_id in owner_ids]
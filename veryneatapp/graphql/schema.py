@@ -0,0 +1,106 @@
+"""
+GraphQL schema of the items and users. Run at /graphql:
+{
+  items(limit: 10) {
+    items { title owner { username } }
+    nextCursor
+  }
+}
+The lookups by id/username and the items of the users go through the
+dataloaders of the request (info.context["loaders"]), so the owners of a page
+of items are fetched with one query.
+To learn how to use GraphQL: https://www.starlette.io/graphql/
+"""
+import graphene
+from graphql import GraphQLError
+
+from veryneatapp import crud
+from veryneatapp.core.config import settings
+from veryneatapp.crud.base import InvalidCursorError
+from veryneatapp.graphql.loaders import session
+
+
+class User(graphene.ObjectType):
+    id = graphene.Int(required=True)
+    username = graphene.String(required=True)
+    full_name = graphene.String()
+    email = graphene.String()
+    is_active = graphene.Boolean()
+    items = graphene.List(graphene.NonNull(lambda: Item), required=True)
+
+    def resolve_items(user, info):
+        return info.context["loaders"].items_by_owner.load(user.id)
+
+
+class Item(graphene.ObjectType):
+    id = graphene.Int(required=True)
+    title = graphene.String(required=True)
+    description = graphene.String()
+    type = graphene.String()
+    owner = graphene.Field(User)
+
+    def resolve_owner(item, info):
+        return info.context["loaders"].users.load(item.owner_id)
+
+
+class ItemPage(graphene.ObjectType):
+    items = graphene.List(graphene.NonNull(Item), required=True)
+    next_cursor = graphene.String()
+
+
+class UserPage(graphene.ObjectType):
+    items = graphene.List(graphene.NonNull(User), required=True)
+    next_cursor = graphene.String()
+
+
+def page_arguments():
+    return {
+        "q": graphene.String(),
+        "cursor": graphene.String(),
+        "limit": graphene.Int(default_value=20),
+    }
+
+
+async def get_page(crud_obj, loader, q, cursor, limit):
+    if not 1 <= limit <= settings.PAGE_SIZE_MAX:
+        raise GraphQLError(
+            f"limit must be between 1 and {settings.PAGE_SIZE_MAX}"
+        )
+    try:
+        async with session() as db:
+            rows, next_cursor = await crud_obj.get_page(
+                db, q=q, cursor=cursor, limit=limit
+            )
+    except InvalidCursorError as exc:
+        raise GraphQLError(str(exc))
+    for row in rows:
+        loader.prime(row.id, row)
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String(name=graphene.String(default_value="stranger"))
+    item = graphene.Field(Item, id=graphene.Int(required=True))
+    user = graphene.Field(User, username=graphene.String(required=True))
+    items = graphene.Field(ItemPage, required=True, **page_arguments())
+    users = graphene.Field(UserPage, required=True, **page_arguments())
+
+    def resolve_hello(self, info, name):
+        return "Hello " + name
+
+    def resolve_item(self, info, id):
+        return info.context["loaders"].items.load(id)
+
+    def resolve_user(self, info, username):
+        return info.context["loaders"].users_by_username.load(username)
+
+    async def resolve_items(self, info, limit, q=None, cursor=None):
+        loader = info.context["loaders"].items
+        return await get_page(crud.item, loader, q, cursor, limit)
+
+    async def resolve_users(self, info, limit, q=None, cursor=None):
+        loader = info.context["loaders"].users
+        return await get_page(crud.user, loader, q, cursor, limit)
+
+
+schema = graphene.Schema(query=Query)
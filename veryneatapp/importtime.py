@@ -0,0 +1,145 @@
+"""
+Import time report of the app, ie. the boot time of each worker
+before it can serve requests. Eg:
+
+    python -m veryneatapp.importtime
+    python -m veryneatapp.importtime --top 30 --json importtime.json
+    python -m veryneatapp.importtime --max-ms 1500
+
+The module is imported with `python -X importtime` in a new interpreter,
+`--runs` times (the first run also compiles the .pyc files and creates the
+caches), and the fastest run is reported: the slowest imports by cumulative
+and by self time, and the self time by top-level package.
+With --max-ms, exits with 1 when the import takes longer.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse(stderr: str) -> List[ImportTime]:
+    """Lines of `python -X importtime`, eg.
+    "import time:       572 |     349761 |   fastapi" """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(
+            ImportTime(name.strip(), int(self_us), int(cumulative_us), depth)
+        )
+    return imports
+
+
+def measure(module: str, env: Dict[str, str]) -> List[ImportTime]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return parse(result.stderr)
+
+
+def report(imports: List[ImportTime], module: str, top: int) -> Dict:
+    by_package: Dict[str, int] = {}
+    for entry in imports:
+        package = entry.module.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + entry.self_us
+    total_us = next(
+        entry.cumulative_us for entry in imports if entry.module == module
+    )
+
+    def rows(entries) -> List[Dict]:
+        return [
+            {
+                "module": entry.module,
+                "self_ms": entry.self_us / 1000,
+                "cumulative_ms": entry.cumulative_us / 1000,
+            }
+            for entry in entries[:top]
+        ]
+
+    return {
+        "module": module,
+        "total_ms": total_us / 1000,
+        "modules": len(imports),
+        "by_cumulative": rows(
+            sorted(imports, key=lambda entry: -entry.cumulative_us)
+        ),
+        "by_self": rows(sorted(imports, key=lambda entry: -entry.self_us)),
+        "by_package": {
+            package: self_us / 1000
+            for package, self_us in sorted(
+                by_package.items(), key=lambda item: -item[1]
+            )[:top]
+        },
+    }
+
+
+def print_report(result: Dict) -> None:
+    print(
+        f"import {result['module']}: {result['total_ms']:.1f} ms, "
+        f"{result['modules']} modules"
+    )
+    for title, key in (("cumulative", "by_cumulative"), ("self", "by_self")):
+        print(f"\nSlowest imports by {title} time (ms):")
+        for row in result[key]:
+            print(
+                f"{row['cumulative_ms']:10.1f} {row['self_ms']:10.1f}  "
+                f"{row['module']}"
+            )
+    print("\nSelf time by top-level package (ms):")
+    for package, self_ms in result["by_package"].items():
+        print(f"{self_ms:10.1f}  {package}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m veryneatapp.importtime")
+    parser.add_argument("--module", default="veryneatapp.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", help="also save the report to this file")
+    parser.add_argument(
+        "--max-ms", type=float, help="fail when the import takes longer"
+    )
+    args = parser.parse_args()
+
+    # Caches written on import go to a directory shared by the runs
+    tmp_dir = tempfile.mkdtemp(prefix="veryneatapp-importtime-")
+    env = dict(os.environ)
+    for name in ("STATIC_CACHE_DIR", "TEMPLATE_CACHE_DIR", "METRICS_DIR"):
+        env.setdefault(name, os.path.join(tmp_dir, name.lower()))
+
+    runs = [measure(args.module, env) for _ in range(max(args.runs, 1))]
+    result = min(
+        (report(imports, args.module, args.top) for imports in runs),
+        key=lambda result: result["total_ms"],
+    )
+    print_report(result)
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2) + "\n")
+    if args.max_ms is not None and result["total_ms"] > args.max_ms:
+        print(f"\nFAILED import takes more than {args.max_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,38 @@
-import time
 from pathlib import Path
 
-import graphene
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from starlette.graphql import GraphQLApp
 from starlette.middleware.cors import CORSMiddleware
 
 from veryneatapp.api import api_router
 from veryneatapp.api.custom_exceptions import UnicornException
+from veryneatapp.api.endpoints import security
+from veryneatapp.api.routing import cache_route
+from veryneatapp.core.admission import AdmissionMiddleware, make_backend
+from veryneatapp.core.compression import CompressionMiddleware
 from veryneatapp.core.config import settings
+from veryneatapp.core.executors import BoundedExecutor
+from veryneatapp.core.lazy import warm_up
+from veryneatapp.core.log_writer import task_log_writer
+from veryneatapp.core.metrics import (
+    REGISTRY,
+    MetricsMiddleware,
+    cache_collector,
+    executor_collector,
+    metrics_endpoint,
+    register_collector,
+    task_queue_depth,
+)
+from veryneatapp.core.profiling import ProfilerMiddleware, profiler
+from veryneatapp.core.response_cache import response_cache
+from veryneatapp.core.responses import FastJSONResponse
+from veryneatapp.core.security import password_executor
+from veryneatapp.core.shared_store import shared_backend
+from veryneatapp.core.task_queue import task_queue
+from veryneatapp.core.timing import ProcessTimeMiddleware
+from veryneatapp.db.session import close_db, init_db
+from veryneatapp.graphql import graphql_app
+from veryneatapp.web.staticfiles import PrecompressedStaticFiles, StaticMount
 from veryneatapp.web.web import web_router
 
 # Initialise FastAPI app
@@ -21,25 +43,68 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url=f"{settings.API_V1_STR}/docs",
     redoc_url=None,
+    default_response_class=FastJSONResponse,
 )
 
 STATIC_DIR = Path(__file__).resolve().parent / "web" / "static"
 
 # Add templates and mount static files
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-
-# Add middleware
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    """
-    Middleware to add the `x-process-time` response header
-    to every requests. Eg: x-process-time: 0.0004627704620361328 
-    """
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+app.router.routes.append(
+    StaticMount(
+        "/static",
+        app=PrecompressedStaticFiles(directory=STATIC_DIR),
+        name="static",
+    )
+)
+
+# Add middleware. The profiler must be the innermost one, so it is added first
+if settings.PROFILER_ENABLED:
+    app.add_middleware(
+        ProfilerMiddleware,
+        profiler=profiler,
+        secret=settings.PROFILER_SECRET,
+        sample_rate=settings.PROFILER_SAMPLE_RATE,
+    )
+
+
+# X-Process-Time header, and the Server-Timing header when enabled
+app.add_middleware(
+    ProcessTimeMiddleware, server_timing=settings.SERVER_TIMING_ENABLED
+)
+
+
+# Large responses are compressed on their own threads, off the event loop
+if settings.COMPRESSION_ENABLED:
+    compression_executor = BoundedExecutor(
+        max_workers=settings.COMPRESSION_WORKERS, name="compression"
+    )
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        offload_size=settings.COMPRESSION_OFFLOAD_SIZE,
+        executor=compression_executor,
+    )
+
+
+# Rate limits, concurrency limits and load shedding, before any other work
+if settings.ADMISSION_ENABLED:
+    rate_limit_backend = make_backend(
+        settings.RATE_LIMIT_BACKEND,
+        settings.RATE_LIMIT_MMAP_PATH,
+        settings.RATE_LIMIT_MMAP_SLOTS,
+    )
+    app.add_middleware(
+        AdmissionMiddleware,
+        backend=rate_limit_backend,
+        default_limit=(settings.RATE_LIMIT_RATE, settings.RATE_LIMIT_BURST),
+        route_limits=settings.RATE_LIMIT_ROUTES,
+        concurrency_limits=settings.CONCURRENCY_LIMITS,
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+        max_queue_wait=settings.ADMISSION_MAX_QUEUE_WAIT,
+        max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+        key=settings.RATE_LIMIT_KEY,
+        token_username=security.cached_token_username,
+    )
 
 
 # Load custom exception handlers
@@ -53,6 +118,28 @@ async def unicorn_exception_handler(request: Request, exc: UnicornException):
     )
 
 
+# Start and stop background services with the application
+@app.on_event("startup")
+async def start_background_services():
+    await init_db()
+    task_queue.start()
+    await warm_up(settings.WARMUP_MODE)
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    task_queue.shutdown()
+    task_log_writer.close()  # flush the task results written during shutdown
+    password_executor.shutdown()
+    if settings.COMPRESSION_ENABLED:
+        compression_executor.shutdown()
+    await close_db()
+    await shared_backend.close()
+    REGISTRY.close()
+    if settings.ADMISSION_ENABLED:
+        rate_limit_backend.close()
+
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -63,27 +150,24 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# Count and time the requests, exposed with the other metrics on /metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    register_collector(
+        lambda: task_queue_depth.labels().set(task_queue.qsize())
+    )
+    register_collector(cache_collector("auth_token", security.token_cache))
+    register_collector(cache_collector("response", response_cache.entries))
+    register_collector(executor_collector(password_executor))
+
 # Load all routes
 app.include_router(api_router, prefix=settings.API_V1_STR)
 app.include_router(web_router, tags=["frontend"])
 
+# The OpenAPI document only changes on restart
+cache_route(app.router, app.openapi_url)
 
-# Add GraphQL
-class SampleQuery4GraphQL(graphene.ObjectType):
-    """
-    GraphQL web user interface at /graphql, run:
-    {
-    hello(name: "FastAPI")
-    }
-    To learn how to use GraphQL: https://www.starlette.io/graphql/
-    """
-
-    hello = graphene.String(name=graphene.String(default_value="stranger"))
-
-    def resolve_hello(self, info, name):
-        return "Hello " + name
 
-
-app.add_route(
-    "/graphql", GraphQLApp(schema=graphene.Schema(query=SampleQuery4GraphQL))
-)
+# Add GraphQL
+app.add_route("/graphql", graphql_app)
@@ -0,0 +1,3 @@
+from .idempotency_key import IdempotencyKey
+from .item import Item
+from .user import User
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Float, Integer, LargeBinary, String
+
+from veryneatapp.db.base_class import Base
+
+
+class IdempotencyKey(Base):
+    """Progress, then response, of a request sent with an Idempotency-Key"""
+
+    id = Column(Integer, primary_key=True)
+    # "<method> <path> <Idempotency-Key header>"
+    key = Column(String, unique=True, nullable=False)
+    request_hash = Column(String, nullable=False)
+    # None until the request completed
+    status_code = Column(Integer)
+    # JSON results of the batches done so far, then the response body
+    response = Column(LargeBinary, nullable=False, default=b"[]")
+    created_at = Column(Float, nullable=False, index=True)
+    updated_at = Column(Float, nullable=False)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import relationship
+
+from veryneatapp.db.base_class import Base
+
+
+class Item(Base):
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, nullable=False)
+    description = Column(String)
+    type = Column(String)
+    owner_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    owner = relationship("User", back_populates="items")
+
+    # Sort key of the item pages (see CRUDBase.get_page)
+    __table_args__ = (Index("ix_item_title_id", "title", "id"),)
@@ -0,0 +1 @@
+from veryneatapp.tests import _env  # noqa: F401
@@ -0,0 +1,19 @@
+"""
+Settings are read when the app is imported: use a throwaway database,
+task journal and caches. Imported by the package __init__, so it runs before
+conftest.py and the test modules, whatever the order of their imports.
+"""
+import os
+import tempfile
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{TMP_DIR}/veryneatapp-tests.db"
+)
+os.environ.setdefault("STATIC_CACHE_DIR", f"{TMP_DIR}/static_cache")
+os.environ.setdefault("TEMPLATE_CACHE_DIR", f"{TMP_DIR}/template_cache")
+os.environ.setdefault("METRICS_DIR", f"{TMP_DIR}/metrics")
+os.environ.setdefault("TASK_QUEUE_JOURNAL", f"{TMP_DIR}/task_journal.db")
+os.environ.setdefault("PROFILER_ENABLED", "True")
+os.environ.setdefault("PROFILER_SECRET", "profiler-secret")
+os.environ.setdefault("PROFILER_DIR", f"{TMP_DIR}/profiles")
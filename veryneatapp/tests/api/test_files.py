@@ -0,0 +1,96 @@
+import hashlib
+
+from fastapi import FastAPI
+
+from veryneatapp.core.config import settings
+
+
+class TestFilesEndpoints:
+    def test_upload_files(self, mock_client: FastAPI, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 1024)
+        content = b"0123456789" * 1000
+        response = mock_client.post(
+            "/api/v1/files/upload-files/",
+            files=[
+                ("files", ("a.bin", content, "application/octet-stream")),
+                ("files", ("b.txt", b"hello", "text/plain")),
+            ],
+        )
+        assert response.status_code == 201
+        saved_a, saved_b = response.json()["files"]
+        assert saved_a == {
+            "filename": "a.bin",
+            "size": len(content),
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "content_type": "application/octet-stream",
+        }
+        assert saved_b["size"] == 5
+        assert (tmp_path / "a.bin").read_bytes() == content
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["a.bin", "b.txt"]
+
+    def test_upload_files_too_large(
+        self, mock_client: FastAPI, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "UPLOAD_MAX_SIZE", 10)
+        response = mock_client.post(
+            "/api/v1/files/upload-files/",
+            files=[("files", ("big.bin", b"x" * 11, "text/plain"))],
+        )
+        assert response.status_code == 413
+        # the partially written temporary file is cleaned up
+        assert list(tmp_path.iterdir()) == []
+
+    def test_stream_upload(self, mock_client: FastAPI, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 7)
+        content = b"streamed content " * 100
+        response = mock_client.put(
+            "/api/v1/files/stream/streamed.bin", data=content
+        )
+        assert response.status_code == 201
+        assert response.json() == {
+            "filename": "streamed.bin",
+            "size": len(content),
+            "sha256": hashlib.sha256(content).hexdigest(),
+        }
+        assert (tmp_path / "streamed.bin").read_bytes() == content
+
+    def test_upload_files_all_or_nothing(
+        self, mock_client: FastAPI, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "UPLOAD_MAX_SIZE", 10)
+        response = mock_client.post(
+            "/api/v1/files/upload-files/",
+            files=[
+                ("files", ("small.txt", b"x", "text/plain")),
+                ("files", ("big.bin", b"x" * 11, "text/plain")),
+            ],
+        )
+        assert response.status_code == 413
+        # the file written before the rejected one isn't kept either
+        assert list(tmp_path.iterdir()) == []
+
+    def test_upload_invalid_filename(
+        self, mock_client: FastAPI, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+        response = mock_client.post(
+            "/api/v1/files/upload-files/",
+            files=[("files", ("..", b"x", "text/plain"))],
+        )
+        assert response.status_code == 400
+        assert list(tmp_path.iterdir()) == []
+
+    def test_stream_upload_invalid_content_length(
+        self, mock_client: FastAPI, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+        response = mock_client.put(
+            "/api/v1/files/stream/streamed.bin",
+            headers={"Content-Length": "lots"},
+        )
+        assert response.status_code == 400
+        assert list(tmp_path.iterdir()) == []
@@ -1,3 +1,98 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.api.endpoints import items
+from veryneatapp.api.schemas.item import (
+    ITEM_TYPES,
+    AnyItem,
+    BaseItem,
+    CarItem,
+    ItemCreate,
+    Literal,
+    PlaneItem,
+    item_type,
+)
+from veryneatapp.core.config import settings
+from veryneatapp.core.shared_store import MemoryBackend
+from veryneatapp.tests.crud.test_user import create_random_user
+from veryneatapp.tests.utils.utils import random_lower_string, run
+
+
+class TestReadItems:
+    def test_pages_follow_the_cursor(
+        self, mock_client: FastAPI, db: AsyncSession
+    ):
+        owner = create_random_user(db)
+        prefix = random_lower_string()
+        titles = [f"{prefix}-{i}" for i in (3, 1, 4, 2, 1)]
+        for title in titles:
+            run(
+                crud.item.create_with_owner(
+                    db, obj_in=ItemCreate(title=title), owner_id=owner.id
+                )
+            )
+        # a title sorted right after the prefix range
+        run(
+            crud.item.create_with_owner(
+                db, obj_in=ItemCreate(title=f"{prefix}."), owner_id=owner.id
+            )
+        )
+
+        pages, cursor = [], None
+        while True:
+            params = {"q": f"{prefix}-", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = mock_client.get("/api/v1/items/", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            pages.append([item["title"] for item in page["items"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert pages == [
+            [f"{prefix}-1", f"{prefix}-1"],
+            [f"{prefix}-2", f"{prefix}-3"],
+            [f"{prefix}-4"],
+        ]
+
+    def test_skip(self, mock_client: FastAPI, db: AsyncSession):
+        owner = create_random_user(db)
+        prefix = random_lower_string()
+        for i in range(3):
+            run(
+                crud.item.create_with_owner(
+                    db,
+                    obj_in=ItemCreate(title=f"{prefix}{i}"),
+                    owner_id=owner.id,
+                )
+            )
+        response = mock_client.get(
+            "/api/v1/items/", params={"q": prefix, "skip": 1}
+        )
+        page = response.json()
+        assert [item["title"] for item in page["items"]] == [
+            f"{prefix}1",
+            f"{prefix}2",
+        ]
+        assert page["next_cursor"] is None
+
+    def test_limit_is_capped(self, mock_client: FastAPI):
+        response = mock_client.get(
+            "/api/v1/items/", params={"limit": settings.PAGE_SIZE_MAX + 1}
+        )
+        assert response.status_code == 422
+
+    def test_invalid_cursor(self, mock_client: FastAPI):
+        response = mock_client.get("/api/v1/items/", params={"cursor": "foo"})
+        assert response.status_code == 400
+
+
 # def test_create_item(
 #     client: TestClient, superuser_token_headers: dict, db: Session
 # ) -> None:
@@ -26,3 +121,242 @@
 #     assert content["description"] == item.description
 #     assert content["id"] == item.id
 #     assert content["owner_id"] == item.owner_id
+
+
+class TestBulkItems:
+    def test_create_json_array(self, mock_client: FastAPI, db: AsyncSession):
+        owner = create_random_user(db)
+        prefix = random_lower_string()
+        response = mock_client.post(
+            "/api/v1/items/bulk",
+            json=[
+                {"title": f"{prefix}-1", "owner_id": owner.id},
+                {"owner_id": owner.id},
+                {"title": f"{prefix}-2", "owner_id": 10**9},
+                {"title": f"{prefix}-3", "owner_id": owner.id},
+            ],
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["index"] for r in results] == [0, 1, 2, 3]
+        assert [r["status"] for r in results] == [201, 422, 422, 201]
+        assert results[0]["data"]["title"] == f"{prefix}-1"
+        assert results[1]["errors"][0]["loc"] == ["title"]
+        items = run(crud.item.get_multi_by_owner(db, owner_id=owner.id))
+        assert [item.title for item in items] == [f"{prefix}-1", f"{prefix}-3"]
+
+    def test_create_ndjson_in_batches(
+        self, mock_client: FastAPI, db: AsyncSession, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "BULK_BATCH_SIZE", 2)
+        owner = create_random_user(db)
+        lines = [
+            f'{{"title": "item-{i}", "owner_id": {owner.id}}}' for i in range(5)
+        ]
+        response = mock_client.post(
+            "/api/v1/items/bulk",
+            data="\n".join(lines[:3]) + "\n{not json\n",
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid JSON on line 4"
+
+        response = mock_client.post(
+            "/api/v1/items/bulk",
+            data="\n".join(lines) + "\n",
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        assert [r["status"] for r in response.json()["results"]] == [201] * 5
+        items = run(crud.item.get_multi_by_owner(db, owner_id=owner.id))
+        assert len(items) == 5
+
+    def test_update(self, mock_client: FastAPI, db: AsyncSession):
+        owner = create_random_user(db)
+        item = run(
+            crud.item.create_with_owner(
+                db, obj_in=ItemCreate(title="old"), owner_id=owner.id
+            )
+        )
+        response = mock_client.patch(
+            "/api/v1/items/bulk",
+            json=[
+                {"id": item.id, "description": "new"},
+                {"id": 10**9, "description": "new"},
+                {"id": item.id, "title": None},
+            ],
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == [200, 404, 422]
+        assert results[0]["data"]["title"] == "old"
+        assert results[0]["data"]["description"] == "new"
+        run(db.refresh(item))
+        assert item.description == "new"
+
+    def test_idempotency_key(self, mock_client: FastAPI, db: AsyncSession):
+        owner = create_random_user(db)
+        body = [{"title": "once", "owner_id": owner.id}]
+        headers = {"Idempotency-Key": random_lower_string()}
+        first = mock_client.post(
+            "/api/v1/items/bulk", json=body, headers=headers
+        )
+        retry = mock_client.post(
+            "/api/v1/items/bulk", json=body, headers=headers
+        )
+        assert first.status_code == retry.status_code == 200
+        assert retry.json() == first.json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        items = run(crud.item.get_multi_by_owner(db, owner_id=owner.id))
+        assert len(items) == 1
+
+        other = mock_client.post(
+            "/api/v1/items/bulk", json=body * 2, headers=headers
+        )
+        assert other.status_code == 422
+
+
+class TestStreamItems:
+    def test_ndjson(self, mock_client: FastAPI, db: AsyncSession, monkeypatch):
+        monkeypatch.setattr(settings, "STREAM_PAGE_SIZE", 2)
+        owner = create_random_user(db)
+        prefix = random_lower_string()
+        for i in range(5):
+            run(
+                crud.item.create_with_owner(
+                    db,
+                    obj_in=ItemCreate(title=f"{prefix}{i}"),
+                    owner_id=owner.id,
+                )
+            )
+        response = mock_client.get(
+            "/api/v1/items/",
+            params={"q": prefix},
+            headers={"Accept": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        items = [json.loads(line) for line in response.text.splitlines()]
+        assert [item["title"] for item in items] == [
+            f"{prefix}{i}" for i in range(5)
+        ]
+        assert items[0]["owner_id"] == owner.id
+
+        response = mock_client.get(
+            "/api/v1/items/", params={"format": "ndjson", "cursor": "nope"}
+        )
+        assert response.status_code == 400
+
+    def test_list_of_models(self, mock_client: FastAPI):
+        url = "/api/v1/items/response-list-of-models/"
+        assert len(mock_client.get(url).json()) == 2
+        response = mock_client.get(url, params={"format": "ndjson"})
+        assert response.text.splitlines()[0] == (
+            '{"name":"Foo","description":"There comes my hero"}'
+        )
+        # Not served from the JSON response cache
+        response = mock_client.get(
+            url, headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+
+class TestItemTypes:
+    def test_read_item_of_each_type(self, mock_client: FastAPI):
+        response = mock_client.get("/api/v1/items/get-item-or-404/item1")
+        assert response.json()["type"] == "car"
+        response = mock_client.get("/api/v1/items/get-item-or-404/item2")
+        assert response.status_code == 200
+        assert response.json()["type"] == "plane"
+        assert response.json()["size"] == 5
+
+    def test_partial_update_keeps_the_type(
+        self, mock_client: FastAPI, monkeypatch
+    ):
+        monkeypatch.setattr(items.items, "backend", MemoryBackend())
+        response = mock_client.patch(
+            "/api/v1/items/partial-update/item2", json={"name": "Baz"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "name": "Baz",
+            "description": "Music is my aeroplane, it's my aeroplane",
+            "type": "plane",
+            "size": 5,
+        }
+        response = mock_client.patch(
+            "/api/v1/items/partial-update/item3", json={"name": "Baz"}
+        )
+        assert response.status_code == 404
+
+    def test_partial_update_of_the_type_fields(
+        self, mock_client: FastAPI, monkeypatch
+    ):
+        monkeypatch.setattr(items.items, "backend", MemoryBackend())
+        response = mock_client.patch(
+            "/api/v1/items/partial-update/item2",
+            json={"size": 7, "type": "plane"},
+        )
+        assert response.status_code == 200
+        assert response.json()["size"] == 7
+        response = mock_client.patch(
+            "/api/v1/items/partial-update/item2", json={"size": "big"}
+        )
+        assert response.status_code == 422
+
+    def test_partial_update_cant_change_the_type(
+        self, mock_client: FastAPI, monkeypatch
+    ):
+        monkeypatch.setattr(items.items, "backend", MemoryBackend())
+        response = mock_client.patch(
+            "/api/v1/items/partial-update/item2",
+            json={"name": "B", "type": "car"},
+        )
+        assert response.status_code == 409
+        response = mock_client.patch(
+            "/api/v1/items/partial-update/item2", json={"type": "boat"}
+        )
+        assert response.status_code == 422
+        response = mock_client.get("/api/v1/items/get-item-or-404/item2")
+        assert response.json()["type"] == "plane"
+        assert response.json()["name"] == "Bar"
+
+    def test_partial_update_validates_the_stored_item(
+        self, mock_client: FastAPI, monkeypatch
+    ):
+        # eg. written by another worker
+        backend = MemoryBackend()
+        backend.data[("items", "item1")] = {"type": "plane", "size": "big"}
+        monkeypatch.setattr(items.items, "backend", backend)
+        with pytest.raises(ValidationError):
+            mock_client.patch(
+                "/api/v1/items/partial-update/item1", json={"name": "Baz"}
+            )
+        assert backend.data[("items", "item1")]["size"] == "big"
+
+    def test_types_are_registered_before_any_item(self):
+        with pytest.raises(TypeError):
+
+            @item_type
+            class BoatItem(BaseItem):
+                type: Literal["boat"] = "boat"
+
+        assert "boat" not in ITEM_TYPES
+
+    def test_type_picks_the_model(self):
+        item = AnyItem.parse_obj({"name": "Foo", "type": "plane", "size": 1})
+        assert isinstance(item.__root__, PlaneItem)
+        assert isinstance(
+            AnyItem.parse_obj(CarItem(name="Foo")).__root__, CarItem
+        )
+        with pytest.raises(ValidationError) as exc_info:
+            AnyItem.parse_obj({"name": "Foo", "type": "boat"})
+        # Only the errors of the looked up type, not one per type
+        assert len(exc_info.value.errors()) == 1
+        with pytest.raises(ValidationError) as exc_info:
+            AnyItem.parse_obj({"name": "Foo", "type": "plane"})
+        assert exc_info.value.errors()[0]["loc"] == (
+            "__root__",
+            "PlaneItem",
+            "size",
+        )
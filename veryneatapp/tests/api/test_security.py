@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from passlib.context import CryptContext
+
+from veryneatapp.api.endpoints import security
+from veryneatapp.core.lazy import Lazy
+from veryneatapp.core.security import password_executor, verify_password
+from veryneatapp.core.shared_store import MemoryBackend
+from veryneatapp.tests.utils.utils import run
+
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    """Counts the calls to jwt.decode, with an empty token cache"""
+    security.token_cache.clear()
+    calls = []
+    decode = security.jwt.get().decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt.get(), "decode", counting_decode)
+    yield calls
+    security.token_cache.clear()
+
+
+class TestGetCurrentUser:
+    def test_verified_token_is_cached(self, decode_calls):
+        token = security.create_access_token({"sub": "johndoe"})
+        user = run(security.get_current_user(token))
+        assert user.username == "johndoe"
+        assert run(security.get_current_user(token)) is user
+        assert len(decode_calls) == 1
+        assert security.token_cache.stats()["hits"] >= 1
+
+    def test_invalidate_user(self, decode_calls):
+        token = security.create_access_token({"sub": "johndoe"})
+        run(security.get_current_user(token))
+        security.invalidate_user("johndoe")
+        run(security.get_current_user(token))
+        assert len(decode_calls) == 2
+
+    def test_invalidate_token(self, decode_calls):
+        token = security.create_access_token({"sub": "johndoe"})
+        run(security.get_current_user(token))
+        security.invalidate_token(token)
+        run(security.get_current_user(token))
+        assert len(decode_calls) == 2
+
+    def test_expired_token_is_rejected(self, decode_calls):
+        token = security.create_access_token(
+            {"sub": "johndoe"}, expires_delta=timedelta(seconds=-1)
+        )
+        with pytest.raises(HTTPException):
+            run(security.get_current_user(token))
+        assert len(security.token_cache) == 0
+
+
+class TestLoginForAccessToken:
+    def test_login(self, mock_client: FastAPI):
+        response = mock_client.post(
+            "/api/v1/token", data={"username": "johndoe", "password": "secret"}
+        )
+        assert response.status_code == 200
+        assert response.json()["token_type"] == "bearer"
+        assert password_executor.stats()["completed"] >= 1
+
+    def test_login_wrong_password(self, mock_client: FastAPI):
+        response = mock_client.post(
+            "/api/v1/token", data={"username": "johndoe", "password": "oops"}
+        )
+        assert response.status_code == 401
+
+    def test_login_overloaded(self, mock_client: FastAPI, monkeypatch):
+        monkeypatch.setattr(password_executor, "max_pending", 1)
+        monkeypatch.setattr(password_executor, "in_flight", 10)
+        response = mock_client.post(
+            "/api/v1/token", data={"username": "johndoe", "password": "secret"}
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    def test_deprecated_hash_is_upgraded(
+        self, mock_client: FastAPI, monkeypatch
+    ):
+        monkeypatch.setattr(security.fake_users_db, "backend", MemoryBackend())
+        monkeypatch.setattr(
+            "veryneatapp.core.security.pwd_context",
+            Lazy(
+                lambda: CryptContext(
+                    schemes=["bcrypt"],
+                    bcrypt__default_rounds=4,
+                    bcrypt__min_rounds=4,
+                    bcrypt__max_rounds=4,
+                ),
+                warm_up=False,
+            ),
+        )
+        response = mock_client.post(
+            "/api/v1/token", data={"username": "johndoe", "password": "secret"}
+        )
+        assert response.status_code == 200
+        johndoe = run(security.fake_users_db.get("johndoe"))
+        assert johndoe["hashed_password"].startswith("$2b$04$")
+        assert verify_password("secret", johndoe["hashed_password"])
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+
+from veryneatapp.api.endpoints import tasks
+from veryneatapp.core.log_writer import BatchedLogWriter
+from veryneatapp.core.task_queue import TaskQueue
+
+TASK_RUN_BODY = {
+    "item": {"name": "Foo", "price": 35.4},
+    "user": {"username": "johndoe", "full_name": "John Doe"},
+    "importance": 3,
+}
+
+
+def wait_for_status(queue: TaskQueue, job_id: str, status: str) -> dict:
+    for _ in range(100):
+        job = queue.status(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"{job_id} is still {job['status']}")
+
+
+@pytest.fixture
+def task_log_writer(tmp_path, monkeypatch):
+    writer = BatchedLogWriter(str(tmp_path / "task_out.txt"))
+    monkeypatch.setattr(tasks, "task_log_writer", writer)
+    yield writer
+    writer.close()
+
+
+@pytest.fixture
+def task_queue(tmp_path, monkeypatch, task_log_writer):
+    """Task queue journaling to a temporary directory, with a no-op sleep"""
+    monkeypatch.setattr(tasks, "sleep", lambda _: None)
+    queue = TaskQueue(str(tmp_path / "journal.db"), max_size=2, workers=1)
+    queue.task(tasks._task_run)
+    monkeypatch.setattr(tasks, "task_queue", queue)
+    yield queue
+    queue.shutdown()
+
+
+class TestTasksEndpoints:
+    def test_task_run(
+        self, mock_client: FastAPI, task_queue, task_log_writer, tmp_path
+    ):
+        response = mock_client.post(
+            "/api/v1/tasks/run/1?model_name=alexnet&task-name=foo",
+            json=TASK_RUN_BODY,
+        )
+        assert response.status_code == 200
+        job_id = response.json()["job_id"]
+
+        wait_for_status(task_queue, job_id, "done")
+        response = mock_client.get(f"/api/v1/tasks/{job_id}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "done"
+        # written before the job is marked done
+        assert (
+            "| alexnet | foo | 1 |" in (tmp_path / "task_out.txt").read_text()
+        )
+
+    def test_task_run_queue_full(self, mock_client: FastAPI, task_queue):
+        task_queue.workers = 0  # nothing consumes the queue
+        url = "/api/v1/tasks/run/1?model_name=alexnet&task-name=foo"
+        for _ in range(task_queue.max_size):
+            assert mock_client.post(url, json=TASK_RUN_BODY).status_code == 200
+        response = mock_client.post(url, json=TASK_RUN_BODY)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "3"
+
+    def test_read_unknown_job(self, mock_client: FastAPI, task_queue):
+        response = mock_client.get("/api/v1/tasks/unknown")
+        assert response.status_code == 404
+
+
+def test_queued_tasks_survive_restart(task_queue, task_log_writer, tmp_path):
+    task_queue.workers = 0
+    job_id = task_queue.submit(
+        tasks._task_run, item={}, model_name="lenet", task_name="bar"
+    )
+    task_queue.shutdown()
+    assert task_queue.status(job_id)["status"] == "queued"
+    task_queue.shutdown()
+
+    restarted = TaskQueue(str(tmp_path / "journal.db"), workers=1)
+    restarted.task(tasks._task_run)
+    restarted.start()
+    try:
+        wait_for_status(restarted, job_id, "done")
+    finally:
+        restarted.shutdown()
+    assert "| lenet | bar | None |" in (tmp_path / "task_out.txt").read_text()
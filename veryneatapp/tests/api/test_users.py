@@ -1,3 +1,64 @@
+import json
+
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.api.schemas.user import UserCreate
+from veryneatapp.tests.utils.utils import random_email, random_lower_string, run
+
+
+class TestReadUsers:
+    def test_pages_follow_the_cursor(
+        self, mock_client: FastAPI, db: AsyncSession
+    ):
+        prefix = random_lower_string()
+        for name in ("c", "a", "b"):
+            user_in = UserCreate(
+                username=prefix + name, email=random_email(), password="secret"
+            )
+            run(crud.user.create(db, obj_in=user_in))
+
+        response = mock_client.get(
+            "/api/v1/users/users/", params={"q": prefix, "limit": 2}
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert [user["username"] for user in page["items"]] == [
+            prefix + "a",
+            prefix + "b",
+        ]
+        assert "hashed_password" not in page["items"][0]
+
+        response = mock_client.get(
+            "/api/v1/users/users/",
+            params={"q": prefix, "limit": 2, "cursor": page["next_cursor"]},
+        )
+        page = response.json()
+        assert [user["username"] for user in page["items"]] == [prefix + "c"]
+        assert page["next_cursor"] is None
+
+
+class TestCreateUser:
+    def test_password_is_filtered_out(self, mock_client: FastAPI):
+        response = mock_client.post(
+            "/api/v1/users/fake-create-user/",
+            json={
+                "username": "johndoe",
+                "email": "johndoe@example.com",
+                "password": "secret",
+            },
+        )
+        assert response.status_code == 201
+        assert response.json() == {
+            "username": "johndoe",
+            "full_name": None,
+            "email": "johndoe@example.com",
+            "is_active": True,
+            "is_superuser": False,
+        }
+
+
 # def test_get_users_superuser_me(
 #     client: TestClient, superuser_token_headers: Dict[str, str]
 # ) -> None:
@@ -102,3 +163,60 @@
 #     assert len(all_users) > 1
 #     for item in all_users:
 #         assert "email" in item
+
+
+class TestBulkUsers:
+    def test_create(self, mock_client: FastAPI, db: AsyncSession):
+        taken = run(
+            crud.user.create(
+                db,
+                obj_in=UserCreate(
+                    username=random_lower_string(),
+                    email=random_email(),
+                    password="secret",
+                ),
+            )
+        )
+        username, email = random_lower_string(), random_email()
+        response = mock_client.post(
+            "/api/v1/users/users/bulk",
+            json=[
+                {"username": username, "email": email, "password": "secret"},
+                {"username": taken.username, "email": random_email()},
+                {
+                    "username": taken.username,
+                    "email": random_email(),
+                    "password": "secret",
+                },
+                {
+                    "username": username,
+                    "email": random_email(),
+                    "password": "x",
+                },
+            ],
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == [201, 422, 409, 409]
+        assert results[0]["data"]["username"] == username
+        assert "password" not in results[0]["data"]
+        user = run(crud.user.get_by_username(db, username=username))
+        assert user.hashed_password.startswith("$2b$")
+
+    def test_stream_ndjson(self, mock_client: FastAPI, db: AsyncSession):
+        prefix = random_lower_string()
+        for name in ("b", "a"):
+            user_in = UserCreate(
+                username=prefix + name, email=random_email(), password="secret"
+            )
+            run(crud.user.create(db, obj_in=user_in))
+        response = mock_client.get(
+            "/api/v1/users/users/", params={"q": prefix, "format": "ndjson"}
+        )
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert [json.loads(line)["username"] for line in lines] == [
+            prefix + "a",
+            prefix + "b",
+        ]
+        assert "hashed_password" not in lines[0]
@@ -0,0 +1,74 @@
+import copy
+
+from veryneatapp.benchmarks.asgi import ASGIClient
+from veryneatapp.benchmarks.runner import (
+    compare,
+    percentile,
+    run_scenario,
+    uncovered_routes,
+)
+from veryneatapp.benchmarks.scenarios import SCENARIOS
+from veryneatapp.benchmarks.schemas import CASES, run_schema_benchmarks
+from veryneatapp.main import app
+from veryneatapp.tests.utils.utils import run
+
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
+
+
+def test_every_route_has_a_scenario():
+    assert uncovered_routes(app, SCENARIOS) == set()
+
+
+def test_run_scenario():
+    client = ASGIClient(app)
+    for name in ("items.read_keyword_weights", "tasks.task_run"):
+        result = run(
+            run_scenario(
+                client,
+                SCENARIOS_BY_NAME[name],
+                context={},
+                requests=20,
+                concurrency=4,
+                warmup=2,
+            )
+        )
+        assert result["requests"] == 20
+        assert result["errors"] == 0
+        assert result["throughput"] > 0
+        assert 0 < result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3], 95) == 3
+
+
+def test_compare():
+    baseline = {
+        "results": {
+            "foo": {"errors": 0, "throughput": 100, "p50_ms": 10, "p95_ms": 20},
+            "bar": {"errors": 0, "throughput": 100, "p50_ms": 10, "p95_ms": 20},
+        }
+    }
+    current = copy.deepcopy(baseline)
+    current["results"]["foo"]["p95_ms"] = 23
+    current["results"]["bar"]["throughput"] = 50
+    current["results"]["baz"] = current["results"]["bar"]
+    regressions = compare(baseline, current, threshold=0.2)
+    assert regressions == [
+        "bar: throughput 100 -> 50 (-50%)",
+        "baz: not in the baseline",
+    ]
+    assert len(compare(baseline, current, threshold=0.1)) == 3
+
+
+def test_schema_fast_paths():
+    for case in CASES:
+        validated, fast = case.validated(), case.fast()
+        if not isinstance(validated, dict):
+            validated, fast = validated.dict(), fast.dict()
+        assert fast == validated, case.name
+    results = run_schema_benchmarks(CASES[:1], number=10)
+    assert results["users.fake_save_user (UserInDB)"]["fast_us"] > 0
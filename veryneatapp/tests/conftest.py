@@ -2,7 +2,23 @@ import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
+from veryneatapp.db.session import close_db, get_session, init_db
 from veryneatapp.main import app
+from veryneatapp.tests.utils.utils import run
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    run(init_db())
+    yield
+    run(close_db())
+
+
+@pytest.fixture
+def db():
+    session = get_session()
+    yield session
+    run(session.close())
 
 
 @pytest.fixture
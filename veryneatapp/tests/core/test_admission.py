@@ -0,0 +1,154 @@
+import asyncio
+import multiprocessing
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
+
+from veryneatapp.core.admission import (
+    AdmissionMiddleware,
+    ConcurrencyLimiter,
+    MemoryBackend,
+    MmapBackend,
+    RouteTable,
+    client_key,
+)
+from veryneatapp.tests.utils.utils import run
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def acquire_in_child(path: str, results) -> None:
+    backend = MmapBackend(path, slots=16)
+    results.put([backend.acquire("client", (1, 3)) for _ in range(2)])
+
+
+class TestBackends:
+    def test_memory_token_bucket(self):
+        timer = FakeTimer()
+        backend = MemoryBackend(timer=timer)
+        assert [backend.acquire("a", (2, 3)) for _ in range(4)] == [
+            0,
+            0,
+            0,
+            0.5,
+        ]
+        assert backend.acquire("b", (2, 3)) == 0
+        timer.now += 0.5
+        assert backend.acquire("a", (2, 3)) == 0
+        assert backend.acquire("a", (2, 3)) == 0.5
+
+    def test_memory_drops_the_least_recently_used(self):
+        backend = MemoryBackend(max_keys=2, timer=FakeTimer())
+        for key in ("a", "b", "a", "c"):
+            backend.acquire(key, (1, 1))
+        assert backend.acquire("a", (1, 1)) == 1
+        assert backend.acquire("b", (1, 1)) == 0
+
+    def test_mmap_buckets_are_shared(self, tmp_path: Path):
+        path = str(tmp_path / "ratelimit.db")
+        backend = MmapBackend(path, slots=16)
+        assert backend.acquire("client", (1, 3)) == 0
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=acquire_in_child, args=(path, results)
+        )
+        process.start()
+        process.join()
+        assert results.get() == [0, 0]
+        assert backend.acquire("client", (1, 3)) > 0
+
+
+class TestConcurrencyLimiter:
+    def test_slots_are_handed_over_in_order(self):
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1)
+        order = []
+
+        async def request(name: str, timeout: float = 1) -> None:
+            if not await limiter.acquire(timeout):
+                order.append(f"{name} rejected")
+                return
+            order.append(name)
+            await asyncio.sleep(0.01)
+            limiter.release()
+
+        async def main():
+            await asyncio.gather(request("a"), request("b"), request("c"))
+            await asyncio.gather(request("d"), request("e", timeout=0.001))
+
+        run(main())
+        assert order == ["a", "c rejected", "b", "d", "e rejected"]
+        assert limiter.in_flight == 0
+
+
+class TestRouteTable:
+    def test_match(self):
+        table = RouteTable({"/token": 1, "/items/{item_id:int}": 2})
+        assert table.match("/token") == ("/token", 1)
+        assert table.match("/items/3") == ("/items/{item_id:int}", 2)
+        assert table.match("/items/x") is None
+
+
+class TestClientKey:
+    def test_keys(self):
+        scope = {
+            "client": ("1.2.3.4", 5000),
+            "headers": [(b"authorization", b"Bearer abc")],
+        }
+        assert client_key(scope, "ip") == "ip:1.2.3.4"
+        assert client_key(scope, "token", lambda token: "bob") == "token:abc"
+        assert client_key(scope, "user", lambda token: "bob") == "user:bob"
+        assert client_key({**scope, "headers": []}, "user") == "ip:1.2.3.4"
+
+    def test_unverified_tokens_use_the_ip(self):
+        scope = {
+            "client": ("1.2.3.4", 5000),
+            "headers": [(b"authorization", b"Bearer random")],
+        }
+        assert client_key(scope, "token", lambda token: None) == "ip:1.2.3.4"
+        assert client_key(scope, "user", lambda token: None) == "ip:1.2.3.4"
+        assert client_key(scope, "token") == "ip:1.2.3.4"
+
+
+class TestAdmissionMiddleware:
+    def make_client(self, **options) -> TestClient:
+        app = Starlette()
+
+        @app.route("/{path}")
+        async def endpoint(request):
+            return PlainTextResponse("ok")
+
+        app.add_middleware(
+            AdmissionMiddleware, backend=MemoryBackend(), **options
+        )
+        return TestClient(app)
+
+    def test_rate_limits(self):
+        client = self.make_client(
+            default_limit=(1, 3), route_limits={"/token": (0.5, 1)}
+        )
+        assert client.get("/token").status_code == 200
+        response = client.get("/token")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert response.json() == {"detail": "Too Many Requests"}
+        assert client.get("/other").status_code == 200
+        assert client.get("/other").status_code == 429
+
+    def test_load_shedding(self):
+        client = self.make_client(max_in_flight=1)
+        middleware = client.app.middleware_stack
+        while not isinstance(middleware, AdmissionMiddleware):
+            middleware = middleware.app
+        assert client.get("/x").status_code == 200
+        middleware.in_flight = 1
+        response = client.get("/x")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,127 @@
+import asyncio
+import zlib
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.testclient import TestClient
+
+from veryneatapp.core.compression import CompressionMiddleware, negotiate
+from veryneatapp.core.executors import BoundedExecutor
+from veryneatapp.tests.utils.utils import run
+
+BODY = "".join(f'{{"id": {i}, "title": "Item {i}"}}\n' for i in range(200))
+
+
+def make_app(**options) -> Starlette:
+    app = Starlette()
+
+    @app.route("/text/{size:int}")
+    async def text(request):
+        return PlainTextResponse(
+            BODY[: request.path_params["size"]], headers={"ETag": '"abc"'}
+        )
+
+    @app.route("/image")
+    async def image(request):
+        return Response(BODY, media_type="image/jpeg")
+
+    @app.route("/stream")
+    async def stream(request):
+        async def lines():
+            for line in BODY.splitlines(keepends=True)[:100]:
+                yield line
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, **options)
+    return app
+
+
+async def call(app, path: str, accept_encoding: str = "gzip"):
+    """The messages sent by the app"""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    messages = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()  # the client stays connected
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages
+
+
+class TestNegotiate:
+    def test_negotiate(self):
+        encodings = ["zstd", "br", "gzip"]
+        assert negotiate("gzip, br", encodings) == "br"
+        assert negotiate("gzip, br;q=0.5", encodings) == "gzip"
+        assert negotiate("*", encodings) == "zstd"
+        assert negotiate("gzip;q=0, identity", encodings) is None
+        assert negotiate("", encodings) is None
+
+
+class TestCompressionMiddleware:
+    def test_compresses_large_bodies(self):
+        client = TestClient(make_app())
+        response = client.get("/text/5000", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.headers["ETag"] == 'W/"abc"'
+        assert response.text == BODY[:5000]  # decoded by requests
+
+        messages = run(call(make_app(), "/text/5000"))
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        assert len(body) < 5000
+        assert zlib.decompress(body, 31) == BODY[:5000].encode()
+
+    def test_skips_small_and_compressed_bodies(self):
+        client = TestClient(make_app())
+        response = client.get("/text/100", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Content-Length"] == "100"
+        assert response.headers["Vary"] == "Accept-Encoding"
+
+        response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+        assert "Vary" not in response.headers
+
+        response = client.get(
+            "/text/5000", headers={"Accept-Encoding": "identity"}
+        )
+        assert "Content-Encoding" not in response.headers
+
+    def test_streams_are_compressed_incrementally(self):
+        messages = run(call(make_app(), "/stream"))
+        start, *bodies = messages
+        assert (b"content-encoding", b"gzip") in start["headers"]
+        assert len(bodies) > 2  # not buffered until the end
+        decompressor = zlib.decompressobj(31)
+        received = b""
+        for message in bodies:
+            received += decompressor.decompress(message["body"])
+            # Each chunk is flushed: complete lines can be read right away
+            assert received.endswith(b"\n")
+        assert received.decode() == "".join(
+            BODY.splitlines(keepends=True)[:100]
+        )
+        assert bodies[-1]["more_body"] is False
+
+    def test_offloads_large_chunks(self):
+        executor = BoundedExecutor(max_workers=1, name="compression")
+        app = make_app(offload_size=2048, executor=executor)
+        messages = run(call(app, "/text/5000"))
+        assert executor.completed == 1
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        assert zlib.decompress(body, 31) == BODY[:5000].encode()
+        executor.shutdown()
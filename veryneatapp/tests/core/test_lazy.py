@@ -0,0 +1,42 @@
+import os
+
+from veryneatapp.core.lazy import Lazy, warm_up
+from veryneatapp.importtime import measure, parse
+from veryneatapp.tests.utils.utils import run
+
+
+class TestLazy:
+    def test_built_once_on_first_use(self):
+        calls = []
+        lazy = Lazy(lambda: calls.append(1) or len(calls), warm_up=False)
+        assert not lazy.loaded
+        assert lazy.get() == lazy.get() == 1
+        assert lazy.loaded
+
+    def test_warm_up(self, monkeypatch):
+        lazy = Lazy(dict, warm_up=False)
+        monkeypatch.setattr(Lazy, "registry", [lazy])
+        run(warm_up("none"))
+        assert not lazy.loaded
+        run(warm_up("startup"))
+        assert lazy.loaded
+
+
+class TestImportTime:
+    def test_parse(self):
+        imports = parse(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       572 |     349761 |   fastapi\n"
+            "import time:      1000 |     350761 | veryneatapp.main\n"
+        )
+        assert [(i.module, i.self_us, i.depth) for i in imports] == [
+            ("fastapi", 572, 1),
+            ("veryneatapp.main", 1000, 0),
+        ]
+
+    def test_optional_subsystems_are_not_imported(self):
+        modules = {
+            entry.module for entry in measure("veryneatapp.main", os.environ)
+        }
+        assert "fastapi" in modules
+        assert not modules & {"graphene", "jose.jwt", "passlib", "jinja2"}
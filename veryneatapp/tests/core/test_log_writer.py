@@ -0,0 +1,91 @@
+import threading
+
+from veryneatapp.core.log_writer import _STOP, BatchedLogWriter
+
+
+class TestBatchedLogWriter:
+    def test_concurrent_writes(self, tmp_path):
+        writer = BatchedLogWriter(
+            str(tmp_path / "out.txt"), max_batch_records=50
+        )
+
+        def write_lines(thread_id: int):
+            for i in range(500):
+                writer.write(f"{thread_id} | {i} | {'x' * 100}")
+
+        threads = [
+            threading.Thread(target=write_lines, args=(i,)) for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.close()
+
+        lines = (tmp_path / "out.txt").read_text().splitlines()
+        assert len(lines) == 8 * 500
+        assert all(line.endswith("x" * 100) for line in lines)
+        for thread_id in range(8):
+            # records from a given writer keep their order
+            assert [
+                int(line.split(" | ")[1])
+                for line in lines
+                if line.startswith(f"{thread_id} |")
+            ] == list(range(500))
+
+    def test_rotation(self, tmp_path):
+        path = tmp_path / "out.txt"
+        writer = BatchedLogWriter(
+            str(path), max_batch_records=1, max_bytes=100, backup_count=2
+        )
+        for i in range(30):
+            writer.write(f"line {i:02d} {'-' * 10}")  # 19 bytes per line
+        writer.close()
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "out.txt",
+            "out.txt.1",
+            "out.txt.2",
+        ]
+        for rotated in tmp_path.iterdir():
+            assert rotated.stat().st_size <= 100
+        assert path.read_text().splitlines()[-1].startswith("line 29")
+
+    def test_flush(self, tmp_path):
+        path = tmp_path / "out.txt"
+        writer = BatchedLogWriter(str(path), flush_interval=60)
+        writer.write("first")
+        assert writer.flush(timeout=5)
+        assert path.read_text() == "first\n"
+        writer.close()
+
+    def test_write_errors(self, tmp_path, monkeypatch):
+        path = tmp_path / "out.txt"
+        writer = BatchedLogWriter(str(path), flush_interval=60)
+        write_batch = writer._write_batch
+
+        def full_disk(data: bytes):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(writer, "_write_batch", full_disk)
+        writer.write("lost")
+        assert writer.flush(timeout=5)
+        assert writer.dropped_records == 1
+
+        monkeypatch.setattr(writer, "_write_batch", write_batch)
+        writer.write("kept")
+        assert writer.flush(timeout=5)
+        assert path.read_text() == "kept\n"
+        writer.close()
+
+    def test_restarted_thread(self, tmp_path):
+        path = tmp_path / "out.txt"
+        writer = BatchedLogWriter(str(path), flush_interval=60)
+        writer.write("first")
+        # the thread stops, eg. on an unexpected error
+        writer._queue.put(_STOP)
+        writer._thread.join(5)
+        writer.write("second")
+        assert writer.flush(timeout=5)
+        assert path.read_text() == "first\nsecond\n"
+        writer.close()
@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+from pathlib import Path
+
+from fastapi import FastAPI
+
+from veryneatapp.core.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    MmapStore,
+    read_store,
+)
+from veryneatapp.main import app
+
+
+def increment_in_child(counter: Counter) -> None:
+    counter.labels("child").inc(3)
+
+
+class TestMmapStore:
+    def test_values_are_read_from_the_file(self, tmp_path: Path):
+        store = MmapStore(str(tmp_path / "metrics_1.db"))
+        store.inc("a")
+        store.inc("a", 2)
+        store.set("b", 1.5)
+        assert dict(read_store(store.path)) == {"a": 3.0, "b": 1.5}
+
+    def test_grows(self, tmp_path: Path):
+        store = MmapStore(str(tmp_path / "metrics_1.db"))
+        for i in range(5000):
+            store.inc(f"key-{i}", i)
+        assert dict(read_store(store.path))["key-4999"] == 4999.0
+
+    def test_reopened(self, tmp_path: Path):
+        path = str(tmp_path / "metrics_1.db")
+        store = MmapStore(path)
+        store.inc("a", 2)
+        store.close()
+        store = MmapStore(path)
+        store.inc("a")
+        assert dict(read_store(path)) == {"a": 3.0}
+
+
+class TestMetricsRegistry:
+    def test_exposition(self, tmp_path: Path):
+        registry = MetricsRegistry(str(tmp_path))
+        counter = Counter("requests_total", "Requests", ("route",), registry)
+        histogram = Histogram(
+            "duration_seconds", "Duration", buckets=(0.1, 1), registry=registry
+        )
+        counter.labels("/items/{item_id}").inc()
+        histogram.labels().observe(0.05)
+        histogram.labels().observe(0.5)
+        text = registry.generate_latest()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{route="/items/{item_id}"} 1.0' in text
+        assert 'duration_seconds_bucket{le="0.1"} 1.0' in text
+        assert 'duration_seconds_bucket{le="1.0"} 2.0' in text
+        assert 'duration_seconds_bucket{le="+Inf"} 2.0' in text
+        assert "duration_seconds_count 2.0" in text
+
+    def test_processes_are_added_up(self, tmp_path: Path):
+        registry = MetricsRegistry(str(tmp_path))
+        counter = Counter("tasks_total", "Tasks", ("origin",), registry)
+        gauge = Gauge("depth", "Depth", registry=registry)
+        counter.labels("child").inc()
+        gauge.labels().set(2)
+        child = multiprocessing.get_context("fork").Process(
+            target=increment_in_child, args=(counter,)
+        )
+        child.start()
+        child.join()
+        samples = registry.aggregate()
+        # The file of the exited process is merged into the archive
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "archive.db",
+            "archive.lock",
+            f"metrics_{os.getpid()}.db",
+        ]
+        # The counter of the exited process is kept, once
+        assert samples['["tasks_total",[["origin","child"]]]'] == 4.0
+        assert samples['["depth",[]]'] == 2.0
+        samples = registry.aggregate()
+        assert samples['["tasks_total",[["origin","child"]]]'] == 4.0
+
+    def test_mark_process_dead(self, tmp_path: Path):
+        registry = MetricsRegistry(str(tmp_path))
+        counter = Counter("tasks_total", "Tasks", ("origin",), registry)
+        gauge = Gauge("depth", "Depth", registry=registry)
+        child = multiprocessing.get_context("fork").Process(
+            target=increment_in_child, args=(counter,)
+        )
+        child.start()
+        child.join()
+        gauge.labels().set(2)
+        registry.mark_process_dead(child.pid)
+        assert not (tmp_path / f"metrics_{child.pid}.db").exists()
+        assert registry.aggregate() == {
+            '["tasks_total",[["origin","child"]]]': 3.0,
+            '["depth",[]]': 2.0,
+        }
+
+    def test_collectors(self, tmp_path: Path):
+        registry = MetricsRegistry(str(tmp_path))
+        gauge = Gauge("depth", "Depth", registry=registry)
+        registry.register_collector(lambda: gauge.labels().set(7))
+        assert "depth 7.0" in registry.generate_latest()
+
+
+class TestMetricsEndpoint:
+    def test_requests_by_route_template(self, mock_client: FastAPI):
+        mock_client.get("/api/v1/items/keyword-weights/")
+        mock_client.get("/api/v1/users/users/foo")
+        mock_client.get("/does-not-exist")
+        response = mock_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        text = response.text
+        assert (
+            'http_requests_total{method="GET",'
+            'route="/api/v1/users/users/{username}",status="200"}'
+        ) in text
+        assert 'route="/api/v1/users/users/foo"' not in text
+        assert 'route="<unmatched>",status="404"' in text
+        assert "http_request_duration_seconds_bucket{" in text
+        assert "http_requests_in_flight 1.0" in text  # the scrape itself
+        assert "task_queue_depth " in text
+        assert 'cache_hits_total{cache="auth_token"}' in text
+        assert 'executor_active{executor="password-hasher"}' in text
+        assert 'executor_queued{executor="password-hasher"}' in text
+        assert 'executor_rejected_total{executor="password-hasher"}' in text
+
+    def test_static_files_route(self, mock_client: FastAPI):
+        css_url = app.url_path_for("static", path="/css/materialize.min.css")
+        assert mock_client.get(css_url).status_code == 200
+        text = mock_client.get("/metrics").text
+        assert (
+            'http_requests_total{method="GET",'
+            'route="/static/{path}",status="200"}'
+        ) in text
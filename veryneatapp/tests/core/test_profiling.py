@@ -0,0 +1,117 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+from fastapi import FastAPI
+
+from veryneatapp.core.config import settings
+from veryneatapp.core.profiling import (
+    Profile,
+    Profiler,
+    profiler,
+    sign_profile_header,
+    verify_profile_header,
+)
+from veryneatapp.tests.utils.utils import run
+
+KEY = {"X-Profiler-Key": settings.PROFILER_SECRET}
+
+
+class TestProfileHeader:
+    def test_signature(self):
+        header = sign_profile_header("secret")
+        assert verify_profile_header("secret", header)
+        assert not verify_profile_header("other", header)
+        assert not verify_profile_header("", header)
+        assert not verify_profile_header("secret", "123.abc")
+
+    def test_expired(self):
+        assert not verify_profile_header(
+            "secret", sign_profile_header("secret", ttl=-1)
+        )
+
+
+class TestProfile:
+    def test_cpu_sample(self):
+        async def busy():
+            profile = Profile(
+                "test", asyncio.current_task(), threading.get_ident()
+            )
+            profile.sample(sys._current_frames())
+            return profile
+
+        profile = run(busy())
+        [stack] = profile.stacks
+        assert stack.startswith("[cpu];")
+        assert stack.endswith(":busy")
+
+    def test_ring(self, tmp_path: Path):
+        ring = Profiler(str(tmp_path), max_profiles=2)
+
+        async def save(profile_id):
+            profile = Profile(profile_id, asyncio.current_task(), 0)
+            profile.stacks["[await];foo"] = 1
+            ring.save(profile)
+
+        for profile_id in ("1", "2", "3"):
+            run(save(profile_id))
+        assert ring.list() == ["3", "2"]
+        assert Path(ring.path("3")).read_text() == "[await];foo 1\n"
+
+
+class TestProfilerMiddleware:
+    def test_signed_header(self, mock_client: FastAPI):
+        response = mock_client.post(
+            "/api/v1/token",
+            data={"username": "johndoe", "password": "secret"},
+            headers={
+                "X-Profile": sign_profile_header(settings.PROFILER_SECRET)
+            },
+        )
+        assert response.status_code == 200
+        profile_id = response.headers["X-Profile-Id"]
+        folded = Path(profiler.path(profile_id)).read_text()
+        # Waiting on bcrypt in the password executor
+        assert "[await];" in folded
+        assert "login_for_access_token" in folded
+
+    def test_not_profiled(self, mock_client: FastAPI):
+        response = mock_client.get(
+            "/api/v1/items/keyword-weights/",
+            headers={"X-Profile": "1.invalid"},
+        )
+        assert "X-Profile-Id" not in response.headers
+
+    def test_admin_routes(self, mock_client: FastAPI):
+        url = "/api/v1/profiler/arm?requests=1"
+        assert mock_client.post(url).status_code == 422
+        assert (
+            mock_client.post(url, headers={"X-Profiler-Key": "x"}).status_code
+            == 403
+        )
+        assert mock_client.post(url, headers=KEY).status_code == 200
+        first = mock_client.get("/api/v1/items/keyword-weights/")
+        second = mock_client.get("/api/v1/items/keyword-weights/")
+        assert "X-Profile-Id" in first.headers
+        assert "X-Profile-Id" not in second.headers
+
+        profile_id = first.headers["X-Profile-Id"]
+        profiles = mock_client.get("/api/v1/profiler/profiles", headers=KEY)
+        assert profile_id in profiles.json()
+        response = mock_client.get(
+            f"/api/v1/profiler/profiles/{profile_id}", headers=KEY
+        )
+        assert response.status_code == 200
+        response = mock_client.get(
+            "/api/v1/profiler/profiles/..%2Fsecret", headers=KEY
+        )
+        assert response.status_code == 404
+
+    def test_disarm(self, mock_client: FastAPI):
+        profiler.arm(requests=10, seconds=60)
+        response = mock_client.delete("/api/v1/profiler/arm", headers=KEY)
+        assert response.status_code == 204
+        assert not profiler.take_armed()
+        profiler.arm(requests=10, seconds=-1)
+        assert not profiler.take_armed()
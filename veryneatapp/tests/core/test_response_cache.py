@@ -0,0 +1,107 @@
+import pytest
+from fastapi import FastAPI
+
+from veryneatapp.api.endpoints import items
+from veryneatapp.core.cache import TTLCache
+from veryneatapp.core.response_cache import evict, response_cache
+from veryneatapp.core.shared_store import MemoryBackend
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+class TestCachedRoutes:
+    def test_second_get_is_served_from_cache(self, mock_client: FastAPI):
+        first = mock_client.get("/api/v1/items/keyword-weights/")
+        second = mock_client.get("/api/v1/items/keyword-weights/")
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == first.json() == {"foo": 2.3, "bar": 3.4}
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert second.headers["Content-Type"] == "application/json"
+
+    def test_if_none_match(self, mock_client: FastAPI):
+        etag = mock_client.get("/api/v1/users/users/foo").headers["ETag"]
+        response = mock_client.get(
+            "/api/v1/users/users/foo", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+        response = mock_client.get(
+            "/api/v1/users/users/foo", headers={"If-None-Match": '"other"'}
+        )
+        assert response.status_code == 200
+
+    def test_query_parameters_are_part_of_the_key(self, mock_client: FastAPI):
+        mock_client.get("/api/v1/items/keyword-weights/?a=1&b=2")
+        response = mock_client.get("/api/v1/items/keyword-weights/?b=2&a=1")
+        assert response.headers["X-Cache"] == "HIT"
+        response = mock_client.get("/api/v1/items/keyword-weights/?a=2")
+        assert response.headers["X-Cache"] == "MISS"
+
+    def test_vary_header_still_checks_the_token(self, mock_client: FastAPI):
+        url = "/api/v1/basics/tutorial"
+        assert mock_client.get(url).status_code == 200
+        assert mock_client.get(url).headers["X-Cache"] == "HIT"
+        response = mock_client.get(url, headers={"X-Token": "wrong"})
+        assert response.status_code == 400
+
+    def test_write_invalidates(self, mock_client: FastAPI, monkeypatch):
+        monkeypatch.setattr(items.items, "backend", MemoryBackend())
+        url = "/api/v1/items/get-item-or-404/item1"
+        etag = mock_client.get(url).headers["ETag"]
+        mock_client.get("/api/v1/items/keyword-weights/")
+
+        response = mock_client.patch(
+            "/api/v1/items/partial-update/item1", json={"name": "Bar"}
+        )
+        assert response.status_code == 200
+
+        response = mock_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] == "MISS"
+        assert response.json()["name"] == "Bar"
+        response = mock_client.get("/api/v1/items/keyword-weights/")
+        assert response.headers["X-Cache"] == "HIT"
+
+    def test_evict(self, mock_client: FastAPI):
+        url = "/api/v1/items/get-item-or-404/item1"
+        mock_client.get(url)
+        mock_client.get("/api/v1/items/keyword-weights/")
+        assert evict("item:item1") == 1
+        assert mock_client.get(url).headers["X-Cache"] == "MISS"
+        response = mock_client.get("/api/v1/items/keyword-weights/")
+        assert response.headers["X-Cache"] == "HIT"
+
+    def test_errors_are_not_cached(self, mock_client: FastAPI):
+        url = "/api/v1/items/get-item-or-404/nope"
+        assert mock_client.get(url).status_code == 404
+        assert len(response_cache.entries) == 0
+
+    def test_openapi_document(self, mock_client: FastAPI):
+        etag = mock_client.get("/api/v1/openapi.json").headers["ETag"]
+        response = mock_client.get(
+            "/api/v1/openapi.json", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+
+
+def test_ttl_cache_max_bytes():
+    cache = TTLCache(maxsize=10, max_bytes=10)
+    cache.set("a", 1, size=4)
+    cache.set("b", 2, size=4)
+    cache.get("a")
+    cache.set("c", 3, size=4)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["bytes"] == 8
+    cache.set("d", 4, size=11)
+    assert cache.get("d") is None
+    cache.pop("a")
+    assert cache.stats()["bytes"] == 4
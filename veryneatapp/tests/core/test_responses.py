@@ -0,0 +1,94 @@
+from datetime import datetime, time, timedelta, timezone
+from enum import Enum
+from uuid import UUID
+
+import pytest
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from veryneatapp.api.schemas.item import CarItem, Item, SimpleItem
+from veryneatapp.core import responses
+from veryneatapp.tests.utils.utils import run
+
+
+class Color(str, Enum):
+    blue = "blue"
+
+
+CONTENT = {
+    "item_id": UUID("123e4567-e89b-12d3-a456-426614174000"),
+    "start_datetime": datetime(2020, 8, 18, 14, 38, 7, 741000),
+    "end_datetime": datetime(2020, 8, 18, 14, 40, 7, tzinfo=timezone.utc),
+    "repeat_at": time(14, 23, 55, 3000),
+    "process_after": timedelta(seconds=11.03),
+    "color": Color.blue,
+    "weights": {129385: 1.45, 2: 0.1},
+    "items": [
+        Item(name="Foo", price=35.4, tags={"blue"}),
+        CarItem(name="Bar", description="Fighters ü"),
+    ],
+    "nothing": None,
+}
+
+
+@pytest.mark.parametrize(
+    "backend",
+    [name for name, (module, _) in responses.JSON_BACKENDS.items() if module],
+)
+def test_same_output_as_jsonable_encoder(backend):
+    expected = JSONResponse(jsonable_encoder(CONTENT)).body
+    dumps = responses.get_json_dumps(backend)
+    # pydantic models and datetimes encoded directly (fast path)
+    assert dumps(CONTENT) == expected
+    # content already encoded by FastAPI
+    assert dumps(jsonable_encoder(CONTENT)) == expected
+
+
+def test_advanced_datatypes(mock_client: FastAPI):
+    body = {
+        "start_datetime": "2020-08-18T14:38:07.741Z",
+        "end_datetime": "2020-08-18T14:40:07.741Z",
+        "repeat_at": "14:23:55.003",
+        "process_after": 11.03,
+    }
+    response = mock_client.put(
+        "/api/v1/basics/advanced-datatypes/123e4567-e89b-12d3-a456-426614174000",
+        json=body,
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "item_id": "123e4567-e89b-12d3-a456-426614174000",
+        "start_datetime": "2020-08-18T14:38:07.741000+00:00",
+        "end_datetime": "2020-08-18T14:40:07.741000+00:00",
+        "repeat_at": "14:23:55.003000",
+        "process_after": 11.03,
+        "start_process": "2020-08-18T14:38:18.771000+00:00",
+        "duration": 108.97,
+    }
+
+
+class TestNDJSONResponse:
+    def test_lines_are_produced_on_demand(self, monkeypatch):
+        monkeypatch.setattr(responses.NDJSONResponse, "chunk_size", 40)
+        produced = []
+
+        async def items():
+            for i in range(6):
+                produced.append(i)
+                yield {"name": f"item-{i}", "extra": "dropped"}
+
+        response = responses.NDJSONResponse(items(), model=SimpleItem)
+
+        async def read_chunks():
+            chunks = []
+            async for chunk in response.body_iterator:
+                chunks.append((chunk, len(produced)))
+            return chunks
+
+        chunks = run(read_chunks())
+        # The first line right away, then about chunk_size bytes at a time
+        assert [count for _, count in chunks] == [1, 3, 5, 6]
+        lines = b"".join(chunk for chunk, _ in chunks).splitlines()
+        assert lines[0] == b'{"name":"item-0","description":null}'
+        assert len(lines) == 6
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from veryneatapp.core import server
+from veryneatapp.core.config import settings
+
+
+class TestCgroupCpuLimit:
+    def test_cgroup_v2(self, tmp_path: Path):
+        (tmp_path / "cpu.max").write_text("150000 100000\n")
+        assert server.cgroup_cpu_limit(str(tmp_path)) == 1.5
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+        assert server.cgroup_cpu_limit(str(tmp_path)) is None
+
+    def test_cgroup_v1(self, tmp_path: Path):
+        (tmp_path / "cpu").mkdir()
+        (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+        (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("200000\n")
+        assert server.cgroup_cpu_limit(str(tmp_path)) == 2
+        (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+        assert server.cgroup_cpu_limit(str(tmp_path)) is None
+
+    def test_no_cgroup(self, tmp_path: Path):
+        assert server.cgroup_cpu_limit(str(tmp_path)) is None
+
+
+class TestWorkersCount:
+    def test_sized_from_the_cpus(self, monkeypatch):
+        monkeypatch.setattr(settings, "WORKERS_COUNT", 0)
+        monkeypatch.setattr(settings, "WORKERS_PER_CPU", 2)
+        monkeypatch.setattr(settings, "WORKERS_MAX", 32)
+        monkeypatch.setattr(server, "available_cpus", lambda: 1.5)
+        assert server.workers_count() == 3
+        monkeypatch.setattr(settings, "WORKERS_MAX", 2)
+        assert server.workers_count() == 2
+        monkeypatch.setattr(server, "available_cpus", lambda: 0.25)
+        monkeypatch.setattr(settings, "WORKERS_PER_CPU", 1)
+        assert server.workers_count() == 1
+
+    def test_fixed(self, monkeypatch):
+        monkeypatch.setattr(settings, "WORKERS_COUNT", 7)
+        assert server.workers_count() == 7
+
+
+def test_gunicorn_options(monkeypatch):
+    monkeypatch.setattr(settings, "WORKERS_COUNT", 4)
+    monkeypatch.setattr(settings, "MAX_REQUESTS", 100)
+    options = server.gunicorn_options()
+    assert options["workers"] == 4
+    assert options["max_requests"] == 100
+    assert options["preload_app"] == settings.PRELOAD_APP
+    assert options["bind"].endswith(f":{settings.WEBSERVER_PORT}")
+
+
+def test_event_loop_and_http_parser(monkeypatch):
+    monkeypatch.setattr(settings, "SERVER_LOOP", "asyncio")
+    assert server.event_loop() == "asyncio"
+    monkeypatch.setattr(settings, "SERVER_HTTP", "auto")
+    monkeypatch.setattr(server, "_installed", lambda module: False)
+    assert server.http_parser() == "h11"
+
+
+def test_memory_store_with_several_workers(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SERVER_PROFILE", "production")
+    monkeypatch.setattr(settings, "WORKERS_COUNT", 4)
+    monkeypatch.setattr(settings, "SHARED_STORE_BACKEND", "memory")
+    server.check_shared_store()
+    assert "SHARED_STORE_BACKEND=socket" in caplog.text
+    caplog.clear()
+    monkeypatch.setattr(settings, "SHARED_STORE_BACKEND", "socket")
+    server.check_shared_store()
+    monkeypatch.setattr(settings, "SHARED_STORE_BACKEND", "memory")
+    monkeypatch.setattr(settings, "WORKERS_COUNT", 1)
+    server.check_shared_store()
+    assert caplog.text == ""
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from veryneatapp.core.shared_store import (
+    MemoryBackend,
+    SharedStore,
+    SocketBackend,
+    StoreServer,
+)
+from veryneatapp.tests.utils.utils import run
+
+
+class TestSharedStore:
+    def test_defaults(self):
+        store = SharedStore("items", {"a": 1}, backend=MemoryBackend())
+        assert run(store.get("a")) == 1
+        assert run(store.get("b", 2)) == 2
+        run(store.set("a", 3))
+        assert run(store.get("a")) == 3
+
+
+class TestSocketBackend:
+    def test_writes_are_seen_by_the_other_workers(self, tmp_path: Path):
+        path = str(tmp_path / "store.sock")
+        changed = []
+
+        async def main():
+            server = StoreServer(path)
+            await server.start()
+            first, second = SocketBackend(path), SocketBackend(path)
+            second.on_change("items", changed.append)
+            try:
+                assert await second.get("items", "a") is None
+                await second.set("items", "b", {"name": "Bar"})
+                assert await first.get("items", "b") == {"name": "Bar"}
+
+                await first.set("items", "a", {"name": "Foo"})
+                # Sent after the set: the invalidation was read before it
+                await second.get("items", "other")
+                assert changed == ["a"]
+                assert ("items", "a") not in second.front._data
+                assert await second.get("items", "a") == {"name": "Foo"}
+
+                # Served from the front tier
+                server.data.clear()
+                assert await second.get("items", "a") == {"name": "Foo"}
+                assert await second.get("items", "b") == {"name": "Bar"}
+            finally:
+                await first.close()
+                await second.close()
+                await server.close()
+
+        run(main())
+
+    def test_front_tier_is_emptied_on_disconnection(self, tmp_path: Path):
+        path = str(tmp_path / "store.sock")
+
+        async def main():
+            server = StoreServer(path)
+            await server.start()
+            backend = SocketBackend(path)
+            await backend.set("users", "a", 1)
+            await server.close()
+            await backend._listener
+            assert len(backend.front) == 0
+
+            server = StoreServer(path)
+            await server.start()
+            assert await backend.get("users", "a") is None
+            await backend.close()
+            await server.close()
+
+        run(main())
@@ -0,0 +1,69 @@
+import asyncio
+import re
+
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+
+from veryneatapp.core.timing import ProcessTimeMiddleware, Timings
+from veryneatapp.tests.utils.utils import run
+
+
+def find_middleware(client) -> ProcessTimeMiddleware:
+    middleware = client.app.middleware_stack
+    while not isinstance(middleware, ProcessTimeMiddleware):
+        middleware = middleware.app
+    return middleware
+
+
+class TestTimings:
+    def test_server_timing(self):
+        timings = Timings(1.0)
+        timings.marks = {"deps": 1.5, "handler": 1.502, "end": 1.51}
+        assert timings.server_timing(2.0) == (
+            "deps;dur=2.000, handler;dur=8.000, app;dur=1000.000"
+        )
+
+
+class TestProcessTimeMiddleware:
+    def test_process_time(self, mock_client: FastAPI):
+        response = mock_client.post(
+            "/api/v1/basics/index-weights/", json={"1": 0.5}
+        )
+        assert float(response.headers["X-Process-Time"]) > 0
+        assert "Server-Timing" not in response.headers
+
+    def test_server_timing(self, mock_client: FastAPI, monkeypatch):
+        monkeypatch.setattr(find_middleware(mock_client), "server_timing", True)
+        response = mock_client.post(
+            "/api/v1/basics/index-weights/", json={"1": 0.5}
+        )
+        assert response.json() == {"1": 0.5}
+        assert re.fullmatch(
+            r"deps;dur=[\d.]+, handler;dur=[\d.]+, serialize;dur=[\d.]+, "
+            r"app;dur=[\d.]+",
+            response.headers["Server-Timing"],
+        )
+
+    def test_streams_are_not_buffered(self):
+        sent = []
+
+        async def chunks():
+            for chunk in (b"a", b"b", b"c"):
+                yield chunk
+                # Each chunk reached the server before the next one is made
+                assert sent[-1]["body"] == chunk
+
+        async def endpoint(scope, receive, send):
+            await StreamingResponse(chunks())(scope, receive, send)
+
+        app = ProcessTimeMiddleware(endpoint)
+
+        async def receive():
+            await asyncio.Event().wait()  # the client stays connected
+
+        async def send(message):
+            sent.append(message)
+
+        run(app({"type": "http", "headers": []}, receive, send))
+        assert [m.get("body") for m in sent[1:]] == [b"a", b"b", b"c", b""]
+        assert sent[0]["headers"][-1][0] == b"x-process-time"
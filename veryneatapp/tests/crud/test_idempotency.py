@@ -0,0 +1,56 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.db.session import get_session
+from veryneatapp.tests.utils.utils import random_lower_string, run
+
+
+def claim(db: AsyncSession, key: str, request_hash: str = "hash"):
+    return run(
+        crud.idempotency_key.claim(
+            db, key=key, request_hash=request_hash, ttl=3600, lock_timeout=60
+        )
+    )
+
+
+def test_claim_and_replay(db: AsyncSession) -> None:
+    key = random_lower_string()
+    row, owned = claim(db, key)
+    assert owned and row.status_code is None
+
+    other_db = get_session()
+    try:
+        # In progress
+        _, owned = claim(other_db, key)
+        assert not owned
+        run(
+            crud.idempotency_key.complete(
+                db, row=row, status_code=200, response=b"{}"
+            )
+        )
+        row, owned = claim(other_db, key)
+        assert not owned
+        assert (row.status_code, row.response) == (200, b"{}")
+    finally:
+        run(other_db.close())
+
+
+def test_abandoned_requests_are_resumed(db: AsyncSession) -> None:
+    key = random_lower_string()
+    row, _ = claim(db, key)
+    crud.idempotency_key.progress(row, b'[{"index": 0}]')
+    run(db.commit())
+    run(crud.idempotency_key.abandon(db, key=key))
+
+    other_db = get_session()
+    try:
+        _, owned = claim(other_db, key, request_hash="other")
+        assert not owned
+        row, owned = claim(other_db, key)
+        assert owned
+        assert row.response == b'[{"index": 0}]'
+        # The other retries wait for this one
+        _, owned = claim(db, key)
+        assert not owned
+    finally:
+        run(other_db.close())
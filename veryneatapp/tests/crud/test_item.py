@@ -0,0 +1,27 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.api.schemas.item import ItemCreate, ItemInDB, ItemUpdate
+from veryneatapp.tests.crud.test_user import create_random_user
+from veryneatapp.tests.utils.utils import random_lower_string, run
+
+
+def test_create_update_and_remove_item(db: AsyncSession) -> None:
+    owner = create_random_user(db)
+    item_in = ItemCreate(title=random_lower_string(), description="Fighters")
+    item = run(
+        crud.item.create_with_owner(db, obj_in=item_in, owner_id=owner.id)
+    )
+    assert ItemInDB.from_orm(item).owner_id == owner.id
+
+    item = run(
+        crud.item.update(db, db_obj=item, obj_in=ItemUpdate(description="Foo"))
+    )
+    assert item.description == "Foo"
+    assert item.title == item_in.title
+
+    assert [
+        i.id for i in run(crud.item.get_multi_by_owner(db, owner_id=owner.id))
+    ] == [item.id]
+    run(crud.item.remove(db, id=item.id))
+    assert run(crud.item.get(db, id=item.id)) is None
@@ -0,0 +1,50 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.api.schemas.user import UserCreate, UserInDB, UserUpdate
+from veryneatapp.tests.utils.utils import random_email, random_lower_string, run
+
+
+def create_random_user(db: AsyncSession, password: str = "secret"):
+    user_in = UserCreate(
+        username=random_lower_string(), email=random_email(), password=password
+    )
+    return run(crud.user.create(db, obj_in=user_in))
+
+
+def test_create_user(db: AsyncSession) -> None:
+    user = create_random_user(db)
+    assert user.id is not None
+    assert user.hashed_password.startswith("$2b$")
+    user_in_db = UserInDB.from_orm(user)
+    assert user_in_db.is_active is True
+    assert user_in_db.is_superuser is False
+
+
+def test_get_user(db: AsyncSession) -> None:
+    user = create_random_user(db)
+    assert run(crud.user.get(db, id=user.id)).username == user.username
+    assert run(crud.user.get_by_email(db, email=user.email)).id == user.id
+    assert run(crud.user.get_by_username(db, username=user.username)).id == (
+        user.id
+    )
+
+
+def test_authenticate_and_update_user(db: AsyncSession) -> None:
+    user = create_random_user(db)
+    assert run(
+        crud.user.authenticate(db, username=user.username, password="secret")
+    )
+    assert not run(
+        crud.user.authenticate(db, username=user.username, password="oops")
+    )
+    run(
+        crud.user.update(
+            db,
+            db_obj=user,
+            obj_in=UserUpdate(username=user.username, password="new"),
+        )
+    )
+    assert run(
+        crud.user.authenticate(db, username=user.username, password="new")
+    )
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+
+from fastapi import FastAPI
+from graphql import parse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from veryneatapp import crud
+from veryneatapp.api.schemas.item import ItemCreate
+from veryneatapp.core.config import settings
+from veryneatapp.graphql import graphql_app, limits
+from veryneatapp.graphql.dataloader import DataLoader
+from veryneatapp.graphql.loaders import Loaders
+from veryneatapp.graphql.schema import schema
+from veryneatapp.tests.crud.test_user import create_random_user
+from veryneatapp.tests.utils.utils import random_lower_string, run
+
+ITEMS_QUERY = """
+query Items($q: String) {
+  items(q: $q, limit: 10) { items { title owner { username } } nextCursor }
+}
+"""
+
+
+def post(client: FastAPI, json):
+    return client.post("/graphql", json=json)
+
+
+class TestDataLoader:
+    def test_loads_of_one_iteration_are_batched(self):
+        batches = []
+
+        async def batch_load(keys):
+            batches.append(keys)
+            return [key * 2 for key in keys]
+
+        async def main():
+            loader = DataLoader(batch_load, max_batch_size=2)
+            loader.prime(4, 40)
+            values = await asyncio.gather(
+                *(loader.load(key) for key in (1, 2, 1, 3, 4))
+            )
+            assert await loader.load(2) == 4
+            return values
+
+        assert run(main()) == [2, 4, 2, 6, 40]
+        assert batches == [[1, 2], [3]]
+
+
+class TestLimits:
+    def test_depth_and_complexity(self):
+        document = parse(
+            "query { items(limit: $n) { items { ...f } } } "
+            "fragment f on Item { title owner { username items { id } } }"
+        )
+        operation = limits.get_operation(document, None)
+        # items > items > owner > items
+        depth_and_complexity = limits.measure(
+            schema, document, operation, {"n": 5}
+        )
+        assert depth_and_complexity == (4, 31)
+
+    def test_limits_default_and_maximum(self):
+        document = parse(
+            "query ($n: Int) { items(limit: $n) { items { id } } }"
+        )
+        operation = limits.get_operation(document, None)
+        # items' limit defaults to 20
+        assert limits.measure(schema, document, operation) == (2, 41)
+        _, complexity = limits.measure(
+            schema, document, operation, {"n": 10**6}
+        )
+        assert complexity == 1 + settings.PAGE_SIZE_MAX * 2
+
+
+class TestGraphQLApp:
+    def test_hello(self, mock_client: FastAPI):
+        response = post(mock_client, {"query": '{ hello(name: "you") }'})
+        assert response.status_code == 200
+        assert response.json() == {"data": {"hello": "Hello you"}}
+
+    def test_owners_are_loaded_in_one_batch(
+        self, mock_client: FastAPI, db: AsyncSession, monkeypatch
+    ):
+        prefix = random_lower_string()
+        owners = [create_random_user(db) for _ in range(3)]
+        for i, owner in enumerate(owners):
+            run(
+                crud.item.create_with_owner(
+                    db,
+                    obj_in=ItemCreate(title=f"{prefix}{i}"),
+                    owner_id=owner.id,
+                )
+            )
+        batches = []
+        users_by_id = Loaders._users_by_id
+
+        async def count_batches(self, ids):
+            batches.append(sorted(ids))
+            return await users_by_id(self, ids)
+
+        monkeypatch.setattr(Loaders, "_users_by_id", count_batches)
+        response = post(
+            mock_client, {"query": ITEMS_QUERY, "variables": {"q": prefix}}
+        )
+        assert response.status_code == 200
+        assert response.json()["data"]["items"] == {
+            "items": [
+                {
+                    "title": f"{prefix}{i}",
+                    "owner": {"username": owner.username},
+                }
+                for i, owner in enumerate(owners)
+            ],
+            "nextCursor": None,
+        }
+        assert batches == [sorted(owner.id for owner in owners)]
+
+    def test_documents_are_cached(self, mock_client: FastAPI):
+        query = "{ hello(name: %r) }" % random_lower_string()
+        query = query.replace("'", '"')
+        post(mock_client, {"query": query})
+        app = graphql_app.app.get()
+        document, errors = app.documents.get(query)
+        assert errors == []
+        assert post(mock_client, {"query": query}).status_code == 200
+        assert app.documents.get(query)[0] is document
+
+    def test_invalid_limit_variable(self, mock_client: FastAPI):
+        response = post(
+            mock_client,
+            {
+                "query": "query($l: Int) { items(limit: $l) { items { id } } }",
+                "variables": {"l": "abc"},
+            },
+        )
+        assert response.status_code == 400
+        assert "limit" in response.json()["errors"][0]["message"]
+
+    def test_validation_errors(self, mock_client: FastAPI):
+        response = post(mock_client, {"query": "{ nope }"})
+        assert response.status_code == 400
+        assert "nope" in response.json()["errors"][0]["message"]
+
+    def test_persisted_queries(self, mock_client: FastAPI):
+        query = '{ hello(name: "%s") }' % random_lower_string()
+        sha256_hash = hashlib.sha256(query.encode()).hexdigest()
+        extensions = {
+            "persistedQuery": {"version": 1, "sha256Hash": sha256_hash}
+        }
+
+        response = post(mock_client, {"extensions": extensions})
+        assert response.status_code == 200
+        assert response.json()["errors"][0]["extensions"] == {
+            "code": "PERSISTED_QUERY_NOT_FOUND"
+        }
+        response = post(
+            mock_client, {"query": query + " ", "extensions": extensions}
+        )
+        assert response.status_code == 400
+        response = post(mock_client, {"query": query, "extensions": extensions})
+        assert response.status_code == 200
+        response = post(mock_client, {"extensions": extensions})
+        assert response.status_code == 200
+        assert "data" in response.json()
+
+    def test_batch(self, mock_client: FastAPI):
+        response = post(
+            mock_client,
+            [
+                {"query": '{ hello(name: "a") }'},
+                {"query": "{ nope }"},
+                {"query": '{ hello(name: "b") }'},
+            ],
+        )
+        assert response.status_code == 200
+        first, second, third = response.json()
+        assert first == {"data": {"hello": "Hello a"}}
+        assert "errors" in second
+        assert third == {"data": {"hello": "Hello b"}}
+
+    def test_too_complex_queries_are_rejected(
+        self, mock_client: FastAPI, monkeypatch
+    ):
+        monkeypatch.setattr(graphql_app.app.get(), "max_complexity", 300)
+        query = "{ items(limit: 100) { items { owner { items { id } } } } }"
+        response = post(mock_client, {"query": query})
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["extensions"] == {
+            "code": "QUERY_TOO_COMPLEX"
+        }
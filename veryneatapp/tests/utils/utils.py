@@ -0,0 +1,17 @@
+import asyncio
+import random
+import string
+from typing import Any, Awaitable
+
+
+def run(awaitable: Awaitable) -> Any:
+    """Run a coroutine on the event loop used by the TestClient"""
+    return asyncio.get_event_loop().run_until_complete(awaitable)
+
+
+def random_lower_string() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=32))
+
+
+def random_email() -> str:
+    return f"{random_lower_string()}@{random_lower_string()}.com"
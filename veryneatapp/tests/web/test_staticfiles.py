@@ -0,0 +1,84 @@
+import re
+
+from fastapi import FastAPI
+
+from veryneatapp.main import STATIC_DIR, app
+from veryneatapp.tests.utils.utils import run
+from veryneatapp.web.staticfiles import AssetResponse, accepted_encodings
+
+STYLE_CSS = (STATIC_DIR / "css" / "materialize.min.css").read_bytes()
+
+
+class TestPrecompressedStaticFiles:
+    def test_url_for_returns_hashed_urls(self, mock_client: FastAPI):
+        css_url = app.url_path_for("static", path="/css/materialize.min.css")
+        assert re.fullmatch(
+            r"/static/css/materialize\.min\.[0-9a-f]{16}\.css", css_url
+        )
+
+        response = mock_client.get(css_url)
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == (
+            "public, max-age=31536000, immutable"
+        )
+        assert response.content == STYLE_CSS
+
+    def test_picks_the_accepted_encoding(self, mock_client: FastAPI):
+        url = "/static/css/materialize.min.css"
+        response = mock_client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert int(response.headers["Content-Length"]) < len(STYLE_CSS)
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.headers["Cache-Control"] == "no-cache"
+        assert response.content == STYLE_CSS  # decoded by requests
+
+        response = mock_client.get(
+            url, headers={"Accept-Encoding": "gzip;q=0, identity"}
+        )
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Content-Length"] == str(len(STYLE_CSS))
+        assert response.content == STYLE_CSS
+
+    def test_not_modified(self, mock_client: FastAPI):
+        url = "/static/css/materialize.min.css"
+        etag = mock_client.get(url).headers["ETag"]
+        response = mock_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    def test_images_are_not_compressed(self, mock_client: FastAPI):
+        response = mock_client.get(
+            "/static/background1.jpg", headers={"Accept-Encoding": "gzip, br"}
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "image/jpeg"
+        assert "Content-Encoding" not in response.headers
+
+    def test_unknown_file(self, mock_client: FastAPI):
+        response = mock_client.get("/static/../main.py")
+        assert response.status_code == 404
+        assert mock_client.get("/static/nope.css").status_code == 404
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, br;q=0.5, zstd;q=0") == {
+        "gzip": 1.0,
+        "br": 0.5,
+        "zstd": 0.0,
+    }
+
+
+def test_zerocopy_send():
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    path = str(STATIC_DIR / "js" / "init.js")
+    response = AssetResponse(path, {"content-length": "163"}, send_body=True)
+    scope = {"type": "http", "extensions": {"http.response.zerocopysend": {}}}
+    run(response(scope, None, send))
+    assert messages[0]["status"] == 200
+    assert messages[1]["type"] == "http.response.zerocopysend"
+    assert messages[1]["file"].name == path
@@ -0,0 +1,78 @@
+import asyncio
+from pathlib import Path
+
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from veryneatapp.main import app
+from veryneatapp.tests.utils.utils import run
+from veryneatapp.web.endpoints import home
+from veryneatapp.web.endpoints.home import TEMPLATES_DIR
+from veryneatapp.web.templating import CachedTemplates
+
+templates = home.templates.get()
+
+
+def make_request(host: str = "testserver") -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "scheme": "http",
+            "server": (host, 80),
+            "path": "/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", host.encode())],
+            "app": app,
+            "router": app.router,
+        }
+    )
+
+
+class TestCachedTemplates:
+    def test_home_page_is_served_from_memory(self, mock_client: FastAPI):
+        templates.clear()
+        first = mock_client.get("/")
+        hits = templates.render_cache.stats()["hits"]
+        second = mock_client.get("/")
+        assert first.status_code == second.status_code == 200
+        assert second.content == first.content
+        assert templates.render_cache.stats()["hits"] == hits + 1
+        assert "/static/css/materialize." in first.text
+
+    def test_cache_key(self):
+        templates.clear()
+        templates.render("index.html", make_request("foo"))
+        templates.render("index.html", make_request("bar"))
+        templates.render("index.html", make_request("foo"))
+        assert len(templates.render_cache) == 2
+
+    def test_bytecode_cache(self, tmp_path: Path):
+        CachedTemplates(directory=TEMPLATES_DIR, cache_dir=str(tmp_path))
+        assert len(list(tmp_path.iterdir())) == 1
+
+    def test_auto_reload_skips_the_render_cache(self, tmp_path: Path):
+        auto_reload = CachedTemplates(
+            directory=TEMPLATES_DIR, cache_dir=str(tmp_path), auto_reload=True
+        )
+        auto_reload.render("index.html", make_request())
+        assert len(auto_reload.render_cache) == 0
+
+    def test_streaming_render(self):
+        request = make_request()
+        response = templates.StreamingTemplateResponse(
+            "index.html", {"request": request}, buffer_size=1024
+        )
+        messages = []
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        run(response({"type": "http"}, receive, send))
+        chunks = [m["body"] for m in messages[1:] if m.get("body")]
+        assert len(chunks) > 1
+        assert b"".join(chunks) == templates.render("index.html", request)
@@ -2,13 +2,22 @@ from pathlib import Path
 
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+
+from veryneatapp.core.lazy import Lazy
 
 router = APIRouter()
 
 TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
 
-templates = Jinja2Templates(directory=TEMPLATES_DIR)
+
+def make_templates():
+    """Jinja2 is imported and the templates compiled on first use"""
+    from veryneatapp.web.templating import CachedTemplates
+
+    return CachedTemplates(directory=TEMPLATES_DIR)
+
+
+templates = Lazy(make_templates)
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -16,7 +25,7 @@ async def index(request: Request):
     """
     GET route which returns HTML template,
     run curl http://0.0.0.0:5700/
+    The page only depends on the request base URL: it's rendered once
+    and then served from memory
     """
-    return templates.TemplateResponse(
-        "index.html", context={"request": request}
-    )
+    return templates.get().CachedTemplateResponse("index.html", request)
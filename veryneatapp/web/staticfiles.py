@@ -0,0 +1,271 @@
+"""
+Static files served from an in-memory index built once, when the app starts.
+
+- Text assets get gzip and brotli (when the optional `brotli` package is
+  installed) variants, written once to a cache directory and named after
+  the content hash so that every worker process reuses them.
+  The variant is picked with the Accept-Encoding request header.
+- Each file is also served under a content-hashed name, eg.
+  css/style.<hash>.css, with an immutable Cache-Control. StaticMount makes
+  `url_for("static", path=...)` return these names.
+- The file metadata comes from the index so requests don't `stat` the file,
+  and the body is sent with the ASGI pathsend/zerocopysend extensions
+  (sendfile) when the server supports them.
+
+Files added after startup are not served until the next restart.
+Run `python -m veryneatapp.web.staticfiles` at build time to create the
+compressed variants ahead of the first startup.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+from email.utils import formatdate
+from mimetypes import guess_type
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import aiofiles
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Mount
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from veryneatapp.core.compression import COMPRESSIBLE_TYPES, accepted_encodings
+from veryneatapp.core.config import settings
+from veryneatapp.core.response_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def _compressors() -> Dict[str, Tuple[str, Callable[[bytes], bytes]]]:
+    """Content-Encoding -> (file extension, compress function),
+    in order of preference"""
+    compressors = {}
+    if brotli is not None:
+        compressors["br"] = (
+            "br",
+            lambda data: brotli.compress(data, quality=11),
+        )
+    compressors["gzip"] = (
+        "gz",
+        lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+    )
+    return compressors
+
+
+class StaticAsset(NamedTuple):
+    path: str
+    size: int
+    media_type: str
+    last_modified: str
+    digest: str
+    hashed_path: str
+    encodings: Dict[str, Tuple[str, int]]  # Content-Encoding -> (path, size)
+
+
+class AssetResponse(Response):
+    """Sends a file whose headers are already known"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, headers: dict, send_body: bool):
+        self.path = path
+        self.status_code = 200
+        self.send_body = send_body
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        extensions = scope.get("extensions") or {}
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b""})
+        elif "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+        elif "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file})
+        else:
+            async with aiofiles.open(self.path, mode="rb") as file:
+                more_body = True
+                while more_body:
+                    chunk = await file.read(self.chunk_size)
+                    more_body = len(chunk) == self.chunk_size
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": more_body,
+                        }
+                    )
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles serving from an index built at init time (see module docstring)
+
+    Args:
+        directory (str): directory of the static files
+        cache_dir (str): where the compressed variants are written
+        compress_min_size (int): smaller files aren't compressed
+    """
+
+    def __init__(
+        self,
+        *,
+        directory: str,
+        cache_dir: str = settings.STATIC_CACHE_DIR,
+        compress_min_size: int = settings.STATIC_COMPRESS_MIN_SIZE,
+    ):
+        super().__init__(directory=directory)
+        self.cache_dir = Path(cache_dir)
+        self.compress_min_size = compress_min_size
+        self.compressors = _compressors()
+        self.assets: Dict[str, StaticAsset] = {}
+        # Served path -> (asset, immutable)
+        self.index: Dict[str, Tuple[StaticAsset, bool]] = {}
+        self.build_index()
+
+    def build_index(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        root = Path(self.directory).resolve()
+        for file_path in sorted(root.rglob("*")):
+            if not file_path.is_file():
+                continue
+            name = PurePosixPath(*file_path.relative_to(root).parts)
+            asset = self._index_file(file_path, name)
+            self.assets[str(name)] = asset
+            self.index[str(name)] = (asset, False)
+            self.index[asset.hashed_path] = (asset, True)
+
+    def _index_file(self, file_path: Path, name: PurePosixPath) -> StaticAsset:
+        data = file_path.read_bytes()
+        stat_result = file_path.stat()
+        digest = hashlib.sha256(data).hexdigest()
+        media_type = guess_type(str(name))[0] or "text/plain"
+        encodings = {}
+        if len(data) >= self.compress_min_size and media_type.startswith(
+            COMPRESSIBLE_TYPES
+        ):
+            for encoding, (extension, compress) in self.compressors.items():
+                variant = self._variant(data, digest, extension, compress)
+                if variant is not None:
+                    encodings[encoding] = variant
+        return StaticAsset(
+            path=str(file_path),
+            size=len(data),
+            media_type=media_type,
+            last_modified=formatdate(stat_result.st_mtime, usegmt=True),
+            digest=digest[:16],
+            hashed_path=str(name.with_suffix(f".{digest[:16]}{name.suffix}")),
+            encodings=encodings,
+        )
+
+    def _variant(
+        self,
+        data: bytes,
+        digest: str,
+        extension: str,
+        compress: Callable[[bytes], bytes],
+    ) -> Optional[Tuple[str, int]]:
+        """Compressed file of `data`, created unless a previous run
+        (or another worker) already did. None if it isn't any smaller"""
+        variant_path = self.cache_dir / f"{digest}.{extension}"
+        if not variant_path.exists():
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                return None
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "wb") as file:
+                file.write(compressed)
+            os.replace(tmp_path, variant_path)
+        size = variant_path.stat().st_size
+        return (str(variant_path), size) if size < len(data) else None
+
+    def hashed_path(self, path: str) -> str:
+        """Content-hashed name of a static file, unchanged if unknown"""
+        asset = self.assets.get(path.lstrip("/"))
+        return asset.hashed_path if asset is not None else path
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            return PlainTextResponse("Method Not Allowed", status_code=405)
+        entry = self.index.get(PurePosixPath(path).as_posix())
+        if entry is None:
+            return PlainTextResponse("Not Found", status_code=404)
+        asset, immutable = entry
+        request_headers = Headers(scope=scope)
+
+        file_path, size, etag = asset.path, asset.size, asset.digest
+        accepted = accepted_encodings(
+            request_headers.get("accept-encoding", "")
+        )
+        headers = {
+            "content-type": asset.media_type,
+            "last-modified": asset.last_modified,
+            "cache-control": IMMUTABLE if immutable else REVALIDATE,
+        }
+        if asset.encodings:
+            headers["vary"] = "Accept-Encoding"
+        for encoding, (variant_path, variant_size) in asset.encodings.items():
+            if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                file_path, size = variant_path, variant_size
+                etag = f"{asset.digest}-{encoding}"
+                headers["content-encoding"] = encoding
+                break
+        headers["etag"] = f'"{etag}"'
+        headers["content-length"] = str(size)
+
+        if self.is_not_modified(Headers(headers), request_headers):
+            return NotModifiedResponse(Headers(headers))
+        return AssetResponse(
+            file_path, headers, send_body=scope["method"] == "GET"
+        )
+
+    def is_not_modified(
+        self, response_headers: Headers, request_headers: Headers
+    ) -> bool:
+        # If-Modified-Since is ignored when If-None-Match is given
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(response_headers["etag"], if_none_match)
+        return super().is_not_modified(response_headers, request_headers)
+
+
+class StaticMount(Mount):
+    """Mount of a PrecompressedStaticFiles app whose `url_for(name, path=...)`
+    returns the content-hashed URLs"""
+
+    def url_path_for(self, name: str, **path_params: str):
+        if name == self.name and "path" in path_params:
+            path_params["path"] = self.app.hashed_path(path_params["path"])
+        return super().url_path_for(name, **path_params)
+
+
+if __name__ == "__main__":
+    # Build step: create the compressed variants of veryneatapp/web/static
+    static_files = PrecompressedStaticFiles(
+        directory=Path(__file__).resolve().parent / "static"
+    )
+    for name, asset in static_files.assets.items():
+        sizes = ", ".join(
+            f"{encoding}: {size}"
+            for encoding, (_, size) in asset.encodings.items()
+        )
+        print(f"{asset.hashed_path} ({asset.size} bytes) {sizes}")
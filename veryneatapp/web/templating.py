@@ -0,0 +1,119 @@
+"""
+Jinja2 templates compiled once and rendered from memory.
+
+- The templates are compiled when CachedTemplates is created (app startup),
+  and the compiled code is kept in a bytecode cache on disk
+  so the next processes skip the compilation.
+- Unless settings.TEMPLATE_AUTO_RELOAD is set, the template files aren't
+  checked for changes and `CachedTemplateResponse` serves the rendered pages
+  from an LRU cache keyed on the template context.
+- `StreamingTemplateResponse` sends large pages while they are rendered.
+"""
+from pathlib import Path
+from typing import Hashable, Iterator
+
+import jinja2
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, StreamingResponse
+from starlette.templating import Jinja2Templates
+
+from veryneatapp.core.cache import TTLCache
+from veryneatapp.core.config import settings
+
+
+class CachedTemplates(Jinja2Templates):
+    """
+    Jinja2Templates with a bytecode cache and a cache of rendered pages
+
+    Args:
+        directory (str): templates directory
+        cache_dir (str): bytecode cache directory
+        render_cache_size (int): max number of rendered pages kept in memory
+        auto_reload (bool): reload the modified templates, no render cache
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        cache_dir: str = settings.TEMPLATE_CACHE_DIR,
+        render_cache_size: int = settings.TEMPLATE_RENDER_CACHE_SIZE,
+        auto_reload: bool = settings.TEMPLATE_AUTO_RELOAD,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.auto_reload = auto_reload
+        super().__init__(directory)
+        self.render_cache = TTLCache(maxsize=render_cache_size)
+        self.precompile()
+
+    def get_env(self, directory: str) -> jinja2.Environment:
+        env = super().get_env(directory)
+        env.bytecode_cache = jinja2.FileSystemBytecodeCache(str(self.cache_dir))
+        env.auto_reload = self.auto_reload
+        return env
+
+    def precompile(self) -> int:
+        """Compile all the templates, returns their number"""
+        names = self.env.list_templates()
+        for name in names:
+            self.get_template(name)
+        return len(names)
+
+    def render(self, name: str, request: Request, **inputs: Hashable) -> bytes:
+        """
+        Rendered template, cached per template, request base URL (used by
+        url_for) and inputs. The template must not use anything else from
+        the request, and the inputs must be hashable.
+        """
+        key = (name, str(request.base_url), tuple(sorted(inputs.items())))
+        body = None if self.auto_reload else self.render_cache.get(key)
+        if body is None:
+            template = self.get_template(name)
+            body = template.render(request=request, **inputs).encode("utf-8")
+            if not self.auto_reload:
+                self.render_cache.set(key, body, size=len(body))
+        return body
+
+    def CachedTemplateResponse(
+        self,
+        name: str,
+        request: Request,
+        status_code: int = 200,
+        **inputs: Hashable,
+    ) -> HTMLResponse:
+        return HTMLResponse(
+            self.render(name, request, **inputs), status_code=status_code
+        )
+
+    def StreamingTemplateResponse(
+        self,
+        name: str,
+        context: dict,
+        status_code: int = 200,
+        buffer_size: int = 16 * 1024,
+    ) -> StreamingResponse:
+        """Response sent in chunks of about `buffer_size` bytes
+        while the template is rendered (in the threadpool)"""
+        if "request" not in context:
+            raise ValueError('context must include a "request" key')
+        template = self.get_template(name)
+
+        def chunks() -> Iterator[bytes]:
+            buffer, size = [], 0
+            for text in template.generate(context):
+                data = text.encode("utf-8")
+                buffer.append(data)
+                size += len(data)
+                if size >= buffer_size:
+                    yield b"".join(buffer)
+                    buffer, size = [], 0
+            if buffer:
+                yield b"".join(buffer)
+
+        return StreamingResponse(
+            chunks(), status_code=status_code, media_type="text/html"
+        )
+
+    def clear(self) -> None:
+        """Drop the rendered pages"""
+        self.render_cache.clear()